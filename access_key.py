@@ -0,0 +1,116 @@
+import itertools
+import numpy as np
+from datetime import date
+from identification import digit_matrix, modulo11_check
+
+# Partes de la clave de acceso de los comprobantes electrónicos del SRI
+COD_DOC_FACTURA = "01"
+AMBIENTE_PRUEBAS = "1"
+AMBIENTE_PRODUCCION = "2"
+TIPO_EMISION_NORMAL = "1"
+ESTABLECIMIENTO = "001"
+PUNTO_EMISION = "001"
+
+ACCESS_KEY_LENGTH = 49
+KEY_CHUNK = 1000  # Facturas de un lote cuyas claves de acceso se calculan juntas
+BODY_LENGTH = ACCESS_KEY_LENGTH - 1
+
+# Pesos 2, 3, 4, 5, 6, 7 que se repiten desde el último dígito hacia la izquierda
+ACCESS_KEY_COEFFICIENTS = np.array([2 + (BODY_LENGTH - 1 - i) % 6 for i in range(BODY_LENGTH)])
+
+def sequential(numero):
+    """Secuencial de 9 dígitos a partir del número de la factura"""
+    digits = "".join(c for c in str(numero) if c.isdigit())
+    return digits[-9:].zfill(9)
+
+def _key_date(fecha):
+    if not isinstance(fecha, date):
+        fecha = date.fromisoformat(str(fecha))
+    return fecha.strftime("%d%m%Y")
+
+def key_body(fecha, ruc, numero, ambiente=AMBIENTE_PRUEBAS, establecimiento=ESTABLECIMIENTO,
+             punto_emision=PUNTO_EMISION, codigo_numerico=None, tipo=COD_DOC_FACTURA):
+    """Los 48 dígitos de la clave antes del verificador.
+
+    Sin codigo_numerico se usan los últimos 8 dígitos del secuencial, así la
+    misma factura siempre tiene la misma clave.
+    """
+    secuencial = sequential(numero)
+    body = (
+        _key_date(fecha) + tipo + str(ruc).strip() + ambiente + establecimiento + punto_emision
+        + secuencial + (codigo_numerico or secuencial[-8:]) + TIPO_EMISION_NORMAL
+    )
+    if len(body) != BODY_LENGTH or not (body.isascii() and body.isdigit()):
+        raise ValueError("El RUC del negocio debe tener 13 dígitos para generar la clave de acceso")
+    return body
+
+def check_digits(bodies):
+    """Dígito verificador módulo 11 de cada cuerpo de 48 dígitos, en bloque.
+
+    Usa la misma matriz de dígitos que la validación de cédulas y RUC; el
+    SRI cambia el 11 por 0 (ya lo hace modulo11_check) y el 10 por 1.
+    """
+    check = modulo11_check(digit_matrix(bodies, BODY_LENGTH), ACCESS_KEY_COEFFICIENTS)
+    return np.where(check == 10, 1, check)
+
+def access_keys(bodies):
+    """Claves completas de una lista de cuerpos de 48 dígitos"""
+    return [body + str(digit) for body, digit in zip(bodies, check_digits(bodies).tolist())]
+
+def access_key(fecha, ruc, numero, **parts):
+    """Clave de acceso de 49 dígitos de un comprobante"""
+    return access_keys([key_body(fecha, ruc, numero, **parts)])[0]
+
+def is_valid_access_key(key):
+    key = str(key or "")
+    if len(key) != ACCESS_KEY_LENGTH or not (key.isascii() and key.isdigit()):
+        return False
+    return int(check_digits([key[:BODY_LENGTH]])[0]) == int(key[-1])
+
+def invoice_key_body(invoice_data, ruc, ambiente=AMBIENTE_PRUEBAS):
+    return key_body(
+        invoice_data["fecha"],
+        ruc,
+        invoice_data["numero"],
+        ambiente,
+        invoice_data.get("establecimiento") or ESTABLECIMIENTO,
+        invoice_data.get("punto_emision") or PUNTO_EMISION,
+        invoice_data.get("codigo_numerico"),
+    )
+
+def invoice_access_key(invoice_data, ruc, ambiente=AMBIENTE_PRUEBAS):
+    """Clave de acceso de una factura con el formato de generate_invoice_pdf"""
+    return access_keys([invoice_key_body(invoice_data, ruc, ambiente)])[0]
+
+def assign_access_keys(invoices, ruc, ambiente=AMBIENTE_PRUEBAS):
+    """Completa invoice_data["clave_acceso"] de cada factura de un lote que
+    aún no la tiene, con un solo cálculo vectorizado para todo el lote.
+
+    Los elementos que no son facturas y las facturas con datos que no
+    forman una clave (fecha o número no válidos) se dejan sin clave;
+    devuelve cuántas claves se asignaron.
+    """
+    pending, bodies = [], []
+    for invoice in invoices:
+        invoice_data = invoice.get("invoice_data") if isinstance(invoice, dict) else None
+        if not isinstance(invoice_data, dict) or invoice_data.get("clave_acceso"):
+            continue
+        try:
+            bodies.append(invoice_key_body(invoice_data, ruc, ambiente))
+        except (KeyError, TypeError, ValueError):
+            continue
+        pending.append(invoice_data)
+    for invoice_data, key in zip(pending, access_keys(bodies)):
+        invoice_data["clave_acceso"] = key
+    return len(pending)
+
+def with_access_keys(invoices, ruc, ambiente=AMBIENTE_PRUEBAS):
+    """Recorre las facturas de un iterable asignando las claves de acceso
+    que faltan por bloques de KEY_CHUNK, sin leer el lote completo"""
+    invoices = iter(invoices)
+    while True:
+        chunk = list(itertools.islice(invoices, KEY_CHUNK))
+        if not chunk:
+            return
+        assign_access_keys(chunk, ruc, ambiente)
+        yield from chunk
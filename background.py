@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Ejecutor compartido para el trabajo lento (PDF, MySQL) fuera de los eventos de Flet
+MAX_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="manzafac")
+
+def run_in_background(work, on_done=None, on_error=None):
+    """Ejecuta work() en un hilo del ejecutor y notifica el resultado.
+
+    on_done recibe el valor devuelto por work y on_error la excepción lanzada.
+    Ambos se llaman desde el hilo del ejecutor; Flet permite actualizar la
+    página desde ahí.
+    """
+    future = _executor.submit(work)
+
+    def finished(f):
+        try:
+            result = f.result()
+        except Exception as e:
+            if on_error:
+                on_error(e)
+            else:
+                print(f"Error en tarea en segundo plano: {e}")
+            return
+        if on_done:
+            on_done(result)
+
+    future.add_done_callback(finished)
+    return future
+
+def shutdown(wait=False):
+    """Detiene el ejecutor (usado al cerrar la aplicación)"""
+    _executor.shutdown(wait=wait)
@@ -0,0 +1,78 @@
+import time
+import zipfile
+
+# Datos del negocio para los lotes cuando aún no se registró ninguno
+DEFAULT_BUSINESS_DATA = {
+    'business_name': 'ManzaFAC',
+    'ruc': 'N/A',
+    'address': 'N/A',
+    'province': 'N/A'
+}
+
+class ZipSink:
+    """Destino de lote que guarda cada documento (PDF o XML) dentro de un ZIP.
+
+    target puede ser una ruta o un flujo binario; los documentos se agregan a
+    medida que llegan, sin crear archivos individuales en la carpeta de
+    Documentos.
+    """
+
+    def __init__(self, target):
+        self.zip_file = zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED)
+
+    def add(self, name, data):
+        self.zip_file.writestr(name, data)
+        return name
+
+    def close(self):
+        self.zip_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def new_summary():
+    return {
+        "total": 0,
+        "generadas": 0,
+        "fallidas": 0,
+        "errores": [],
+    }
+
+def new_result(invoice):
+    """Resultado de una factura del lote, antes de generarla.
+
+    Nunca falla, aunque el elemento no tenga la forma de una factura: ese
+    error se reporta después, en el resultado.
+    """
+    invoice_data = invoice.get('invoice_data') if isinstance(invoice, dict) else None
+    numero = invoice_data.get('numero') if isinstance(invoice_data, dict) else None
+    return {"numero": numero, "archivo": None, "error": None}
+
+def check_invoice(invoice):
+    """Lanza ValueError si un elemento del lote no tiene la forma de una factura"""
+    if not isinstance(invoice, dict):
+        raise ValueError("Cada factura del lote debe ser un objeto con client_data, invoice_data y products")
+    for key in ('client_data', 'invoice_data'):
+        if not isinstance(invoice.get(key), dict):
+            raise ValueError(f"{key} debe ser un objeto")
+    if not isinstance(invoice.get('products'), list):
+        raise ValueError("products debe ser una lista")
+
+def record_result(summary, result):
+    """Cuenta el resultado de una factura como generada o fallida"""
+    if result["error"] is None:
+        summary["generadas"] += 1
+    else:
+        summary["fallidas"] += 1
+        summary["errores"].append(result)
+    summary["total"] += 1
+
+def finish_summary(summary, start):
+    """Agrega la duración y el rendimiento en facturas/segundo desde start"""
+    elapsed = time.perf_counter() - start
+    summary["segundos"] = elapsed
+    summary["facturas_por_segundo"] = summary["total"] / elapsed if elapsed > 0 else 0.0
+    return summary
@@ -0,0 +1,278 @@
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+import database
+from batch_sinks import ZipSink
+from identification import validate_identification, validate_identifications, validate_ruc
+from invoice_numbers import InvoiceNumberAllocator
+from invoice_pdf_generator import generate_invoices_batch, render_invoice_pdf
+from invoice_repository import InvoiceRepository
+from invoice_service import Invoice, InvoiceService
+from invoice_totals import InvoiceTotals, compute_invoice, product_totals
+from update_scheduler import UpdateScheduler
+
+DEFAULT_RESULTS = "benchmark_results.json"
+# La línea base se guarda junto a este archivo y se confirma con el código
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_TOLERANCE = 0.30  # Fracción más lenta que la línea base que se acepta
+LINE_COUNTS = (1, 8, 100, 1000)
+BATCH_SIZE = 200
+
+BUSINESS = ("Comercial Manzana", "1790011674001", "Av. Amazonas N24-03", "Pichincha")
+
+CEDULA = "1710034065"
+RUC = "1790011674001"
+
+class _StandInConnection:
+    """Conexión SQLite con la parte de la interfaz de mysql.connector que usa database.py"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def cursor(self, dictionary=False):
+        cursor = self.connection.cursor()
+        if dictionary:
+            cursor.row_factory = lambda c, row: {d[0]: value for d, value in zip(c.description, row)}
+        return cursor
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+@contextmanager
+def stand_in_database(path):
+    """Reemplaza la conexión MySQL de database.py por una base SQLite con un negocio"""
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("""CREATE TABLE IF NOT EXISTS negocios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        business_name TEXT, ruc TEXT, address TEXT, province TEXT
+    )""")
+    connection.execute(
+        "INSERT INTO negocios (business_name, ruc, address, province) VALUES (?, ?, ?, ?)", BUSINESS
+    )
+    connection.commit()
+
+    @contextmanager
+    def get_connection():
+        yield _StandInConnection(connection)
+
+    original = database.get_connection
+    database.get_connection = get_connection
+    database.invalidate_business_cache()
+    try:
+        yield
+    finally:
+        database.get_connection = original
+        database.invalidate_business_cache()
+        connection.close()
+
+def sample_products(count):
+    return [
+        {
+            "cantidad": str(1 + i % 5),
+            "descripcion": f"Producto de prueba {i}",
+            "precio": f"{1 + i % 37}.{i % 100:02d}",
+            "incluye_iva": i % 2 == 0,
+        }
+        for i in range(count)
+    ]
+
+def sample_invoice(count, numero="00000001"):
+    products = sample_products(count)
+    return {
+        "client_data": {
+            "cliente": "Cliente de prueba",
+            "identificacion": CEDULA,
+            "direccion": "Av. 10 de Agosto",
+            "provincia": "Pichincha",
+            "ciudad": "Quito",
+        },
+        "invoice_data": {"numero": numero, "fecha": "2026-01-15", "vendedor": "Caja 1"},
+        "products": products,
+        "totals": product_totals(products, "5"),
+    }
+
+class _CountingPage:
+    """Página de Flet que solo cuenta las llamadas a update"""
+
+    def __init__(self):
+        self.updates = 0
+
+    def update(self, *controls):
+        self.updates += 1
+
+def coalesce_marks(marks=100, controls=8):
+    """Una ráfaga de ediciones dentro de un cuadro debe enviarse en un solo page.update"""
+    page = _CountingPage()
+    scheduler = UpdateScheduler(page, interval=60)
+    fields = [object() for _ in range(controls)]
+    for i in range(marks):
+        scheduler.mark(fields[i % controls])
+    scheduler.flush()
+    if page.updates != 1:
+        raise RuntimeError(f"{marks} marcas produjeron {page.updates} envíos en lugar de 1")
+
+def measure(work, number, repeat):
+    """Mediana en milisegundos de una llamada a work"""
+    times = timeit.repeat(work, number=number, repeat=repeat)
+    return statistics.median(times) / number * 1000
+
+def benchmark_cases(workdir, workers):
+    """Devuelve (nombre, función, llamadas por medición) de cada caso"""
+    cases = []
+
+    for count in LINE_COUNTS:
+        products = sample_products(count)
+
+        def fill_totals(products=products):
+            # Lo mismo que calculate_totals: descuento y todas las líneas desde cero
+            totals = InvoiceTotals()
+            totals.set_discount("5")
+            for i, p in enumerate(products):
+                totals.set_line(i, p["cantidad"], p["precio"], p["incluye_iva"])
+
+        edited = InvoiceTotals()
+        edited.set_discount("5")
+        for i, p in enumerate(products):
+            edited.set_line(i, p["cantidad"], p["precio"], p["incluye_iva"])
+
+        def edit_line(totals=edited, count=count):
+            # Lo que se recalcula al escribir en una fila
+            totals.set_line(count // 2, "3", "4.50", True)
+            return totals.total
+
+        lines = [(p["cantidad"], p["precio"], p["incluye_iva"]) for p in products]
+        cases += [
+            (f"totales_completos_{count}", fill_totals, max(1, 1000 // count)),
+            (f"totales_una_linea_{count}", edit_line, 1000),
+            (f"totales_lote_{count}", lambda lines=lines: compute_invoice(lines, "5"), max(1, 1000 // count)),
+        ]
+
+    identifications = [CEDULA, RUC, "0000000000", "17100340A5"] * 2500
+    cases += [
+        ("validar_cedula", lambda: validate_identification(CEDULA), 1000),
+        ("validar_ruc", lambda: validate_ruc(RUC), 1000),
+        ("validar_lote_10000", lambda: validate_identifications(identifications), 1),
+        ("negocio_en_cache", lambda: database.get_business_data(), 10000),
+        ("negocio_consulta", lambda: database.get_business_data(use_cache=False), 200),
+        # Falla si las marcas de un cuadro dejan de agruparse en un solo envío
+        ("interfaz_100_marcas_un_envio", coalesce_marks, 100),
+    ]
+
+    for count in LINE_COUNTS:
+        invoice = sample_invoice(count)
+        cases.append((
+            f"pdf_{count}_lineas",
+            lambda invoice=invoice: render_invoice_pdf(
+                invoice["client_data"], invoice["invoice_data"], invoice["products"], invoice["totals"]
+            ),
+            max(1, 50 // count)
+        ))
+
+    batch = [sample_invoice(8, str(i).zfill(8)) for i in range(BATCH_SIZE)]
+
+    def run_batch():
+        summary = generate_invoices_batch(batch, workers=workers, sink=ZipSink(io.BytesIO()))
+        if summary["fallidas"]:
+            raise RuntimeError(summary["errores"][0])
+
+    repository = InvoiceRepository.sqlite(os.path.join(workdir, "facturas.db"))
+    service = InvoiceService(repository, InvoiceNumberAllocator(repository))
+    invoice = sample_invoice(8)
+    del invoice["invoice_data"]["numero"]
+
+    cases += [
+        # Milisegundos por factura dentro de un lote
+        (f"lote_{BATCH_SIZE}_por_factura", run_batch, 1),
+        ("servicio_crear_sin_pdf", lambda: service.create(Invoice.from_dict(invoice), pdf=False), 50),
+    ]
+    return cases
+
+def run(repeat, workers, only=None):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir, stand_in_database(os.path.join(workdir, "negocio.db")):
+        for name, work, number in benchmark_cases(workdir, workers):
+            if only and not any(part in name for part in only):
+                continue
+            ms = measure(work, number, repeat)
+            if name.startswith("lote_"):
+                ms /= BATCH_SIZE
+            results[name] = round(ms, 4)
+            print(f"{name:32} {ms:12.4f} ms")
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "resultados": results,
+    }
+
+def compare(current, baseline, tolerance):
+    """Lista de (caso, ms base, ms actual) que superan la tolerancia"""
+    regressions = []
+    for name, base_ms in baseline["resultados"].items():
+        ms = current["resultados"].get(name)
+        if ms is not None and ms > base_ms * (1 + tolerance):
+            regressions.append((name, base_ms, ms))
+    return regressions
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos de las pruebas de rendimiento"""
+    parser = argparse.ArgumentParser(
+        description="Mide totales, validación, datos del negocio y PDF sobre una base SQLite local"
+    )
+    parser.add_argument("-o", "--salida", default=DEFAULT_RESULTS, help="Archivo JSON de resultados")
+    parser.add_argument("-b", "--base", default=DEFAULT_BASELINE, help="Archivo JSON de la línea base")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Guardar estos resultados como la nueva línea base"
+    )
+    parser.add_argument(
+        "-t", "--tolerancia",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Fracción de lentitud aceptada frente a la base (por defecto, {DEFAULT_TOLERANCE})"
+    )
+    parser.add_argument("-r", "--repeticiones", type=int, default=5, help="Mediciones por caso")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Procesos para el lote")
+    parser.add_argument("casos", nargs="*", help="Medir solo los casos que contienen estos textos")
+    args = parser.parse_args(argv)
+
+    current = run(args.repeticiones, args.workers, args.casos)
+    with open(args.salida, "w", encoding="utf-8") as f:
+        json.dump(current, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.base, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=2)
+        print(f"Línea base guardada en {args.base}")
+        return 0
+
+    if not os.path.exists(args.base):
+        # Sin línea base la comparación no puede detectar nada: es un error
+        print(f"No hay línea base en {args.base}; créela con --save-baseline", file=sys.stderr)
+        return 2
+
+    with open(args.base, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.tolerancia)
+    for name, base_ms, ms in regressions:
+        print(f"REGRESIÓN {name}: {base_ms:.4f} ms -> {ms:.4f} ms ({ms / base_ms - 1:+.0%})", file=sys.stderr)
+    if regressions:
+        return 1
+    print(f"Sin regresiones frente a {args.base} (tolerancia {args.tolerancia:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
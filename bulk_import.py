@@ -0,0 +1,303 @@
+import argparse
+import csv
+import itertools
+import sqlite3
+import sys
+import time
+from decimal import Decimal
+from identification import VALIDA, validate_identifications
+from invoice_repository import UPSERT_CLIENT, InvoiceRepository, get_repository
+from invoice_totals import format_amount, parse_amount
+
+# Filas que se leen, validan e insertan juntas; la memoria usada depende solo de este valor
+CHUNK_SIZE = 5000
+
+TRUE_VALUES = {"1", "si", "sí", "s", "true", "x"}
+FALSE_VALUES = {"", "0", "no", "n", "false"}
+
+# Longitud máxima de cada columna de texto y mayor valor de DECIMAL(14, 2),
+# como en el esquema de MySQL
+MAX_LENGTHS = {
+    "nombre": 255,
+    "direccion": 255,
+    "provincia": 64,
+    "ciudad": 64,
+    "codigo": 32,
+    "descripcion": 255,
+    "pedido": 20,
+    "producto_codigo": 32,
+}
+MAX_AMOUNT = Decimal("999999999999.99")
+
+UPSERT_PRODUCT = {
+    "mysql": """INSERT INTO productos (codigo, descripcion, precio, incluye_iva)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE descripcion = VALUES(descripcion),
+                    precio = VALUES(precio), incluye_iva = VALUES(incluye_iva)""",
+    "sqlite": """INSERT INTO productos (codigo, descripcion, precio, incluye_iva)
+                 VALUES (?, ?, ?, ?)
+                 ON CONFLICT (codigo) DO UPDATE SET descripcion = excluded.descripcion,
+                    precio = excluded.precio, incluye_iva = excluded.incluye_iva,
+                    actualizado_en = CURRENT_TIMESTAMP""",
+}
+
+# Volver a importar un pedido reemplaza sus líneas en lugar de duplicarlas
+UPSERT_ORDER_LINE = {
+    "mysql": """INSERT INTO pedidos_pendientes (pedido, cliente_identificacion, producto_codigo, cantidad)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE cliente_identificacion = VALUES(cliente_identificacion),
+                    cantidad = VALUES(cantidad)""",
+    "sqlite": """INSERT INTO pedidos_pendientes (pedido, cliente_identificacion, producto_codigo, cantidad)
+                 VALUES (?, ?, ?, ?)
+                 ON CONFLICT (pedido, producto_codigo) DO UPDATE SET
+                    cliente_identificacion = excluded.cliente_identificacion,
+                    cantidad = excluded.cantidad""",
+}
+
+def _text(row, column):
+    value = row.get(column)
+    return "" if value is None else value.strip()
+
+def _parse_flag(value):
+    """Convierte "si"/"no", "1"/"0", ... a booleano; None si no se reconoce"""
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return None
+
+def _too_long(row):
+    """Mensaje para la primera columna que no cabe en la base de datos, o None"""
+    for column, limit in MAX_LENGTHS.items():
+        if len(_text(row, column)) > limit:
+            return f"{column} no puede tener más de {limit} caracteres"
+    return None
+
+def _database_errors():
+    """(errores de una fila, errores de la conexión) de SQLite y MySQL.
+
+    Los primeros apartan solo la fila; los segundos detienen la importación.
+    """
+    from mysql.connector import errors
+    return (
+        (sqlite3.DatabaseError, errors.DatabaseError),
+        (sqlite3.OperationalError, errors.OperationalError, errors.InterfaceError),
+    )
+
+def _check_identifications(rows, column, rejects):
+    """Valida en bloque la columna de identificación y aparta las filas incorrectas"""
+    status, messages = validate_identifications([_text(row, column) for row in rows])
+    accepted = []
+    for row, row_status, message in zip(rows, status, messages):
+        if row_status == VALIDA:
+            accepted.append(row)
+        else:
+            rejects.append((row, message))
+    return accepted
+
+def _client_rows(rows, rejects):
+    accepted = []
+    for row in _check_identifications(rows, "identificacion", rejects):
+        nombre = _text(row, "nombre")
+        too_long = _too_long(row)
+        if not nombre:
+            rejects.append((row, "El nombre del cliente es obligatorio"))
+        elif too_long:
+            rejects.append((row, too_long))
+        else:
+            accepted.append((row, (
+                _text(row, "identificacion"),
+                nombre,
+                _text(row, "direccion") or None,
+                _text(row, "provincia") or None,
+                _text(row, "ciudad") or None,
+            )))
+    return accepted
+
+def _product_rows(rows, rejects):
+    accepted = []
+    for row in rows:
+        codigo = _text(row, "codigo")
+        descripcion = _text(row, "descripcion")
+        precio = parse_amount(_text(row, "precio"))
+        incluye_iva = _parse_flag(_text(row, "incluye_iva"))
+        too_long = _too_long(row)
+        if not codigo or not descripcion:
+            rejects.append((row, "El código y la descripción son obligatorios"))
+        elif too_long:
+            rejects.append((row, too_long))
+        elif precio is None or precio > MAX_AMOUNT:
+            rejects.append((row, f"El precio debe ser un número positivo hasta {MAX_AMOUNT}"))
+        elif incluye_iva is None:
+            rejects.append((row, "incluye_iva debe ser si/no"))
+        else:
+            accepted.append((row, (codigo, descripcion, format_amount(precio), incluye_iva)))
+    return accepted
+
+def _order_rows(rows, rejects):
+    accepted = []
+    for row in _check_identifications(rows, "cliente_identificacion", rejects):
+        pedido = _text(row, "pedido")
+        codigo = _text(row, "producto_codigo")
+        cantidad = parse_amount(_text(row, "cantidad"))
+        too_long = _too_long(row)
+        if not pedido or not codigo:
+            rejects.append((row, "El pedido y el código de producto son obligatorios"))
+        elif too_long:
+            rejects.append((row, too_long))
+        elif not cantidad or cantidad > MAX_AMOUNT:
+            rejects.append((row, f"La cantidad debe ser mayor a cero y hasta {MAX_AMOUNT}"))
+        else:
+            accepted.append((row, (pedido, _text(row, "cliente_identificacion"), codigo, format_amount(cantidad))))
+    return accepted
+
+# Columnas esperadas, validación y sentencia de cada tipo de archivo
+IMPORT_KINDS = {
+    "clientes": (
+        ["identificacion", "nombre", "direccion", "provincia", "ciudad"],
+        _client_rows,
+        UPSERT_CLIENT,
+    ),
+    "productos": (
+        ["codigo", "descripcion", "precio", "incluye_iva"],
+        _product_rows,
+        UPSERT_PRODUCT,
+    ),
+    "pedidos": (
+        ["pedido", "cliente_identificacion", "producto_codigo", "cantidad"],
+        _order_rows,
+        UPSERT_ORDER_LINE,
+    ),
+}
+
+def _chunks(rows, size):
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _insert(repository, statement, accepted, rejects):
+    """Inserta un bloque de (fila, parámetros) en una transacción.
+
+    Si la base de datos rechaza alguna fila, el bloque se revierte y se
+    reintenta fila por fila para apartar solo las que fallan. Devuelve el
+    número de filas insertadas.
+    """
+    if not accepted:
+        return 0
+    row_errors, connection_errors = _database_errors()
+    try:
+        with repository.transaction() as cursor:
+            cursor.executemany(statement, [params for _, params in accepted])
+        return len(accepted)
+    except connection_errors:
+        raise
+    except row_errors:
+        pass
+
+    inserted = 0
+    for row, params in accepted:
+        try:
+            with repository.transaction() as cursor:
+                cursor.execute(statement, params)
+            inserted += 1
+        except connection_errors:
+            raise
+        except row_errors as e:
+            rejects.append((row, f"Rechazada por la base de datos: {e}"))
+    return inserted
+
+def import_csv(kind, source, repository=None, rejects=None, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """Importa un archivo CSV de clientes, productos o pedidos pendientes.
+
+    source es un archivo de texto abierto (o cualquier iterable de líneas)
+    con encabezados en la primera fila. Las filas se procesan por bloques de
+    chunk_size: cada bloque se valida de una vez y se inserta con executemany
+    en su propia transacción, así que la memoria no crece con el tamaño del
+    archivo; una fila que la base de datos no acepta se rechaza sin detener
+    el resto. Las filas rechazadas se escriben en el archivo rejects (si se
+    indica) con una columna extra "motivo". on_chunk recibe el resumen
+    parcial después de cada bloque.
+    """
+    columns, validate, statements = IMPORT_KINDS[kind]
+    repository = repository or get_repository()
+    reader = csv.DictReader(source)
+
+    missing = [column for column in columns if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"Faltan columnas en el archivo de {kind}: {', '.join(missing)}")
+
+    reject_writer = None
+    if rejects is not None:
+        reject_writer = csv.DictWriter(
+            rejects, fieldnames=reader.fieldnames + ["motivo"], extrasaction="ignore"
+        )
+        reject_writer.writeheader()
+
+    summary = {"leidas": 0, "importadas": 0, "rechazadas": 0}
+    start = time.perf_counter()
+    for chunk in _chunks(reader, chunk_size):
+        rejected = []
+        accepted = validate(chunk, rejected)
+        imported = _insert(repository, statements[repository.dialect], accepted, rejected)
+
+        if reject_writer:
+            reject_writer.writerows(dict(row, motivo=reason) for row, reason in rejected)
+        summary["leidas"] += len(chunk)
+        summary["importadas"] += imported
+        summary["rechazadas"] += len(rejected)
+        if on_chunk:
+            on_chunk(summary)
+
+    summary["segundos"] = round(time.perf_counter() - start, 3)
+    return summary
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos para la importación masiva"""
+    parser = argparse.ArgumentParser(
+        description="Importa clientes, productos o pedidos pendientes desde un archivo CSV"
+    )
+    parser.add_argument("tipo", choices=sorted(IMPORT_KINDS), help="Tipo de datos del archivo")
+    parser.add_argument("archivo", help="Archivo CSV (UTF-8) con encabezados")
+    parser.add_argument(
+        "-r", "--rechazos",
+        help="Archivo CSV donde guardar las filas rechazadas y su motivo"
+    )
+    parser.add_argument(
+        "--sqlite",
+        help="Importar a esta base SQLite local en lugar de MySQL"
+    )
+    parser.add_argument(
+        "--bloque",
+        type=int,
+        default=CHUNK_SIZE,
+        help=f"Filas por bloque (por defecto, {CHUNK_SIZE})"
+    )
+    args = parser.parse_args(argv)
+
+    repository = InvoiceRepository.sqlite(args.sqlite) if args.sqlite else None
+
+    def print_progress(summary):
+        print(f"{summary['leidas']} filas leídas, {summary['rechazadas']} rechazadas", file=sys.stderr)
+
+    rejects = open(args.rechazos, "w", encoding="utf-8", newline="") if args.rechazos else None
+    try:
+        with open(args.archivo, encoding="utf-8-sig", newline="") as source:
+            summary = import_csv(
+                args.tipo, source, repository=repository, rejects=rejects,
+                chunk_size=args.bloque, on_chunk=print_progress
+            )
+    finally:
+        if rejects:
+            rejects.close()
+
+    print(
+        f"{summary['importadas']} de {summary['leidas']} filas importadas, "
+        f"{summary['rechazadas']} rechazadas en {summary['segundos']} s"
+    )
+    return 1 if summary["rechazadas"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
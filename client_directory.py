@@ -0,0 +1,132 @@
+import bisect
+import threading
+from collections import OrderedDict
+from database import database_error
+from invoice_repository import get_repository
+
+CACHE_SIZE = 500  # Clientes recientes que se guardan completos en memoria
+SUGGESTION_LIMIT = 8
+FETCH_SIZE = 5000
+
+class ClientDirectory:
+    """Búsqueda de clientes por identificación.
+
+    Los clientes usados hace poco se guardan completos en una caché LRU, así
+    que volver a facturar a un cliente frecuente no consulta la base de
+    datos. Para autocompletar se mantiene además la lista ordenada de todas
+    las identificaciones (con el nombre del cliente), donde los prefijos se
+    buscan con bisect. El repositorio se obtiene la primera vez que se
+    consulta la base de datos, desde load() o find() en segundo plano.
+    """
+
+    def __init__(self, repository=None, cache_size=CACHE_SIZE):
+        self.repository = repository
+        self.repository_lock = threading.Lock()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # identificacion -> datos del cliente
+        self.ids = []  # Identificaciones ordenadas
+        self.names = []  # Nombre de cada identificación de ids
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_repository(self):
+        if self.repository is None:
+            with self.repository_lock:
+                if self.repository is None:
+                    self.repository = get_repository()
+        return self.repository
+
+    def load(self):
+        """Construye el índice de identificaciones desde la tabla clientes.
+
+        Si la base de datos no está disponible el índice queda vacío.
+        """
+        ids, names = [], []
+        try:
+            with self.get_repository().transaction() as cursor:
+                cursor.execute("SELECT identificacion, nombre FROM clientes ORDER BY identificacion")
+                while True:
+                    rows = cursor.fetchmany(FETCH_SIZE)
+                    if not rows:
+                        break
+                    for identificacion, nombre in rows:
+                        ids.append(identificacion)
+                        names.append(nombre)
+        except database_error() as e:
+            print(f"Error al cargar el directorio de clientes: {e}")
+            return
+        with self.lock:
+            self.ids, self.names = ids, names
+
+    def find(self, identificacion):
+        """Datos del cliente (como find_client del repositorio) o None si no existe"""
+        identificacion = identificacion.strip()
+        with self.lock:
+            client = self.cache.get(identificacion)
+            if client is not None:
+                self.cache.move_to_end(identificacion)
+                self.hits += 1
+                return dict(client)
+            self.misses += 1
+
+        client = self.get_repository().find_client(identificacion)
+        if client is not None:
+            self.remember(client)
+        return client
+
+    def cached(self, identificacion):
+        """Datos del cliente solo si ya están en la caché, sin consultar la base"""
+        with self.lock:
+            client = self.cache.get(identificacion.strip())
+            if client is None:
+                return None
+            self.cache.move_to_end(client["identificacion"])
+            self.hits += 1
+            return dict(client)
+
+    def remember(self, client):
+        """Guarda o actualiza un cliente en la caché y en el índice de prefijos.
+
+        Se llama también después de guardar una factura, para que el cliente
+        recién creado o modificado aparezca sin volver a cargar el índice.
+        """
+        identificacion = client["identificacion"]
+        with self.lock:
+            self.cache[identificacion] = dict(client)
+            self.cache.move_to_end(identificacion)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+            position = bisect.bisect_left(self.ids, identificacion)
+            if position < len(self.ids) and self.ids[position] == identificacion:
+                self.names[position] = client["nombre"]
+            else:
+                self.ids.insert(position, identificacion)
+                self.names.insert(position, client["nombre"])
+
+    def complete(self, prefix, limit=SUGGESTION_LIMIT):
+        """Lista de (identificación, nombre) que empiezan con prefix"""
+        prefix = prefix.strip()
+        if not prefix:
+            return []
+        with self.lock:
+            start = bisect.bisect_left(self.ids, prefix)
+            end = min(start + limit, len(self.ids))
+            return [
+                (self.ids[i], self.names[i])
+                for i in range(start, end)
+                if self.ids[i].startswith(prefix)
+            ]
+
+_default_directory = None
+_default_lock = threading.Lock()
+
+def get_directory():
+    """Directorio de clientes compartido por todas las páginas de este proceso"""
+    global _default_directory
+    if _default_directory is None:
+        with _default_lock:
+            if _default_directory is None:
+                _default_directory = ClientDirectory()
+    return _default_directory
@@ -0,0 +1,116 @@
+import time
+import threading
+from contextlib import contextmanager
+from metrics import timed
+
+# Configuración de la base de datos compartida por todas las páginas
+DB_CONFIG = {
+    'host': 'localhost',
+    'database': 'manzafac',
+    'user': 'root',
+    'password': 'root'
+}
+
+POOL_NAME = "manzafac_pool"
+# Alcanza para los hilos de invoice_server (8); los hilos de segundo plano
+# de la aplicación (4) y la interfaz usan menos
+POOL_SIZE = 8
+POOL_TIMEOUT = 30  # Segundos que se espera una conexión libre antes de fallar
+
+# Segundos que se conserva en memoria el perfil del negocio
+BUSINESS_CACHE_TTL = 300
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+_business_cache = {"data": None, "expires": 0.0}
+_business_lock = threading.Lock()
+
+# Funciones a llamar cuando cambian los datos del negocio (p. ej. plantillas de PDF)
+_business_listeners = []
+
+def get_pool():
+    """Devuelve el pool de conexiones, creándolo la primera vez que se usa"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # El controlador de MySQL se importa con la primera conexión,
+                # no al abrir la aplicación
+                from mysql.connector import pooling
+                _pool = pooling.MySQLConnectionPool(
+                    pool_name=POOL_NAME,
+                    pool_size=POOL_SIZE,
+                    pool_reset_session=True,
+                    **DB_CONFIG
+                )
+    return _pool
+
+def database_error():
+    """Clase base de los errores de MySQL, importada solo cuando se necesita.
+
+    Se usa como "except database_error() as e:"; la expresión se evalúa
+    únicamente cuando ya ocurrió una excepción.
+    """
+    from mysql.connector import Error
+    return Error
+
+@contextmanager
+def get_connection():
+    """Presta una conexión del pool y la devuelve al terminar el bloque.
+
+    El pool de mysql.connector falla en cuanto no le quedan conexiones; aquí
+    se espera hasta POOL_TIMEOUT segundos a que otro hilo devuelva una.
+    """
+    if not _pool_slots.acquire(timeout=POOL_TIMEOUT):
+        from mysql.connector.errors import PoolError
+        raise PoolError(f"No hay conexiones libres después de {POOL_TIMEOUT} s")
+    try:
+        connection = get_pool().get_connection()
+        try:
+            yield connection
+        finally:
+            # En una conexión del pool, close() la devuelve al pool
+            connection.close()
+    finally:
+        _pool_slots.release()
+
+@timed()
+def get_business_data(use_cache=True):
+    """Obtiene el último negocio registrado, usando la caché mientras no expire"""
+    now = time.monotonic()
+    if use_cache:
+        with _business_lock:
+            if _business_cache["data"] is not None and now < _business_cache["expires"]:
+                return _business_cache["data"]
+
+    try:
+        with get_connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                cursor.execute("SELECT * FROM negocios ORDER BY id DESC LIMIT 1")
+                business_data = cursor.fetchone()
+            finally:
+                cursor.close()
+    except Exception as e:
+        print(f"Error al obtener datos del negocio: {e}")
+        return None
+
+    if business_data:
+        with _business_lock:
+            _business_cache["data"] = business_data
+            _business_cache["expires"] = now + BUSINESS_CACHE_TTL
+    return business_data
+
+def invalidate_business_cache():
+    """Descarta el perfil del negocio en caché (llamar después de escribir en negocios)"""
+    with _business_lock:
+        _business_cache["data"] = None
+        _business_cache["expires"] = 0.0
+    for listener in _business_listeners:
+        listener()
+
+def add_business_listener(callback):
+    """Registra una función que se llama cada vez que se invalida el negocio en caché"""
+    _business_listeners.append(callback)
@@ -0,0 +1,123 @@
+import unicodedata
+from types import MappingProxyType
+
+# Provincias del Ecuador con el código que usan los dos primeros dígitos de
+# la cédula y del RUC, y sus cantones
+PROVINCES = (
+    ("01", "Azuay", (
+        "Cuenca", "Camilo Ponce Enríquez", "Chordeleg", "El Pan", "Girón", "Guachapala",
+        "Gualaceo", "Nabón", "Oña", "Paute", "Pucará", "San Fernando", "Santa Isabel",
+        "Sevilla de Oro", "Sígsig",
+    )),
+    ("02", "Bolívar", (
+        "Guaranda", "Caluma", "Chillanes", "Chimbo", "Echeandía", "Las Naves", "San Miguel",
+    )),
+    ("03", "Cañar", (
+        "Azogues", "Biblián", "Cañar", "Déleg", "El Tambo", "La Troncal", "Suscal",
+    )),
+    ("04", "Carchi", (
+        "Tulcán", "Bolívar", "Espejo", "Mira", "Montúfar", "San Pedro de Huaca",
+    )),
+    ("05", "Cotopaxi", (
+        "Latacunga", "La Maná", "Pangua", "Pujilí", "Salcedo", "Saquisilí", "Sigchos",
+    )),
+    ("06", "Chimborazo", (
+        "Riobamba", "Alausí", "Chambo", "Chunchi", "Colta", "Cumandá", "Guamote", "Guano",
+        "Pallatanga", "Penipe",
+    )),
+    ("07", "El Oro", (
+        "Machala", "Arenillas", "Atahualpa", "Balsas", "Chilla", "El Guabo", "Huaquillas",
+        "Las Lajas", "Marcabelí", "Pasaje", "Piñas", "Portovelo", "Santa Rosa", "Zaruma",
+    )),
+    ("08", "Esmeraldas", (
+        "Esmeraldas", "Atacames", "Eloy Alfaro", "Muisne", "Quinindé", "Rioverde", "San Lorenzo",
+    )),
+    ("09", "Guayas", (
+        "Guayaquil", "Alfredo Baquerizo Moreno", "Balao", "Balzar", "Colimes",
+        "Coronel Marcelino Maridueña", "Daule", "Durán", "El Empalme", "El Triunfo",
+        "General Antonio Elizalde", "Isidro Ayora", "Lomas de Sargentillo", "Milagro",
+        "Naranjal", "Naranjito", "Nobol", "Palestina", "Pedro Carbo", "Playas", "Salitre",
+        "Samborondón", "San Jacinto de Yaguachi", "Santa Lucía", "Simón Bolívar",
+    )),
+    ("10", "Imbabura", (
+        "Ibarra", "Antonio Ante", "Cotacachi", "Otavalo", "Pimampiro", "San Miguel de Urcuquí",
+    )),
+    ("11", "Loja", (
+        "Loja", "Calvas", "Catamayo", "Celica", "Chaguarpamba", "Espíndola", "Gonzanamá",
+        "Macará", "Olmedo", "Paltas", "Pindal", "Puyango", "Quilanga", "Saraguro",
+        "Sozoranga", "Zapotillo",
+    )),
+    ("12", "Los Ríos", (
+        "Babahoyo", "Baba", "Buena Fe", "Mocache", "Montalvo", "Palenque", "Puebloviejo",
+        "Quevedo", "Quinsaloma", "Urdaneta", "Valencia", "Ventanas", "Vinces",
+    )),
+    ("13", "Manabí", (
+        "Portoviejo", "24 de Mayo", "Bolívar", "Chone", "El Carmen", "Flavio Alfaro", "Jama",
+        "Jaramijó", "Jipijapa", "Junín", "Manta", "Montecristi", "Olmedo", "Paján",
+        "Pedernales", "Pichincha", "Puerto López", "Rocafuerte", "San Vicente", "Santa Ana",
+        "Sucre", "Tosagua",
+    )),
+    ("14", "Morona Santiago", (
+        "Morona", "Gualaquiza", "Huamboya", "Limón Indanza", "Logroño", "Pablo Sexto",
+        "Palora", "San Juan Bosco", "Santiago", "Sucúa", "Taisha", "Tiwintza",
+    )),
+    ("15", "Napo", (
+        "Tena", "Archidona", "Carlos Julio Arosemena Tola", "El Chaco", "Quijos",
+    )),
+    ("16", "Pastaza", (
+        "Pastaza", "Arajuno", "Mera", "Santa Clara",
+    )),
+    ("17", "Pichincha", (
+        "Quito", "Cayambe", "Mejía", "Pedro Moncayo", "Pedro Vicente Maldonado", "Puerto Quito",
+        "Rumiñahui", "San Miguel de los Bancos",
+    )),
+    ("18", "Tungurahua", (
+        "Ambato", "Baños de Agua Santa", "Cevallos", "Mocha", "Patate", "Quero",
+        "San Pedro de Pelileo", "Santiago de Píllaro", "Tisaleo",
+    )),
+    ("19", "Zamora Chinchipe", (
+        "Zamora", "Centinela del Cóndor", "Chinchipe", "El Pangui", "Nangaritza", "Palanda",
+        "Paquisha", "Yacuambi", "Yantzaza",
+    )),
+    ("20", "Galápagos", (
+        "San Cristóbal", "Isabela", "Santa Cruz",
+    )),
+    ("21", "Sucumbíos", (
+        "Lago Agrio", "Cascales", "Cuyabeno", "Gonzalo Pizarro", "Putumayo", "Shushufindi",
+        "Sucumbíos",
+    )),
+    ("22", "Orellana", (
+        "Orellana", "Aguarico", "La Joya de los Sachas", "Loreto",
+    )),
+    ("23", "Santo Domingo de los Tsáchilas", (
+        "Santo Domingo", "La Concordia",
+    )),
+    ("24", "Santa Elena", (
+        "Santa Elena", "La Libertad", "Salinas",
+    )),
+)
+
+def _key(name):
+    """Nombre sin tildes, mayúsculas ni guiones, para comparar nombres escritos a mano"""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(name.replace("-", " ").lower().split())
+
+# Índices de solo lectura construidos una vez al importar el módulo
+PROVINCE_NAMES = tuple(sorted((name for _, name, _ in PROVINCES), key=_key))
+CITIES_BY_PROVINCE = MappingProxyType({name: cities for _, name, cities in PROVINCES})
+PROVINCE_BY_CODE = MappingProxyType({code: name for code, name, _ in PROVINCES})
+_PROVINCE_BY_KEY = {_key(name): name for name in PROVINCE_NAMES}
+
+def canonical_province(name):
+    """Nombre oficial de una provincia escrita de otra forma ("El oro",
+    "Morona-santiago"...), o None si no corresponde a ninguna"""
+    return _PROVINCE_BY_KEY.get(_key(name))
+
+def province_for_identification(identification):
+    """Provincia que indican los dos primeros dígitos de una cédula o RUC, o None"""
+    return PROVINCE_BY_CODE.get((identification or "").strip()[:2])
+
+def cities_of(province):
+    """Cantones de una provincia (tupla vacía si no existe)"""
+    return CITIES_BY_PROVINCE.get(canonical_province(province), ())
@@ -0,0 +1,185 @@
+import numpy as np
+
+# Códigos de estado devueltos por la validación
+VALIDA = 0
+NO_NUMERICA = 1
+LONGITUD_INVALIDA = 2
+PROVINCIA_INVALIDA = 3
+TERCER_DIGITO_INVALIDO = 4
+VERIFICADOR_INVALIDO = 5
+ESTABLECIMIENTO_INVALIDO = 6
+
+# Tipos de identificación (columnas de la tabla de mensajes)
+CEDULA = 0
+RUC_NATURAL = 1
+RUC_PUBLICO = 2
+RUC_PRIVADO = 3
+
+CEDULA_LENGTH = 10
+RUC_LENGTH = 13
+
+# Identificación que el SRI asigna al comprador "consumidor final"
+CONSUMIDOR_FINAL = "9999999999999"
+PASSPORT_MAX_LENGTH = 20  # Largo máximo de identificacionComprador en el XML del SRI
+FIRST_PROVINCE = 1
+LAST_PROVINCE = 24
+
+# Coeficientes del dígito verificador de cada tipo
+CEDULA_COEFFICIENTS = np.array([2, 1, 2, 1, 2, 1, 2, 1, 2])
+PUBLIC_COEFFICIENTS = np.array([3, 2, 7, 6, 5, 4, 3, 2])
+PRIVATE_COEFFICIENTS = np.array([4, 3, 2, 7, 6, 5, 4, 3, 2])
+
+# Código de establecimiento con el que terminan los RUC
+PUBLIC_ESTABLISHMENT = np.array([0, 0, 0, 1])
+RUC_ESTABLISHMENT = np.array([0, 0, 1])
+
+# Mensaje para cada código de estado (filas) y tipo de identificación (columnas)
+MESSAGES = np.array([
+    ["Cédula válida", "RUC válido", "RUC válido", "RUC válido"],
+    ["La identificación debe contener solo números"] * 4,
+    ["La identificación debe tener 10 dígitos (cédula) o 13 dígitos (RUC)"] * 4,
+    ["Los dos primeros dígitos deben corresponder a una provincia válida (01-24)"] * 4,
+    [
+        "El tercer dígito de la cédula debe ser menor a 6",
+        "El tercer dígito no es válido para un RUC",
+        "El tercer dígito no es válido para un RUC",
+        "El tercer dígito no es válido para un RUC",
+    ],
+    [
+        "Número de cédula no válido (dígito verificador incorrecto)",
+        "RUC persona natural no válido",
+        "RUC público no válido",
+        "RUC jurídico no válido",
+    ],
+    [
+        "Los últimos 3 dígitos del RUC deben ser 001",
+        "Los últimos 3 dígitos del RUC deben ser 001",
+        "Los últimos 4 dígitos del RUC público deben ser 0001",
+        "Los últimos 3 dígitos del RUC deben ser 001",
+    ],
+], dtype=object)
+
+RUC_LENGTH_MESSAGE = "El RUC debe tener 13 dígitos numéricos"
+
+def digit_matrix(values, width):
+    """Convierte textos de solo dígitos en una matriz (n, width) de enteros.
+
+    Los textos más cortos se completan con ceros a la derecha.
+    """
+    if not values:
+        return np.zeros((0, width), dtype=np.int64)
+    buffer = "".join(value.ljust(width, "0") for value in values).encode("ascii")
+    digits = np.frombuffer(buffer, dtype=np.uint8).reshape(len(values), width)
+    return digits.astype(np.int64) - ord("0")
+
+def modulo10_check(digits, coefficients):
+    """Dígito verificador módulo 10 (cédula) de cada fila"""
+    products = digits * coefficients
+    products = np.where(products >= 10, products - 9, products)
+    remainder = products.sum(axis=1) % 10
+    return np.where(remainder == 0, 0, 10 - remainder)
+
+def modulo11_check(digits, coefficients):
+    """Dígito verificador módulo 11 (RUC público y privado) de cada fila"""
+    remainder = (digits @ coefficients) % 11
+    return np.where(remainder == 0, 0, 11 - remainder)
+
+def validate_identifications(values, ruc_only=False):
+    """Valida en bloque una lista de cédulas y/o RUC ecuatorianos.
+
+    Devuelve un arreglo con el código de estado de cada fila (VALIDA,
+    NO_NUMERICA, ...) y una lista con su mensaje. Con ruc_only solo se
+    aceptan RUC de 13 dígitos.
+    """
+    values = ["" if value is None else str(value).strip() for value in values]
+    count = len(values)
+    status = np.full(count, VALIDA, dtype=np.int8)
+    kind = np.full(count, CEDULA, dtype=np.int8)
+
+    lengths = np.fromiter((len(value) for value in values), dtype=np.int64, count=count)
+    numeric = np.fromiter((value.isascii() and value.isdigit() for value in values), dtype=bool, count=count)
+    if ruc_only:
+        length_ok = lengths == RUC_LENGTH
+    else:
+        length_ok = (lengths == CEDULA_LENGTH) | (lengths == RUC_LENGTH)
+
+    status[~numeric] = NO_NUMERICA
+    status[numeric & ~length_ok] = LONGITUD_INVALIDA
+
+    rows = np.flatnonzero(numeric & length_ok)
+    if rows.size:
+        digits = digit_matrix([values[i] for i in rows], RUC_LENGTH)
+        is_ruc = lengths[rows] == RUC_LENGTH
+        province = digits[:, 0] * 10 + digits[:, 1]
+        third = digits[:, 2]
+
+        row_kind = np.select(
+            [~is_ruc, third < 6, third == 6, third == 9],
+            [CEDULA, RUC_NATURAL, RUC_PUBLICO, RUC_PRIVADO],
+            default=RUC_NATURAL
+        )
+        row_status = np.full(rows.size, VALIDA, dtype=np.int8)
+
+        # Los errores se asignan del menos al más prioritario: el último gana
+        establishment_ok = np.where(
+            row_kind == RUC_PUBLICO,
+            (digits[:, 9:] == PUBLIC_ESTABLISHMENT).all(axis=1),
+            (digits[:, 10:] == RUC_ESTABLISHMENT).all(axis=1)
+        )
+        row_status[is_ruc & ~establishment_ok] = ESTABLECIMIENTO_INVALIDO
+
+        cedula_ok = modulo10_check(digits[:, :9], CEDULA_COEFFICIENTS) == digits[:, 9]
+        public_ok = modulo11_check(digits[:, :8], PUBLIC_COEFFICIENTS) == digits[:, 8]
+        private_ok = modulo11_check(digits[:, :9], PRIVATE_COEFFICIENTS) == digits[:, 9]
+        check_ok = np.select(
+            [row_kind == RUC_PUBLICO, row_kind == RUC_PRIVADO],
+            [public_ok, private_ok],
+            default=cedula_ok
+        )
+        row_status[~check_ok] = VERIFICADOR_INVALIDO
+
+        third_ok = np.where(is_ruc, (third < 7) | (third == 9), third < 6)
+        row_status[~third_ok] = TERCER_DIGITO_INVALIDO
+        row_status[(province < FIRST_PROVINCE) | (province > LAST_PROVINCE)] = PROVINCIA_INVALIDA
+
+        status[rows] = row_status
+        kind[rows] = row_kind
+
+    messages = MESSAGES[status, kind].tolist()
+    if ruc_only:
+        invalid_length = (status == NO_NUMERICA) | (status == LONGITUD_INVALIDA)
+        for i in np.flatnonzero(invalid_length):
+            messages[i] = RUC_LENGTH_MESSAGE
+    return status, messages
+
+def validate_identification(identification):
+    """Valida una cédula o RUC; devuelve (es_valida, mensaje)"""
+    status, messages = validate_identifications([identification])
+    return bool(status[0] == VALIDA), messages[0]
+
+def validate_buyer(identification):
+    """Valida la identificación del comprador de una factura; devuelve (es_valida, mensaje).
+
+    Además de cédulas y RUC se aceptan el consumidor final y los pasaportes.
+    Una identificación solo de dígitos se verifica siempre como cédula o RUC
+    (así una cédula mal escrita no pasa por pasaporte); un pasaporte debe
+    tener letras y números, hasta PASSPORT_MAX_LENGTH caracteres.
+    """
+    identification = (identification or "").strip()
+    if not identification:
+        return False, "La identificación del cliente es obligatoria"
+    if identification == CONSUMIDOR_FINAL:
+        return True, "Consumidor final"
+    if identification.isdigit():
+        return validate_identification(identification)
+    if identification.isascii() and identification.isalnum() and len(identification) <= PASSPORT_MAX_LENGTH:
+        return True, "Pasaporte"
+    return False, (
+        "La identificación debe ser una cédula o RUC (solo dígitos) o un pasaporte "
+        f"(letras y números, hasta {PASSPORT_MAX_LENGTH} caracteres)"
+    )
+
+def validate_ruc(ruc):
+    """Valida un RUC de 13 dígitos; devuelve (es_valido, mensaje)"""
+    status, messages = validate_identifications([ruc], ruc_only=True)
+    return bool(status[0] == VALIDA), messages[0]
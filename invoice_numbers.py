@@ -0,0 +1,129 @@
+import atexit
+import threading
+from invoice_repository import get_repository
+
+# Tabla con el siguiente número libre de cada secuencia
+SEQUENCE_SCHEMA = {
+    "mysql": """CREATE TABLE IF NOT EXISTS secuencias (
+        nombre VARCHAR(32) NOT NULL PRIMARY KEY,
+        siguiente BIGINT NOT NULL
+    )""",
+    "sqlite": """CREATE TABLE IF NOT EXISTS secuencias (
+        nombre TEXT NOT NULL PRIMARY KEY,
+        siguiente INTEGER NOT NULL
+    )""",
+}
+
+INSERT_SEQUENCE = {
+    "mysql": "INSERT IGNORE INTO secuencias (nombre, siguiente) VALUES (%s, 1)",
+    "sqlite": "INSERT OR IGNORE INTO secuencias (nombre, siguiente) VALUES (?, 1)",
+}
+
+DEFAULT_BLOCK_SIZE = 100
+NUMBER_WIDTH = 8  # Dígitos del número de factura
+
+class InvoiceNumberAllocator:
+    """Entrega números de factura consecutivos sin repetirse entre estaciones.
+
+    Cada proceso reserva en la base de datos un bloque de block_size números
+    con una sola actualización atómica y luego los entrega desde memoria, así
+    que varias estaciones y trabajos por lotes pueden pedir miles de números
+    por segundo sin una consulta por factura. Los números nunca se repiten y,
+    dentro de un proceso, siempre aumentan; release() devuelve la parte no
+    usada del bloque si nadie reservó después, para no dejar huecos al cerrar;
+    close() la llama. El asignador compartido (get_allocator) se cierra solo
+    al salir del proceso; los demás los cierra quien los crea.
+    """
+
+    def __init__(self, repository=None, name="facturas", block_size=DEFAULT_BLOCK_SIZE):
+        self.repository = repository or get_repository()
+        self.name = name
+        self.block_size = block_size
+        self.next_value = 0
+        self.block_end = 0  # Primer número fuera del bloque reservado
+        self.lock = threading.Lock()
+        self.create_schema()
+
+    def create_schema(self):
+        dialect = self.repository.dialect
+        with self.repository.transaction() as cursor:
+            cursor.execute(SEQUENCE_SCHEMA[dialect])
+            cursor.execute(INSERT_SEQUENCE[dialect], (self.name,))
+
+    def reserve_block(self, size):
+        """Reserva size números en la base de datos y devuelve el primero"""
+        sql = self.repository.sql
+        with self.repository.transaction() as cursor:
+            # El UPDATE bloquea la fila de la secuencia hasta confirmar la transacción
+            cursor.execute(sql(
+                "UPDATE secuencias SET siguiente = siguiente + %s WHERE nombre = %s"
+            ), (size, self.name))
+            cursor.execute(sql("SELECT siguiente FROM secuencias WHERE nombre = %s"), (self.name,))
+            end = cursor.fetchone()[0]
+        return end - size
+
+    def allocate(self, count=1):
+        """Devuelve una lista con count números de factura nuevos"""
+        numbers = []
+        with self.lock:
+            while len(numbers) < count:
+                if self.next_value >= self.block_end:
+                    size = max(self.block_size, count - len(numbers))
+                    self.next_value = self.reserve_block(size)
+                    self.block_end = self.next_value + size
+                take = min(count - len(numbers), self.block_end - self.next_value)
+                numbers.extend(range(self.next_value, self.next_value + take))
+                self.next_value += take
+        return [str(number).zfill(NUMBER_WIDTH) for number in numbers]
+
+    def next_number(self):
+        """Devuelve el siguiente número de factura"""
+        return self.allocate(1)[0]
+
+    def give_back(self, numero):
+        """Recupera un número entregado que no se llegó a usar.
+
+        Solo es posible si es el último que entregó este asignador; devuelve
+        True si el número se volverá a entregar en la próxima llamada.
+        """
+        with self.lock:
+            if int(numero) != self.next_value - 1:
+                return False
+            self.next_value -= 1
+            return True
+
+    def release(self):
+        """Devuelve a la secuencia los números no usados del bloque, si aún es el último"""
+        with self.lock:
+            if self.next_value >= self.block_end:
+                return
+            with self.repository.transaction() as cursor:
+                cursor.execute(self.repository.sql(
+                    "UPDATE secuencias SET siguiente = %s WHERE nombre = %s AND siguiente = %s"
+                ), (self.next_value, self.name, self.block_end))
+            self.block_end = self.next_value
+
+    def close(self):
+        """Devuelve los números no usados sin interrumpir el cierre si la base falla"""
+        try:
+            self.release()
+        except Exception as e:
+            print(f"No se pudieron devolver los números de factura sin usar: {e}")
+
+_default_allocator = None
+_default_lock = threading.Lock()
+
+def get_allocator():
+    """Asignador compartido por todas las facturas de este proceso"""
+    global _default_allocator
+    if _default_allocator is None:
+        with _default_lock:
+            if _default_allocator is None:
+                _default_allocator = InvoiceNumberAllocator()
+    return _default_allocator
+
+@atexit.register
+def _close_default_allocator():
+    """Devuelve los números sin usar del asignador compartido en cualquier salida normal"""
+    if _default_allocator is not None:
+        _default_allocator.close()
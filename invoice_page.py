@@ -1,14 +1,56 @@
 import flet as ft
-import random
+import threading
+import itertools
 from datetime import datetime
-from invoice_pdf_generator import generate_invoice_pdf
+from background import run_in_background
+from invoice_service import Client, Invoice, InvoiceLine, InvoiceValidationError, get_service
+from product_catalog import get_catalog
+from client_directory import get_directory
+from identification import validate_buyer
+from geography import PROVINCE_NAMES, canonical_province, cities_of, province_for_identification
+from invoice_totals import InvoiceTotals, format_amount, ZERO
+from update_scheduler import UpdateScheduler
+from metrics import timed
 from login_page import LoginPage
 
+# Identificadores únicos para las líneas del modelo de totales
+_line_ids = itertools.count(1)
+
+# Medidas de la lista virtual de productos
+ROW_HEIGHT = 60  # Altura fija de cada fila
+VISIBLE_ROWS = 4  # Filas que caben en el contenedor de productos
+BUFFER_ROWS = 2  # Filas extra construidas arriba y abajo de las visibles
+SUGGESTION_MIN_CHARS = 2  # Letras escritas antes de sugerir productos del catálogo
+CLIENT_MIN_DIGITS = 3  # Dígitos escritos antes de sugerir clientes conocidos
+
+def city_options(province):
+    """Opciones nuevas para el desplegable de ciudades de una provincia.
+
+    Los nombres ya están precalculados en geography; las Option se crean en
+    cada llamada porque un control de Flet solo puede estar en un desplegable.
+    """
+    return [ft.dropdown.Option(text=city) for city in cities_of(province)]
+
+def new_line():
+    """Crear una línea de producto vacía"""
+    return {
+        "id": next(_line_ids),
+        "cantidad": "",
+        "descripcion": "",
+        "precio": "",
+        "incluye_iva": False
+    }
+
 # Movemos ProductRow fuera de la clase InvoicePage
 class ProductRow(ft.Container):
-    def __init__(self, invoice_page, can_delete=False):
+    """Fila reutilizable que muestra y edita la línea de producto enlazada"""
+    def __init__(self, invoice_page):
         super().__init__()
         self.invoice_page = invoice_page
+        self.index = None
+        self.line = None
+        self.height = ROW_HEIGHT
+        self.alignment = ft.alignment.center_left
         self.quantity = ft.TextField(
             width=100,
             label="Cantidad",
@@ -20,7 +62,8 @@ class ProductRow(ft.Container):
         self.description = ft.TextField(
             width=200,
             label="Descripción",
-            border_color=ft.colors.RED_400
+            border_color=ft.colors.RED_400,
+            on_change=self.description_changed
         )
         self.unit_price = ft.TextField(
             width=100,
@@ -31,34 +74,73 @@ class ProductRow(ft.Container):
         )
         self.include_tax = ft.Checkbox(
             label="IVA 15%",
-            value=False
+            value=False,
+            on_change=self.tax_changed
         )
         self.total = ft.Text("0.00")
         
-        controls_list = [
-            self.quantity,
-            self.description,
-            self.unit_price,
-            self.include_tax,
-            self.total
-        ]
-        
-        if can_delete:
-            self.delete_button = ft.IconButton(
-                icon=ft.icons.DELETE,
-                icon_color=ft.colors.RED_400,
-                on_click=self.delete_row
-            )
-            controls_list.append(self.delete_button)
+        # La primera línea de la factura no se puede eliminar
+        self.delete_button = ft.IconButton(
+            icon=ft.icons.DELETE,
+            icon_color=ft.colors.RED_400,
+            on_click=self.delete_row
+        )
         
         self.content = ft.Row(
-            controls=controls_list,
+            controls=[
+                self.quantity,
+                self.description,
+                self.unit_price,
+                self.include_tax,
+                self.total,
+                self.delete_button
+            ],
             spacing=10
         )
+
+    def bind(self, index, line):
+        """Mostrar en esta fila la línea indicada (None para ocultarla)"""
+        self.index = index
+        self.line = line
+        self.visible = line is not None
+        if line is None:
+            return
+        self.quantity.value = line["cantidad"]
+        self.description.value = line["descripcion"]
+        self.unit_price.value = line["precio"]
+        self.include_tax.value = line["incluye_iva"]
+        self.quantity.border_color = ft.colors.RED_400
+        self.unit_price.border_color = ft.colors.RED_400
+        self.total.value = self.invoice_page.line_total_text(line)
+        self.delete_button.visible = index > 0
+
+    def store(self):
+        """Copiar los valores de los campos a la línea enlazada"""
+        self.line["cantidad"] = self.quantity.value
+        self.line["descripcion"] = self.description.value
+        self.line["precio"] = self.unit_price.value
+        self.line["incluye_iva"] = self.include_tax.value
     
     def delete_row(self, e):
         # Llamar al método de la página principal para eliminar esta fila
         self.invoice_page.delete_product_row(self)
+
+    def description_changed(self, e):
+        self.line["descripcion"] = self.description.value
+        self.invoice_page.suggest_products(self)
+
+    def fill_product(self, product):
+        """Copiar descripción, precio e IVA de un producto del catálogo"""
+        self.description.value = product["descripcion"]
+        self.unit_price.value = format_amount(product["precio"])
+        self.unit_price.border_color = ft.colors.GREEN_400
+        self.include_tax.value = product["incluye_iva"]
+        self.store()
+        self.invoice_page.update_line(self, self.description, self.unit_price, self.include_tax)
+
+    def tax_changed(self, e):
+        self.store()
+        self.invoice_page.update_line(self)
     
     def validate_positive_number(self, e):
         """Validar que el valor ingresado sea un número positivo"""
@@ -73,20 +155,17 @@ class ProductRow(ft.Container):
             if value < 0:
                 field.value = "0"
                 field.border_color = ft.colors.RED_400
-                self.invoice_page.page.show_snack_bar(
-                    ft.SnackBar(content=ft.Text("No se permiten valores negativos"))
-                )
+                self.invoice_page.warn("No se permiten valores negativos")
             else:
                 field.border_color = ft.colors.GREEN_400
         except ValueError:
             field.value = "0"
             field.border_color = ft.colors.RED_400
-            self.invoice_page.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text("Por favor ingrese un número válido"))
-            )
+            self.invoice_page.warn("Por favor ingrese un número válido")
         finally:
-            self.invoice_page.calculate_totals(None)
-            self.invoice_page.update()
+            # Recalcular solo esta línea y redibujar los controles que cambiaron
+            self.store()
+            self.invoice_page.update_line(self, field)
 
     def validate_price(self, e):
         """Validar que el precio tenga máximo dos decimales y sea positivo"""
@@ -116,64 +195,120 @@ class ProductRow(ft.Container):
             if price < 0:
                 field.value = "0.00"
                 field.border_color = ft.colors.RED_400
-                self.invoice_page.page.show_snack_bar(
-                    ft.SnackBar(content=ft.Text("No se permiten valores negativos"))
-                )
+                self.invoice_page.warn("No se permiten valores negativos")
             else:
                 field.value = value  # Actualizar el campo con el valor formateado
                 field.border_color = ft.colors.GREEN_400
         except ValueError:
             field.value = "0.00"
             field.border_color = ft.colors.RED_400
-            self.invoice_page.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text("Por favor ingrese un número válido"))
-            )
+            self.invoice_page.warn("Por favor ingrese un número válido")
         finally:
-            self.invoice_page.calculate_totals(None)
-            self.invoice_page.update()
+            # Recalcular solo esta línea y redibujar los controles que cambiaron
+            self.store()
+            self.invoice_page.update_line(self, field)
+
+class ProductListView(ft.ListView):
+    """Lista virtual de productos.
+
+    Las líneas viven en invoice_page.lines y solo se construyen las filas que
+    caben en pantalla (más un margen); al desplazarse, esas mismas filas se
+    vuelven a enlazar con otras líneas y dos espaciadores ocupan la altura
+    del resto, así la memoria no crece con el número de líneas.
+    """
+    def __init__(self, invoice_page):
+        super().__init__(
+            height=ROW_HEIGHT * VISIBLE_ROWS,
+            spacing=0,
+            on_scroll=self.scrolled,
+            on_scroll_interval=50
+        )
+        self.invoice_page = invoice_page
+        self.first = 0
+        self.top_spacer = ft.Container(height=0)
+        self.bottom_spacer = ft.Container(height=0)
+        self.rows = [
+            ProductRow(invoice_page) for _ in range(VISIBLE_ROWS + 2 * BUFFER_ROWS)
+        ]
+        self.controls = [self.top_spacer, *self.rows, self.bottom_spacer]
+
+    def refresh(self):
+        """Volver a enlazar las filas con las líneas de la ventana actual"""
+        lines = self.invoice_page.lines
+        self.first = max(0, min(self.first, len(lines) - len(self.rows)))
+        for offset, row in enumerate(self.rows):
+            index = self.first + offset
+            if index < len(lines):
+                row.bind(index, lines[index])
+            else:
+                row.bind(None, None)
+
+        shown = min(len(self.rows), len(lines) - self.first)
+        self.top_spacer.height = self.first * ROW_HEIGHT
+        self.bottom_spacer.height = (len(lines) - self.first - shown) * ROW_HEIGHT
+
+    def show_last(self):
+        """Mover la ventana al final de la lista (después de agregar una línea)"""
+        self.first = len(self.invoice_page.lines)
+        self.refresh()
+
+    def bound_rows(self):
+        return [row for row in self.rows if row.line is not None]
+
+    def scrolled(self, e):
+        first = max(0, int(e.pixels // ROW_HEIGHT) - BUFFER_ROWS)
+        if first != self.first:
+            self.first = first
+            self.refresh()
+            self.update()
 
 class InvoicePage(ft.View):
     def __init__(self, page):
         super().__init__()
         self.page = page
         
-        # Mapeo de provincias a ciudades
-        self.province_to_cities = {
-            "Pichincha": ["Quito", "Cayambe", "Rumiñahui", "Mejía", "Pedro Vicente Maldonado", "San Miguel de los Bancos", "Puerto Quito"],
-"Azuay": ["Cuenca", "Girón", "Paute", "Azogues", "Biblián", "Chordeleg", "El Pan", "La Troncal", "San Fernando", "Santa Isabel"],
-"Bolívar": ["Guaranda", "Chillanes", "Echeandía", "Las Naves", "San Miguel", "Santiago de los Andes"],
-"Carchi": ["Tulcán", "Bolívar", "Espejo", "Montúfar", "Mataje", "El Chical", "San Gabriel"],
-"Cañar": ["Azogues", "Biblián", "La Troncal", "Cañar", "La Paz", "El Tambo", "Deleg", "Chanchán"],
-"Chimborazo": ["Riobamba", "Alausí", "Chanchán", "Guano", "Colta", "Penipe", "Ficoa"],
-"Cotopaxi": ["Latacunga", "Salcedo", "La Maná", "Pangua", "Pujilí", "Sigchos", "Rumiñahui"],
-"El oro": ["Machala", "Pasaje", "Zaruma", "Arenillas", "Balsas", "Chilla", "El Guabo", "Piñas", "Santa Rosa"],
-"Esmeraldas": ["Esmeraldas", "Atacames", "Muisne", "Río Verde", "Tonchigüe", "Santiago", "La Tola", "Mompiche"],
-"Guayas": ["Guayaquil", "Samborondón", "Durán", "Balao", "Balzar", "Naranjal", "Playas", "General Villamil", "Daule", "Yaguachi"],
-"Imbabura": ["Ibarra", "Otavalo", "Cotacachi", "Antonio Ante", "Urcuquí", "San Gabriel", "La Esperanza", "Mira"],
-"Loja": ["Loja", "Catamayo", "Cariamanga", "Zamora", "Pindal", "Chinchipe", "Cañas", "Macar", "Saraguro"],
-"Los ríos": ["Babahoyo", "Quevedo", "Vinces", "Montalvo", "Ventanas", "Valencia", "Urdaneta", "Palestina"],
-"Manabí": ["Portoviejo", "Manta", "Chone", "Jama", "Jipijapa", "El Carmen", "Pedernales", "Puerto López", "Montecristi", "Bahía de Caráquez"],
-"Morona-santiago": ["Macas", "Sucúa", "Gualaquiza", "Tiwintza", "Huaquillas", "San Juan Bosco", "Puyo", "Río Blanco"],
-"Napo": ["Tena", "Archidona", "El Chaco", "Baeza", "Quijos", "Carlos Julio Arosemena Tola", "Santa Clara"],
-"Oriente": ["Shushufindi", "Coca", "La Joya de los Sachas", "Sucumbíos", "Nueva Loja", "Canton Lago Agrio"],
-"Pastaza": ["Puyo", "Mera", "Arajuno", "Tena", "Santa Clara", "Puyo"],
-"Tungurahua": ["Ambato", "Baños", "Patate", "Cevallos", "Mocha", "Totorillas", "Pelileo", "Quero", "Pillaro"],
-"Zamora-chinchipe": ["Zamora", "Loja", "Yantzaza", "Centinela del Cóndor", "Chinchipe", "El Pangui", "Pindal", "Cariamanga"],
-"Morona-santiago": ["Macas", "Sucúa", "Gualaquiza", "Tiwintza", "San Juan Bosco", "Puyo", "Río Blanco"],
-"Carchi": ["Tulcán", "Bolívar", "Espejo", "Montúfar", "Mataje", "El Chical", "San Gabriel"],
-"Galápagos": ["Puerto Ayora", "Puerto Baquerizo Moreno", "Isabela", "San Cristóbal", "Floreana"],
-"Cotopaxi": ["Latacunga", "Salcedo", "La Maná", "Pangua", "Pujilí", "Sigchos", "Rumiñahui"]
-            # Agrega más provincias y ciudades según sea necesario
-        }
-
         # Inicializar el campo de provincia
         self.province_dropdown = ft.Dropdown(
             label="Provincia",
             width=300,
-            options=[ft.dropdown.Option(text=prov) for prov in self.province_to_cities.keys()],
+            options=[ft.dropdown.Option(text=province) for province in PROVINCE_NAMES],
             on_change=self.province_selected
         )
 
+        # Campos del cliente; al escribir la identificación se sugieren clientes conocidos
+        self.client_field = ft.TextField(
+            label="Cliente",
+            width=300,
+            border_color=ft.colors.RED_400
+        )
+        self.identification_field = ft.TextField(
+            label="Identificación (Cédula/RUC)",
+            width=300,
+            border_color=ft.colors.RED_400,
+            on_change=self.identification_changed,
+            on_blur=self.validate_identification_field
+        )
+        self.address_field = ft.TextField(
+            label="Dirección",
+            width=300,
+            border_color=ft.colors.RED_400
+        )
+
+        # Campos de la factura
+        self.number_field = ft.TextField(
+            label="N° Factura",
+            value="",
+            hint_text="Se asigna al generar",
+            width=200,
+            read_only=True,
+            border_color=ft.colors.RED_400
+        )
+        self.vendor_field = ft.TextField(
+            label="Vendedor",
+            width=200,
+            border_color=ft.colors.RED_400
+        )
+
         # Inicializar el campo de ciudad (inicialmente oculto)
         self.city_dropdown = ft.Dropdown(
             label="Ciudad",
@@ -196,6 +331,7 @@ class InvoicePage(ft.View):
             first_date=datetime(2020, 1, 1),
             last_date=datetime(2030, 12, 31)
         )
+        # La vista se construye una sola vez, así que el DatePicker entra al overlay una vez
         self.page.overlay.append(self.date_picker)
         
         # Inicializar el campo de fecha
@@ -207,16 +343,50 @@ class InvoicePage(ft.View):
         )
         
         # Inicializar el menú como atributo de clase
+        # Se desactiva mientras se genera la factura actual, para no guardarla dos veces
+        self.generate_item = ft.PopupMenuItem(text="Generar PDF", on_click=self.generate_pdf)
         self.menu = ft.PopupMenuButton(
             items=[
                 ft.PopupMenuItem(text="Nueva factura", on_click=self.new_invoice),
-                ft.PopupMenuItem(text="Generar PDF", on_click=self.generate_pdf),
+                self.generate_item,
                 ft.PopupMenuItem(text="Cerrar programa", on_click=self.close_app),
             ]
         )
         
-        # Inicializar products_list antes de cualquier otra cosa
-        self.products_list = ft.Column(spacing=10)
+        # Indicador de PDFs que se están generando en segundo plano
+        self.pending_pdfs = 0
+        self.pending_lock = threading.Lock()
+        self.pdf_progress_text = ft.Text("", size=12, color=ft.colors.RED_700)
+        self.pdf_progress = ft.Row(
+            controls=[
+                ft.ProgressRing(width=16, height=16, stroke_width=2),
+                self.pdf_progress_text
+            ],
+            visible=False
+        )
+        
+        # Inicializar las líneas y products_list antes de cualquier otra cosa
+        self.lines = []
+        self.generation = 0  # Cambia con cada factura nueva (ver reset)
+        self.totals = InvoiceTotals()
+        self.totals_lock = threading.Lock()
+        
+        # Los cambios de los campos se envían juntos, una vez por cuadro
+        self.scheduler = UpdateScheduler(page)
+        self.products_list = ProductListView(self)
+        
+        # Sugerencias del catálogo de productos o del directorio de clientes
+        self.catalog = get_catalog()
+        self.directory = get_directory()
+        self.suggestions = ft.Column(spacing=0)
+        self.suggestions_panel = ft.Container(
+            content=self.suggestions,
+            border=ft.border.all(1, ft.colors.BLACK12),
+            border_radius=10,
+            visible=False
+        )
+        run_in_background(self.catalog.refresh)
+        run_in_background(self.directory.load)
         
         self.initialize_view()
 
@@ -232,9 +402,6 @@ class InvoicePage(ft.View):
         self.route = "/invoice"
         self.bgcolor = ft.colors.WHITE
         
-        # Generar código único de factura (8 dígitos)
-        invoice_code = str(random.randint(10000000, 99999999))
-        
         # Establecer la fecha actual en el campo de fecha
         self.date_field.value = datetime.now().strftime("%Y-%m-%d")
         
@@ -245,29 +412,17 @@ class InvoicePage(ft.View):
                     self.menu,
                     ft.Text("ManzaFAC - Facturación", 
                            size=32,
-                           color=ft.colors.RED_700)
+                           color=ft.colors.RED_700),
+                    self.pdf_progress
                 ]),
                 
                 # Información del cliente - lado izquierdo
                 ft.Row([
                     # Columna izquierda - datos del cliente
                     ft.Column([
-                        ft.TextField(
-                            label="Cliente",
-                            width=300,
-                            border_color=ft.colors.RED_400
-                        ),
-                        ft.TextField(
-                            label="Identificación (Cédula/RUC)",
-                            width=300,
-                            border_color=ft.colors.RED_400,
-                            on_blur=self.validate_identification_field
-                        ),
-                        ft.TextField(
-                            label="Dirección",
-                            width=300,
-                            border_color=ft.colors.RED_400
-                        ),
+                        self.client_field,
+                        self.identification_field,
+                        self.address_field,
                         self.province_dropdown,  # Campo de provincia
                         self.city_dropdown,      # Campo de ciudad
                     ]),
@@ -277,13 +432,7 @@ class InvoicePage(ft.View):
                     
                     # Columna derecha - datos de la factura
                     ft.Column([
-                        ft.TextField(
-                            label="N° Factura",
-                            value=invoice_code,
-                            width=200,
-                            read_only=True,
-                            border_color=ft.colors.RED_400
-                        ),
+                        self.number_field,
                         ft.Row([
                             self.date_field,
                             ft.IconButton(
@@ -291,11 +440,7 @@ class InvoicePage(ft.View):
                                 on_click=lambda _: self.date_picker.pick_date()
                             )
                         ]),
-                        ft.TextField(
-                            label="Vendedor",
-                            width=200,
-                            border_color=ft.colors.RED_400
-                        ),
+                        self.vendor_field,
                     ]),
                 ], alignment=ft.MainAxisAlignment.START),
             ])
@@ -350,14 +495,10 @@ class InvoicePage(ft.View):
             totals_column
         ], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
 
-        # Modificar la sección de productos para tener una altura máxima
+        # Sección de productos con altura fija; la lista solo construye las filas visibles
         products_container = ft.Container(
-            content=ft.Column(
-                controls=[self.products_list],
-                scroll=ft.ScrollMode.AUTO,  # El scroll va en el Column, no en el Container
-                spacing=10,
-            ),
-            height=240,  # Altura para 4 productos (60px cada uno)
+            content=self.products_list,
+            height=ROW_HEIGHT * VISIBLE_ROWS,  # Altura para 4 productos (60px cada uno)
             border=ft.border.all(1, ft.colors.BLACK12),
             border_radius=10
         )
@@ -368,6 +509,7 @@ class InvoicePage(ft.View):
                 content=ft.Column([
                     self.header,
                     ft.Divider(),
+                    self.suggestions_panel,
                     products_container,  # Usar el nuevo contenedor de productos
                     footer_row
                 ]),
@@ -376,43 +518,61 @@ class InvoicePage(ft.View):
         ]
 
     def add_product_row(self):
-        """Método para añadir una nueva fila de producto"""
-        # Verificar si ya hay 8 productos
-        if len(self.products_list.controls) >= 8:
-            self.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text("No se pueden agregar más de 8 productos"))
-            )
-            return
-        
-        can_delete = len(self.products_list.controls) > 0
-        new_row = ProductRow(self, can_delete=can_delete)
-        self.products_list.controls.append(new_row)
+        """Método para añadir una nueva línea de producto"""
+        self.lines.append(new_line())
+        self.products_list.show_last()
         self.adjust_window_size()
         self.update()
-
-    def new_invoice(self, e):
-        # Limpiar productos
-        self.products_list.controls = []
-        self.add_product_row()
+        if len(self.lines) > VISIBLE_ROWS:
+            self.products_list.scroll_to(offset=-1)
+
+    def reset(self):
+        """Dejar la página lista para una factura nueva sin reconstruir los controles"""
+        self.scheduler.cancel()
+        self.generation += 1
+        
+        # Limpiar productos; las tareas demoradas que ya empezaron usan el mismo candado
+        with self.totals_lock:
+            self.lines.clear()
+            self.totals.clear()
+            self.lines.append(new_line())
+        self.products_list.first = 0
+        self.products_list.refresh()
+        self.hide_suggestions()
+        
+        # Traer los productos nuevos o modificados desde la última consulta
+        run_in_background(self.catalog.refresh)
         
         # Limpiar campos del cliente
-        client_fields = self.header.content.controls[1].controls[0].controls
-        for field in client_fields:
+        for field in (
+            self.client_field,
+            self.identification_field,
+            self.address_field,
+            self.province_dropdown,
+            self.city_dropdown
+        ):
             field.value = ""
+        self.identification_field.border_color = ft.colors.RED_400
+        self.city_dropdown.visible = False
         
         # Limpiar campo del vendedor
-        self.header.content.controls[1].controls[2].controls[2].value = ""
+        self.vendor_field.value = ""
         
-        # Generar nuevo número de factura
-        new_invoice_code = str(random.randint(10000000, 99999999))
-        self.header.content.controls[1].controls[2].controls[0].value = new_invoice_code
+        # El número de la nueva factura se asigna cuando se genere
+        self.number_field.value = ""
+        self.generate_item.disabled = False
         
         # Establecer la fecha actual en lugar de dejarla en blanco
         self.date_field.value = datetime.now().strftime("%Y-%m-%d")
         
         # Limpiar totales y descuento
         self.discount.value = "0"
-        self.calculate_totals(None)
+        with self.totals_lock:
+            self.totals.set_discount("0")
+            self.render_totals()
+
+    def new_invoice(self, e):
+        self.reset()
         
         # Resetear altura de la ventana
         self.page.window_height = 800
@@ -420,132 +580,291 @@ class InvoicePage(ft.View):
         self.update()
 
     def close_app(self, e):
+        # Devolver los números de factura reservados y no usados antes de salir
+        get_service().close()
         self.page.window_close()
 
+    def current_invoice(self):
+        """Copiar los datos de los campos a una factura independiente de la interfaz"""
+        return Invoice(
+            client=Client(
+                nombre=self.client_field.value or "",
+                identificacion=self.identification_field.value or "",
+                direccion=self.address_field.value or "",
+                provincia=self.province_dropdown.value or "",
+                # Incluir la ciudad solo si está visible
+                ciudad=(self.city_dropdown.value or "") if self.city_dropdown.visible else ""
+            ),
+            lines=[
+                InvoiceLine(
+                    cantidad=line["cantidad"],
+                    descripcion=line["descripcion"],
+                    precio=line["precio"],
+                    incluye_iva=line["incluye_iva"]
+                )
+                for line in self.lines
+            ],
+            fecha=self.date_field.value,
+            vendedor=self.vendor_field.value or "",
+            descuento=self.discount.value or "0",
+            numero=self.number_field.value or ""
+        )
+
     def generate_pdf(self, e):
         """Genera un PDF de la factura actual"""
-        # Recopilar datos del cliente
-        client_data = {
-            "cliente": self.header.content.controls[1].controls[0].controls[0].value,
-            "identificacion": self.header.content.controls[1].controls[0].controls[1].value,
-            "direccion": self.header.content.controls[1].controls[0].controls[2].value,
-            "provincia": self.province_dropdown.value,  # Acceder al valor del Dropdown
-            "ciudad": self.city_dropdown.value if self.city_dropdown.visible else ""  # Incluir la ciudad si está visible
-        }
-        
-        # Recopilar datos de la factura
-        invoice_data = {
-            "numero": self.header.content.controls[1].controls[2].controls[0].value,
-            "fecha": self.date_field.value,
-            "vendedor": self.header.content.controls[1].controls[2].controls[2].value,
-        }
-        
-        # Recopilar productos
-        products = []
-        for product_row in self.products_list.controls:
-            products.append({
-                "cantidad": product_row.quantity.value,
-                "descripcion": product_row.description.value,
-                "precio": product_row.unit_price.value,
-                "incluye_iva": product_row.include_tax.value,
-                "total": product_row.total.value.replace("$", "")
+        if self.generate_item.disabled:
+            return
+        service = get_service()
+        invoice = self.current_invoice()
+        errors = service.validate(invoice)
+        if errors:
+            self.page.show_snack_bar(ft.SnackBar(content=ft.Text("\n".join(errors))))
+            return
+
+        generation = self.generation
+
+        # Los datos ya quedaron copiados: el número se asigna, la factura se
+        # guarda y el PDF se escribe en segundo plano, y el usuario puede
+        # empezar la siguiente mientras tanto. Solo las facturas generadas
+        # consumen números de la secuencia.
+        self.generate_item.disabled = True
+        self.update_controls([self.menu])
+        self.update_pdf_progress(1)
+
+        def show_number(numero):
+            # Mostrar el número asignado si la página sigue con esta factura
+            # y volver a habilitar la generación
+            if generation != self.generation:
+                return
+            changed = [self.menu]
+            if numero and not self.number_field.value:
+                self.number_field.value = numero
+                changed.append(self.number_field)
+            self.generate_item.disabled = False
+            self.update_controls(changed)
+
+        def work():
+            result = service.create(invoice)
+            self.directory.remember({
+                "identificacion": invoice.client.identificacion,
+                "nombre": invoice.client.nombre,
+                "direccion": invoice.client.direccion,
+                "provincia": invoice.client.provincia,
+                "ciudad": invoice.client.ciudad,
             })
-        
-        # Recopilar totales
-        totals = {
-            "subtotal": self.subtotal.value.split("$")[1],
-            "iva": self.tax.value.split("$")[1],
-            "descuento": self.discount.value,
-            "total": self.total.value.split("$")[1]
-        }
-        
-        try:
-            # Llamar al generador de PDF
-            generate_invoice_pdf(
-                client_data=client_data,
-                invoice_data=invoice_data,
-                products=products,
-                totals=totals
-            )
+            return result
+
+        def on_done(result):
+            show_number(result["numero"])
+            self.update_pdf_progress(-1)
             # Mostrar mensaje de éxito
             self.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text("PDF generado exitosamente"))
+                ft.SnackBar(content=ft.Text(f"PDF de la factura {result['numero']} generado exitosamente"))
             )
-        except Exception as e:
+
+        def on_error(error):
+            # Si el número no pudo volver a la secuencia, el reintento lo reutiliza
+            show_number(invoice.numero)
+            self.update_pdf_progress(-1)
             # Mostrar mensaje de error
+            message = "\n".join(error.errors) if isinstance(error, InvoiceValidationError) else str(error)
             self.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text(f"Error al generar PDF: {str(e)}"))
+                ft.SnackBar(content=ft.Text(f"Error al generar PDF: {message}"))
             )
-        
+
+        run_in_background(work, on_done=on_done, on_error=on_error)
+
+    def update_pdf_progress(self, delta):
+        """Actualizar el indicador de PDFs pendientes"""
+        with self.pending_lock:
+            self.pending_pdfs += delta
+            pending = self.pending_pdfs
+        self.pdf_progress.visible = pending > 0
+        self.pdf_progress_text.value = (
+            "Generando PDF..." if pending == 1 else f"Generando {pending} PDFs..."
+        )
         self.update()
 
+    @timed()
     def calculate_totals(self, e):
-        """Calcular totales en el orden correcto:
+        """Recalcular todos los totales desde los campos de la factura:
         1. Aplicar descuento a cada producto
         2. Calcular IVA sobre productos marcados (después del descuento)
         3. Mostrar subtotal (suma de productos con descuento)
         4. Mostrar total (subtotal + IVA)
         """
-        subtotal = 0
-        total_iva = 0
-        
-        try:
-            discount_percent = float(self.discount.value or 0)
-            discount_percent = max(0, min(100, discount_percent))  # Limitar entre 0 y 100
-        except ValueError:
-            discount_percent = 0
-
-        # Calcular para cada producto
-        for product in self.products_list.controls:
-            try:
-                if not product.quantity.value or not product.unit_price.value:
-                    continue
-
-                quantity = float(product.quantity.value)
-                price = float(product.unit_price.value)
-
-                if quantity < 0 or price < 0:
-                    continue
-
-                # 1. Calcular precio base de la línea
-                line_total = quantity * price
-
-                # 2. Aplicar descuento si existe
-                if discount_percent > 0:
-                    discount_amount = line_total * (discount_percent / 100)
-                    line_total_with_discount = line_total - discount_amount
-                else:
-                    line_total_with_discount = line_total
-
-                # 3. Calcular IVA si el producto está marcado (sobre el monto con descuento)
-                if product.include_tax.value:
-                    iva_producto = line_total_with_discount * 0.15
-                    total_iva += iva_producto
-                
-                # Actualizar el total mostrado en la línea del producto
-                product.total.value = f"${line_total_with_discount:.2f}"
-                
-                # Agregar al subtotal
-                subtotal += line_total_with_discount
+        with self.totals_lock:
+            self.totals.clear()
+            self.totals.set_discount(self.discount.value)
+
+            for line in self.lines:
+                self.totals.set_line(
+                    line["id"],
+                    line["cantidad"],
+                    line["precio"],
+                    line["incluye_iva"]
+                )
+
+        # Solo las filas construidas muestran su total
+        self.products_list.refresh()
+        self.render_totals()
+        self.update()
+
+    @timed()
+    def update_line(self, row, *changed):
+        """Actualizar los totales con los cambios de una sola línea"""
+        line = row.line
+        with self.totals_lock:
+            self.totals.set_line(
+                line["id"],
+                line["cantidad"],
+                line["precio"],
+                line["incluye_iva"]
+            )
+            changed = list(changed)
+            changed += self.set_text(row.total, self.line_total_text(line))
+            changed += self.render_totals()
+        self.update_controls(changed)
+
+    def line_total_text(self, line):
+        # Las líneas incompletas no suman y se muestran en cero
+        line_total = self.totals.line_total(line["id"])
+        return f"${format_amount(line_total or ZERO)}"
+
+    def render_totals(self):
+        """Escribir los totales en pantalla y devolver los Text que cambiaron"""
+        return (
+            self.set_text(self.subtotal, f"Subtotal: ${format_amount(self.totals.subtotal)}")
+            + self.set_text(self.tax, f"IVA (15%): ${format_amount(self.totals.iva)}")
+            + self.set_text(self.total, f"Total: ${format_amount(self.totals.total)}")
+        )
 
-            except ValueError:
-                continue
+    def set_text(self, text, value):
+        if text.value == value:
+            return []
+        text.value = value
+        return [text]
+
+    def update_controls(self, controls):
+        """Enviar al cliente solo los controles indicados, en el próximo cuadro"""
+        self.scheduler.mark(*controls)
+
+    def warn(self, message):
+        """Mostrar un aviso de validación cuando se deja de escribir, no en cada tecla"""
+        self.scheduler.debounce(
+            "aviso",
+            lambda: self.page.show_snack_bar(ft.SnackBar(content=ft.Text(message)))
+        )
 
-        # Calcular total final (subtotal + IVA)
-        total = subtotal + total_iva
+    def suggest_products(self, row):
+        """Mostrar los productos del catálogo que coinciden con la descripción de la fila"""
+        text = row.description.value or ""
+        products = self.catalog.search(text) if len(text.strip()) >= SUGGESTION_MIN_CHARS else []
+        if not products and not self.suggestions_panel.visible:
+            return
 
-        # Actualizar los valores mostrados
-        self.subtotal.value = f"Subtotal: ${subtotal:.2f}"
-        self.tax.value = f"IVA (15%): ${total_iva:.2f}"
-        self.total.value = f"Total: ${total:.2f}"
+        line = row.line
+
+        def picked(product):
+            def click(e):
+                self.hide_suggestions()
+                # La fila pudo enlazarse con otra línea al desplazar la lista
+                if row.line is line:
+                    row.fill_product(product)
+                self.update_controls([self.suggestions_panel])
+            return click
+
+        self.show_suggestions([
+            ft.ListTile(
+                dense=True,
+                title=ft.Text(product["descripcion"]),
+                subtitle=ft.Text(product["codigo"]),
+                trailing=ft.Text(f"${format_amount(product['precio'])}"),
+                on_click=picked(product)
+            )
+            for product in products
+        ])
 
-        self.update()
+    def identification_changed(self, e):
+        """Completar los datos de un cliente conocido o sugerir identificaciones"""
+        text = (self.identification_field.value or "").strip()
+        client = self.directory.cached(text)
+        if client is not None:
+            # Cliente frecuente: se llena sin consultar la base de datos
+            self.hide_suggestions()
+            self.fill_client(client)
+            return
+
+        matches = self.directory.complete(text) if len(text) >= CLIENT_MIN_DIGITS else []
+        if matches and matches[0][0] == text:
+            self.hide_suggestions()
+            self.update_controls([self.suggestions_panel])
+            self.load_client(text)
+            return
+        if not matches and not self.suggestions_panel.visible:
+            return
+
+        def picked(identificacion):
+            def click(e):
+                self.identification_field.value = identificacion
+                self.hide_suggestions()
+                self.update_controls([self.suggestions_panel, self.identification_field])
+                self.load_client(identificacion)
+            return click
+
+        self.show_suggestions([
+            ft.ListTile(
+                dense=True,
+                title=ft.Text(nombre),
+                subtitle=ft.Text(identificacion),
+                on_click=picked(identificacion)
+            )
+            for identificacion, nombre in matches
+        ])
+
+    def load_client(self, identificacion):
+        """Buscar un cliente fuera de la caché en segundo plano y llenar el encabezado"""
+        def on_done(client):
+            if client is not None and self.identification_field.value.strip() == identificacion:
+                self.fill_client(client)
+
+        run_in_background(lambda: self.directory.find(identificacion), on_done=on_done)
+
+    def fill_client(self, client):
+        """Copiar los datos de un cliente a los campos del encabezado"""
+        self.client_field.value = client["nombre"]
+        self.address_field.value = client["direccion"] or ""
+        self.identification_field.border_color = ft.colors.GREEN_400
+        province = canonical_province(client["provincia"])
+        if province:
+            self.province_dropdown.value = province
+            self.show_cities(province)
+            self.city_dropdown.value = client["ciudad"]
+        self.update_controls([
+            self.client_field,
+            self.identification_field,
+            self.address_field,
+            self.province_dropdown,
+            self.city_dropdown
+        ])
+
+    def show_suggestions(self, tiles):
+        self.suggestions.controls = tiles
+        self.suggestions_panel.visible = bool(tiles)
+        self.update_controls([self.suggestions_panel])
+
+    def hide_suggestions(self):
+        self.suggestions.controls = []
+        self.suggestions_panel.visible = False
 
     def delete_product_row(self, row):
-        """Método para eliminar una fila de producto"""
-        if row in self.products_list.controls:
-            self.products_list.controls.remove(row)
-            self.calculate_totals(None)
+        """Método para eliminar la línea de producto mostrada en una fila"""
+        if row.line is not None:
+            with self.totals_lock:
+                del self.lines[row.index]
+                self.totals.remove_line(row.line["id"])
+                self.render_totals()
+            self.products_list.refresh()
             self.adjust_window_size()
             self.update()
 
@@ -555,73 +874,8 @@ class InvoicePage(ft.View):
         self.page.update()
 
     def validate_identification(self, identification):
-        """Valida cédula o RUC ecuatoriano"""
-        if not identification.isdigit():
-            return False, "La identificación debe contener solo números"
-            
-        length = len(identification)
-        if length not in [10, 13]:
-            return False, "La identificación debe tener 10 dígitos (cédula) o 13 dígitos (RUC)"
-            
-        # Validar provincia (primeros 2 dígitos)
-        provincia = int(identification[:2])
-        if provincia < 1 or provincia > 24:
-            return False, "Los dos primeros dígitos deben corresponder a una provincia válida (01-24)"
-
-        # Validar tercer dígito
-        tercer_digito = int(identification[2])
-        
-        if length == 10:  # Cédula
-            if tercer_digito > 5:
-                return False, "El tercer dígito de la cédula debe ser menor a 6"
-                
-            # Algoritmo validación cédula
-            coeficientes = [2, 1, 2, 1, 2, 1, 2, 1, 2]
-            suma = 0
-            for i in range(9):
-                valor = int(identification[i]) * coeficientes[i]
-                suma += valor if valor < 10 else valor - 9
-                
-            verificador = 0 if (suma % 10 == 0) else 10 - (suma % 10)
-            if verificador != int(identification[9]):
-                return False, "Número de cédula no válido (dígito verificador incorrecto)"
-                
-            return True, "Cédula válida"
-            
-        else:  # RUC (13 dígitos)
-            if tercer_digito == 6:  # RUC Público
-                coeficientes = [3, 2, 7, 6, 5, 4, 3, 2]
-                suma = 0
-                for i in range(8):
-                    suma += int(identification[i]) * coeficientes[i]
-                residuo = suma % 11
-                verificador = 11 - residuo if residuo != 0 else 0
-                if verificador != int(identification[8]):
-                    return False, "RUC público no válido"
-                    
-            elif tercer_digito == 9:  # RUC Jurídico
-                coeficientes = [4, 3, 2, 7, 6, 5, 4, 3, 2]
-                suma = 0
-                for i in range(9):
-                    suma += int(identification[i]) * coeficientes[i]
-                residuo = suma % 11
-                verificador = 11 - residuo if residuo != 0 else 0
-                if verificador != int(identification[9]):
-                    return False, "RUC jurídico no válido"
-                    
-            elif tercer_digito < 6:  # RUC Natural
-                # Validar primero como cédula (primeros 10 dígitos)
-                is_valid_cedula, mensaje = self.validate_identification(identification[:10])
-                if not is_valid_cedula:
-                    return False, "RUC persona natural no válido"
-            else:
-                return False, "Tipo de RUC no válido"
-                
-            # Validar que los últimos dígitos del RUC sean 001
-            if identification[-3:] != "001":
-                return False, "Los últimos 3 dígitos del RUC deben ser 001"
-                
-            return True, "RUC válido"
+        """Valida cédula o RUC ecuatoriano (o acepta consumidor final y pasaporte)"""
+        return validate_buyer(identification)
 
     def validate_identification_field(self, e):
         """Validar el campo de identificación cuando pierde el foco"""
@@ -637,20 +891,25 @@ class InvoicePage(ft.View):
                 )
             else:
                 identification_field.border_color = ft.colors.GREEN_400
+                # Los dos primeros dígitos indican la provincia del cliente
+                if not self.province_dropdown.value:
+                    province = province_for_identification(identification_field.value)
+                    if province:
+                        self.province_dropdown.value = province
+                        self.city_dropdown.value = None
+                        self.show_cities(province)
             self.update()
 
     def province_selected(self, e):
         """Mostrar el campo de ciudad con las opciones correspondientes a la provincia seleccionada"""
-        selected_province = self.province_dropdown.value
-        if selected_province in self.province_to_cities:
-            cities = self.province_to_cities[selected_province]
-            self.city_dropdown.options = [ft.dropdown.Option(text=city) for city in cities]
-            self.city_dropdown.visible = True
-        else:
-            self.city_dropdown.visible = False
-
+        self.show_cities(self.province_dropdown.value)
         self.update()
 
+    def show_cities(self, selected_province):
+        options = city_options(selected_province)
+        self.city_dropdown.options = options
+        self.city_dropdown.visible = bool(options)
+
     def validate_discount(self, e):
         """Validar que el descuento sea un número entre 0 y 100"""
         try:
@@ -661,26 +920,34 @@ class InvoicePage(ft.View):
                 return
 
             value = float(self.discount.value)
+            if value != value:
+                raise ValueError("nan")  # NaN no es menor ni mayor que ningún límite
             if value < 0:
                 self.discount.value = "0"
                 self.discount.border_color = ft.colors.RED_400
-                self.page.show_snack_bar(
-                    ft.SnackBar(content=ft.Text("El descuento no puede ser negativo"))
-                )
+                self.warn("El descuento no puede ser negativo")
             elif value > 100:
                 self.discount.value = "100"
                 self.discount.border_color = ft.colors.RED_400
-                self.page.show_snack_bar(
-                    ft.SnackBar(content=ft.Text("El descuento no puede ser mayor a 100%"))
-                )
+                self.warn("El descuento no puede ser mayor a 100%")
             else:
                 self.discount.border_color = ft.colors.GREEN_400
         except ValueError:
             self.discount.value = "0"
             self.discount.border_color = ft.colors.RED_400
-            self.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text("Por favor ingrese un número válido"))
-            )
+            self.warn("Por favor ingrese un número válido")
         finally:
-            self.calculate_totals(None)
-            self.update()
\ No newline at end of file
+            # El campo se corrige en el próximo cuadro; las líneas se recalculan
+            # una sola vez cuando se deja de escribir
+            self.update_controls([self.discount])
+            self.scheduler.debounce("descuento", self.apply_discount)
+
+    def apply_discount(self):
+        """Aplicar el descuento a todas las líneas, sin volver a leer sus campos"""
+        with self.totals_lock:
+            self.totals.set_discount(self.discount.value)
+            changed = []
+            for row in self.products_list.bound_rows():
+                changed += self.set_text(row.total, self.line_total_text(row.line))
+            changed += self.render_totals()
+        self.update_controls(changed)
\ No newline at end of file
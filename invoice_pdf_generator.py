@@ -2,157 +2,605 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A6
 from reportlab.lib import colors
 from reportlab.lib.units import cm
-import mysql.connector
+from reportlab.graphics.barcode.code128 import Code128
+import io
 import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from decimal import Decimal
+from access_key import invoice_access_key, with_access_keys
+from batch_sinks import (
+    DEFAULT_BUSINESS_DATA, ZipSink, check_invoice, finish_summary, new_result, new_summary, record_result
+)
+from database import get_business_data, add_business_listener
+from invoice_totals import parse_amount, format_amount, product_totals
+from metrics import timed
 
-def get_business_data():
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            database='manzafac',
-            user='root',
-            password='root'
-        )
-        
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)
-            cursor.execute("SELECT * FROM negocios ORDER BY id DESC LIMIT 1")
-            business_data = cursor.fetchone()
-            return business_data
-            
-    except Exception as e:
-        print(f"Error al obtener datos del negocio: {e}")
-        return None
-    finally:
-        if 'connection' in locals() and connection.is_connected():
-            cursor.close()
-            connection.close()
-
-def generate_invoice_pdf(client_data, invoice_data, products, totals):
-    # Obtener datos del negocio
-    business_data = get_business_data()
-    if not business_data:
-        business_data = {
-            'business_name': 'ManzaFAC',
-            'ruc': 'N/A',
-            'address': 'N/A',
-            'province': 'N/A'
+# Diseño de la página A6, calculado una sola vez al importar el módulo
+PAGE_SIZE = A6
+PAGE_WIDTH, PAGE_HEIGHT = PAGE_SIZE
+MARGIN = 0.5 * cm
+BOX_GAP = 15  # Espacio entre recuadros
+BUSINESS_BOX_HEIGHT = 50
+COMBINED_BOX_HEIGHT = 90
+
+# Tabla de productos
+COL_WIDTHS = [30, 120, 40, 40]
+COL_X = [MARGIN + sum(COL_WIDTHS[:i]) for i in range(len(COL_WIDTHS))]
+TABLE_WIDTH = sum(COL_WIDTHS)
+ROW_HEIGHT = 15
+HEADERS = ["Cant.", "Descripción", "Precio", "Total"]
+DESCRIPTION_CHARS = 20
+
+# Recuadro de totales
+TOTALS_GAP = 10
+TOTALS_BOX_WIDTH = 100
+TOTALS_X = PAGE_WIDTH - MARGIN - TOTALS_BOX_WIDTH
+TOTALS_HEIGHT = TOTALS_GAP + 4 * ROW_HEIGHT
+
+# Clave de acceso en Code128, a la izquierda del recuadro de totales. Todas
+# las claves tienen 49 dígitos y por eso el mismo número de módulos.
+BARCODE_WIDTH = TOTALS_X - MARGIN - 5
+BARCODE_HEIGHT = 30
+ACCESS_KEY_FONT_SIZE = 5
+ACCESS_KEY_MODULES = Code128("0" * 49, barWidth=1, quiet=0).width
+
+# Inicio de la tabla en la primera página (debajo del cliente) y en las siguientes
+FIRST_TABLE_TOP = PAGE_HEIGHT - MARGIN - BUSINESS_BOX_HEIGHT - BOX_GAP - COMBINED_BOX_HEIGHT - BOX_GAP
+NEXT_TABLE_TOP = PAGE_HEIGHT - MARGIN - BUSINESS_BOX_HEIGHT - BOX_GAP
+
+def _rows_that_fit(table_top, reserved):
+    """Filas de productos que caben debajo del encabezado dejando espacio reservado"""
+    available = table_top - ROW_HEIGHT - MARGIN - reserved
+    return max(0, int(available // ROW_HEIGHT))
+
+# Filas por página: las páginas intermedias reservan la fila del subtotal de
+# página y la última reserva el recuadro de totales
+FIRST_PAGE_ROWS = _rows_that_fit(FIRST_TABLE_TOP, TOTALS_GAP + ROW_HEIGHT)
+NEXT_PAGE_ROWS = _rows_that_fit(NEXT_TABLE_TOP, TOTALS_GAP + ROW_HEIGHT)
+FIRST_PAGE_ROWS_WITH_TOTALS = _rows_that_fit(FIRST_TABLE_TOP, TOTALS_HEIGHT)
+NEXT_PAGE_ROWS_WITH_TOTALS = _rows_that_fit(NEXT_TABLE_TOP, TOTALS_HEIGHT)
+
+def paginate(count):
+    """Divide count productos en páginas y devuelve una lista de rangos (inicio, fin).
+
+    La última página siempre tiene espacio para el recuadro de totales; si las
+    últimas filas no lo dejan, los totales pasan a una página sin productos.
+    """
+    pages = []
+    start = 0
+    first = True
+    while True:
+        remaining = count - start
+        fit_with_totals = FIRST_PAGE_ROWS_WITH_TOTALS if first else NEXT_PAGE_ROWS_WITH_TOTALS
+        if remaining <= fit_with_totals:
+            pages.append((start, count))
+            return pages
+        end = start + min(remaining, FIRST_PAGE_ROWS if first else NEXT_PAGE_ROWS)
+        pages.append((start, end))
+        start = end
+        first = False
+
+# Etiquetas fijas; cada factura solo estampa sus valores a continuación
+INVOICE_LABELS = ["Orden N°: ", "Fecha: ", "Vendedor: ", "Cliente: ", "ID: ", "Dir: ", "Provincia: ", "Ciudad: "]
+TOTALS_LABELS = ["Subtotal: $", "IVA: $", "Desc: ", "Total: $"]
+BUSINESS_FIELDS = ('business_name', 'ruc', 'address', 'province')
+TEMPLATE_CACHE_SIZE = 8
+IN_FLIGHT_PER_WORKER = 2  # Facturas enviadas al pool por cada proceso, en lotes
+
+_template_ids = itertools.count(1)
+
+def _replay(c, ops):
+    """Ejecuta sobre el canvas una lista de operaciones (método, argumentos)"""
+    for op, args in ops:
+        getattr(c, op)(*args)
+
+class InvoiceTemplate:
+    """Partes fijas de las facturas de un negocio, compiladas una sola vez.
+
+    Guarda ya calculadas las operaciones de dibujo del recuadro del negocio,
+    del marco de factura/cliente, del encabezado de la tabla y del marco de
+    totales. Lo que se repite en cada página se registra una vez por documento
+    como XObject y cada factura solo estampa sus datos variables.
+    """
+
+    def __init__(self, business_data, pagesize):
+        self.pagesize = pagesize
+        self.ruc = str(business_data['ruc'])  # Para las claves de acceso que faltan
+        prefix = f"tpl{next(_template_ids)}_"
+        self.business_box = prefix + "business_box"
+        self.table_header = prefix + "table_header"
+
+        width, height = pagesize
+        top = height - MARGIN
+        business_ops = [
+            ("rect", (MARGIN, top - BUSINESS_BOX_HEIGHT, width - 2*MARGIN, BUSINESS_BOX_HEIGHT)),
+            ("setFont", ("Helvetica-Bold", 10)),
+            ("drawString", (MARGIN + 5, top - 12, str(business_data['business_name']))),
+            ("setFont", ("Helvetica", 8)),
+            ("drawString", (MARGIN + 5, top - 22, f"RUC: {business_data['ruc']}")),
+            ("drawString", (MARGIN + 5, top - 32, f"Dir: {business_data['address']}")),
+            ("drawString", (MARGIN + 5, top - 42, f"Provincia: {business_data['province']}")),
+        ]
+
+        # Marco del recuadro combinado de factura y cliente (solo en la primera página)
+        box_top = top - BUSINESS_BOX_HEIGHT - BOX_GAP
+        self.invoice_text_origin = (MARGIN + 5, box_top - 12)
+        invoice_ops = [
+            ("rect", (MARGIN, box_top - COMBINED_BOX_HEIGHT, width - 2*MARGIN, COMBINED_BOX_HEIGHT)),
+        ]
+
+        # El encabezado se dibuja con su borde inferior en y=0 y se traslada en cada página
+        header_ops = [
+            ("grid", (COL_X + [MARGIN + TABLE_WIDTH], [0, ROW_HEIGHT])),
+            ("setFont", ("Helvetica-Bold", 8)),
+        ] + [
+            ("drawString", (x + 2, 4, header)) for x, header in zip(COL_X, HEADERS)
+        ]
+
+        # Marco de totales con su borde inferior en y=0
+        totals_x = width - MARGIN - TOTALS_BOX_WIDTH
+        self.totals_text_x = totals_x + 5
+        totals_ops = [
+            ("grid", (
+                [totals_x, totals_x + TOTALS_BOX_WIDTH],
+                [i * ROW_HEIGHT for i in range(len(TOTALS_LABELS) + 1)]
+            )),
+        ]
+
+        # Las partes que se repiten en cada página se registran como XObject;
+        # las que aparecen una sola vez se dibujan directamente
+        self.forms = {
+            self.business_box: business_ops,
+            self.table_header: header_ops,
         }
+        self.invoice_ops = invoice_ops
+        self.totals_ops = totals_ops
 
-    # Crear directorio si no existe
-    documents_path = os.path.join(os.path.expanduser("~"), "Documents", "ManzaFAC")
-    if not os.path.exists(documents_path):
-        os.makedirs(documents_path)
+    def install(self, c):
+        """Registra los XObject de la plantilla en el documento, una sola vez"""
+        for name, ops in self.forms.items():
+            if not c.hasForm(name):
+                c.beginForm(name)
+                _replay(c, ops)
+                c.endForm()
+
+@lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _compile_template(business_key, pagesize):
+    return InvoiceTemplate(dict(zip(BUSINESS_FIELDS, business_key)), pagesize)
+
+def get_template(business_data, pagesize=PAGE_SIZE):
+    """Devuelve la plantilla compilada del negocio, desde la caché si ya existe"""
+    business_key = tuple(str(business_data.get(field, '')) for field in BUSINESS_FIELDS)
+    return _compile_template(business_key, pagesize)
+
+def clear_template_cache():
+    """Descarta las plantillas compiladas (los datos del negocio cambiaron)"""
+    _compile_template.cache_clear()
 
-    # Generar nombre del archivo usando la identificación del cliente y el número de factura
-    filename = os.path.join(
-        documents_path, 
-        f"Factura_{client_data['identificacion']}_{invoice_data['numero']}.pdf"
+# Al guardar un negocio nuevo se invalidan también sus plantillas
+add_business_listener(clear_template_cache)
+
+def _prepare_invoice(template, client_data, invoice_data, products, totals):
+    """Lee y formatea todo lo que se va a dibujar de una factura.
+
+    Un dato faltante o inválido falla aquí, antes de tocar el canvas, así una
+    factura con errores no deja una página a medias en un documento que
+    contiene otras facturas. Devuelve las líneas del recuadro de la factura,
+    las filas de productos (celdas, incluye IVA, total), las líneas de
+    totales y el código de barras de la clave de acceso (o None). Si la
+    factura no trae clave, se calcula con el RUC del negocio de la plantilla;
+    sin un RUC de 13 dígitos el PDF sale sin clave.
+    """
+    invoice_values = (
+        invoice_data['numero'],
+        invoice_data['fecha'],
+        invoice_data['vendedor'],
+        client_data['cliente'],
+        client_data['identificacion'],
+        client_data['direccion'],
+        client_data['provincia'],
+        client_data['ciudad'],
     )
-    
-    # Configurar página A6 con márgenes
-    pagesize = A6
-    margin = 0.5 * cm
-    c = canvas.Canvas(filename, pagesize=pagesize)
-    width, height = pagesize
-    
-    # Función auxiliar para dibujar recuadros
-    def draw_box(x, y, w, h):
-        c.rect(x, y, w, h)
-    
-    # Recuadro para información del negocio
-    business_box_height = 50
-    draw_box(margin, height - margin - business_box_height, width - 2*margin, business_box_height)
-    
-    # Datos del negocio dentro del recuadro
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(margin + 5, height - margin - 12, business_data['business_name'])
-    c.setFont("Helvetica", 8)
-    c.drawString(margin + 5, height - margin - 22, f"RUC: {business_data['ruc']}")
-    c.drawString(margin + 5, height - margin - 32, f"Dir: {business_data['address']}")
-    c.drawString(margin + 5, height - margin - 42, f"Provincia: {business_data['province']}")
-    
-    # Espacio entre recuadros
-    y_offset = height - margin - business_box_height - 15
-    
-    # Recuadro combinado para información de la factura y del cliente
-    combined_box_height = 90  # Aumentado de 80 a 90 para dar más espacio
-    draw_box(margin, y_offset - combined_box_height, width - 2*margin, combined_box_height)
-    
-    # Datos de la factura y del cliente dentro del recuadro combinado
-    c.setFont("Helvetica", 8)
-    c.drawString(margin + 5, y_offset - 12, f"Orden N°: {invoice_data['numero']}")
-    c.drawString(margin + 5, y_offset - 22, f"Fecha: {invoice_data['fecha']}")
-    c.drawString(margin + 5, y_offset - 32, f"Vendedor: {invoice_data['vendedor']}")
-    c.drawString(margin + 5, y_offset - 42, f"Cliente: {client_data['cliente']}")
-    c.drawString(margin + 5, y_offset - 52, f"ID: {client_data['identificacion']}")
-    c.drawString(margin + 5, y_offset - 62, f"Dir: {client_data['direccion']}")
-    c.drawString(margin + 5, y_offset - 72, f"Provincia: {client_data['provincia']}")
-    c.drawString(margin + 5, y_offset - 82, f"Ciudad: {client_data['ciudad']}")
-    
-    # Actualizar offset para la tabla de productos
-    y_offset -= (combined_box_height + 15)
-    
-    # Tabla de productos
-    col_widths = [30, 120, 40, 40]  # Anchos de columnas
-    row_height = 15
-    table_width = sum(col_widths)
-    
-    # Encabezados de la tabla
-    c.setFont("Helvetica-Bold", 8)
-    x = margin
-    headers = ["Cant.", "Descripción", "Precio", "Total"]
-    for i, header in enumerate(headers):
-        draw_box(x, y_offset - row_height, col_widths[i], row_height)
-        c.drawString(x + 2, y_offset - row_height + 4, header)
-        x += col_widths[i]
-    
-    # Productos
-    c.setFont("Helvetica", 8)
+    invoice_lines = [f"{label}{value}" for label, value in zip(INVOICE_LABELS, invoice_values)]
+
+    rows = []
     for product in products:
-        y_offset -= row_height
-        x = margin
-        
-        # Dibujar celdas y agregar datos
-        draw_box(x, y_offset - row_height, col_widths[0], row_height)
-        c.drawString(x + 2, y_offset - row_height + 4, str(product['cantidad']))
-        x += col_widths[0]
-        
-        draw_box(x, y_offset - row_height, col_widths[1], row_height)
-        descripcion = product['descripcion'][:20] + '...' if len(product['descripcion']) > 20 else product['descripcion']
-        c.drawString(x + 2, y_offset - row_height + 4, descripcion)
-        x += col_widths[1]
-        
-        draw_box(x, y_offset - row_height, col_widths[2], row_height)
-        c.drawString(x + 2, y_offset - row_height + 4, f"${product['precio']}")
-        x += col_widths[2]
+        descripcion = product['descripcion'] or ''
+        if len(descripcion) > DESCRIPTION_CHARS:
+            descripcion = descripcion[:DESCRIPTION_CHARS] + '...'
+        cells = (
+            str(product['cantidad']),
+            descripcion,
+            f"${product['precio']}",
+            f"${product['total']}",
+        )
+        rows.append((cells, bool(product['incluye_iva']), parse_amount(product['total'])))
+
+    totals_values = (
+        totals['subtotal'],
+        totals['iva'],
+        f"{totals['descuento']}%",
+        totals['total'],
+    )
+    totals_lines = [f"{label}{value}" for label, value in zip(TOTALS_LABELS, totals_values)]
+
+    clave_acceso = invoice_data.get('clave_acceso')
+    if not clave_acceso:
+        try:
+            clave_acceso = invoice_access_key(invoice_data, template.ruc)
+        except (KeyError, TypeError, ValueError):
+            clave_acceso = None
+    access_key = None
+    if clave_acceso:
+        clave_acceso = str(clave_acceso)
+        barcode = Code128(
+            clave_acceso,
+            barWidth=BARCODE_WIDTH / ACCESS_KEY_MODULES,
+            barHeight=BARCODE_HEIGHT,
+            quiet=0
+        )
+        access_key = (clave_acceso, barcode)
+    return invoice_lines, rows, totals_lines, access_key
+
+def _draw_invoice_values(c, template, invoice_lines):
+    """Estampa los datos de la factura y del cliente en el recuadro de la plantilla"""
+    text = c.beginText(*template.invoice_text_origin)
+    text.setFont("Helvetica", 8)
+    text.setLeading(10)
+    for line in invoice_lines:
+        text.textLine(line)
+    c.drawText(text)
+
+def _draw_product_rows(c, template, rows, table_top):
+    """Dibuja el encabezado y las filas de una página; devuelve el borde inferior"""
+    rows_top = table_top - ROW_HEIGHT
+    c.saveState()
+    c.translate(0, rows_top)
+    c.doForm(template.table_header)
+    c.restoreState()
+
+    bottom = rows_top - len(rows) * ROW_HEIGHT
+    if not rows:
+        return rows_top
+
+    # Cuadrícula de toda la página en una sola operación
+    ys = [rows_top - i * ROW_HEIGHT for i in range(len(rows) + 1)]
+    c.grid(COL_X + [MARGIN + TABLE_WIDTH], ys)
+
+    # Textos de todas las celdas en un único objeto de texto
+    text = c.beginText()
+    text.setFont("Helvetica", 8)
+    y = rows_top - ROW_HEIGHT + 4
+    for cells, incluye_iva, _ in rows:
+        for x, value in zip(COL_X, cells):
+            text.setTextOrigin(x + 2, y)
+            text.textOut(value)
+        if incluye_iva:
+            text.setTextOrigin(COL_X[3] + COL_WIDTHS[3] - 15, y)
+            text.textOut("(I)")
+        y -= ROW_HEIGHT
+    c.drawText(text)
+    return bottom
+
+def _page_subtotal(rows):
+    """Suma de los totales de línea mostrados en una página"""
+    subtotal = Decimal("0")
+    for _, _, amount in rows:
+        if amount is not None:
+            subtotal += amount
+    return subtotal
+
+def _draw_page_footer(c, y_offset, page_number, page_count, rows):
+    """Subtotal de la página y numeración, al pie de las páginas intermedias"""
+    y = y_offset - TOTALS_GAP - ROW_HEIGHT
+    c.rect(TOTALS_X, y, TOTALS_BOX_WIDTH, ROW_HEIGHT)
+    c.setFont("Helvetica-Bold", 8)
+    c.drawString(TOTALS_X + 5, y + 4, f"Subtotal pág.: ${format_amount(_page_subtotal(rows))}")
+    c.setFont("Helvetica", 7)
+    c.drawString(MARGIN, y + 4, f"Página {page_number} de {page_count}")
+
+def _draw_access_key(c, bottom, access_key, page_count):
+    """Código de barras y texto de la clave de acceso junto a los totales"""
+    clave_acceso, barcode = access_key
+    # Encima de la numeración de página, si la hay
+    y = bottom + (12 if page_count > 1 else 2)
+    c.setFont("Helvetica", ACCESS_KEY_FONT_SIZE)
+    c.drawString(MARGIN, y, clave_acceso)
+    barcode.drawOn(c, MARGIN, y + ACCESS_KEY_FONT_SIZE + 2)
+
+def _draw_totals(c, template, y_offset, totals_lines, page_number, page_count, access_key=None):
+    """Estampa los totales de la factura en el marco de la última página"""
+    bottom = y_offset - TOTALS_HEIGHT
+    c.saveState()
+    c.translate(0, bottom)
+    _replay(c, template.totals_ops)
+    c.restoreState()
+
+    # Una línea por casilla, de arriba hacia abajo
+    text = c.beginText(template.totals_text_x, bottom + (len(TOTALS_LABELS) - 1) * ROW_HEIGHT + 4)
+    text.setFont("Helvetica-Bold", 8)
+    text.setLeading(ROW_HEIGHT)
+    for line in totals_lines:
+        text.textLine(line)
+    c.drawText(text)
+
+    if page_count > 1:
+        c.setFont("Helvetica", 7)
+        c.drawString(MARGIN, bottom + 4, f"Página {page_number} de {page_count}")
+
+    if access_key:
+        _draw_access_key(c, bottom, access_key, page_count)
+
+def invoice_filename(client_data, invoice_data):
+    """Nombre del archivo usando la identificación del cliente y el número de factura"""
+    return f"Factura_{client_data['identificacion']}_{invoice_data['numero']}.pdf"
+
+def draw_invoice(c, template, client_data, invoice_data, products, totals):
+    """Dibuja todas las páginas de una factura en el canvas indicado.
+
+    El canvas puede contener otras facturas antes o después: cada factura
+    empieza y termina en una página propia. Los datos se validan antes de
+    dibujar, así que si la factura falla el canvas queda como estaba.
+    """
+    invoice_lines, rows, totals_lines, access_key = _prepare_invoice(
+        template, client_data, invoice_data, products, totals
+    )
+    pages = paginate(len(rows))
+    for page_number, (start, end) in enumerate(pages, 1):
+        first = page_number == 1
+        c.doForm(template.business_box)
+        if first:
+            _replay(c, template.invoice_ops)
+            _draw_invoice_values(c, template, invoice_lines)
         
-        draw_box(x, y_offset - row_height, col_widths[3], row_height)
-        c.drawString(x + 2, y_offset - row_height + 4, f"${product['total']}")
+        page_rows = rows[start:end]
+        table_top = FIRST_TABLE_TOP if first else NEXT_TABLE_TOP
+        if page_rows or first:
+            y_offset = _draw_product_rows(c, template, page_rows, table_top)
+        else:
+            # Página que solo contiene los totales
+            y_offset = table_top
         
-        if product['incluye_iva']:
-            c.drawString(x + col_widths[3] - 15, y_offset - row_height + 4, "(I)")
-    
-    # Espacio para totales
-    y_offset -= (row_height + 10)
-    
-    # Recuadro para totales (separado de la tabla de productos)
-    totals_box_width = 100
-    totals_x = width - margin - totals_box_width
-    
-    # Dibujar cada línea de totales en su propia casilla
-    c.setFont("Helvetica-Bold", 8)
-    items = [
-        f"Subtotal: ${totals['subtotal']}",  # Aquí se está incluyendo algo extra
-        f"IVA: ${totals['iva']}",
-        f"Desc: {totals['descuento']}%",
-        f"Total: ${totals['total']}"
-    ]
-    
-    for item in items:
-        draw_box(totals_x, y_offset - row_height, totals_box_width, row_height)
-        c.drawString(totals_x + 5, y_offset - row_height + 4, item)
-        y_offset -= row_height
+        if page_number < len(pages):
+            _draw_page_footer(c, y_offset, page_number, len(pages), page_rows)
+        else:
+            _draw_totals(c, template, y_offset, totals_lines, page_number, len(pages), access_key)
+        c.showPage()
+
+@timed()
+def default_invoice_path(client_data, invoice_data):
+    """Ruta del PDF de una factura en ~/Documents/ManzaFAC (crea la carpeta)"""
+    documents_path = os.path.join(os.path.expanduser("~"), "Documents", "ManzaFAC")
+    os.makedirs(documents_path, exist_ok=True)
+    return os.path.join(documents_path, invoice_filename(client_data, invoice_data))
+
+def write_invoice_pdf(pdf_data, client_data, invoice_data, output=None):
+    """Escribe los bytes de un PDF ya generado donde lo haría generate_invoice_pdf y devuelve output"""
+    if output is None:
+        output = default_invoice_path(client_data, invoice_data)
+    if isinstance(output, str):
+        with open(output, "wb") as f:
+            f.write(pdf_data)
+    else:
+        output.write(pdf_data)
+    return output
+
+def generate_invoice_pdf(client_data, invoice_data, products, totals, business_data=None, output=None):
+    """Genera el PDF de una factura.
+
+    Sin output se escribe en ~/Documents/ManzaFAC y se devuelve la ruta del
+    archivo. output puede ser otra ruta o un flujo binario abierto (por
+    ejemplo un BytesIO); en ese caso el PDF se escribe ahí y se devuelve output.
+    """
+    # Obtener datos del negocio (en lotes se reciben ya consultados)
+    if business_data is None:
+        business_data = get_business_data()
+    if not business_data:
+        business_data = DEFAULT_BUSINESS_DATA
+
+    if output is None:
+        output = default_invoice_path(client_data, invoice_data)
     
+    # Las partes fijas se compilan una vez por negocio y se registran una vez
+    # por documento; cada página solo las referencia
+    template = get_template(business_data)
+    c = canvas.Canvas(output, pagesize=template.pagesize)
+    template.install(c)
+    draw_invoice(c, template, client_data, invoice_data, products, totals)
     c.save()
-    return filename 
\ No newline at end of file
+    return output
+
+def render_invoice_pdf(client_data, invoice_data, products, totals, business_data=None):
+    """Genera el PDF de una factura en memoria y devuelve sus bytes"""
+    buffer = io.BytesIO()
+    generate_invoice_pdf(client_data, invoice_data, products, totals, business_data, output=buffer)
+    return buffer.getvalue()
+
+class ConcatenatedPdfSink:
+    """Destino que dibuja muchas facturas, una tras otra, en un único PDF.
+
+    Todas comparten el mismo documento, así que la plantilla del negocio se
+    registra una sola vez para todo el lote.
+    """
+
+    def __init__(self, target, business_data=None):
+        if business_data is None:
+            business_data = get_business_data()
+        self.template = get_template(business_data or DEFAULT_BUSINESS_DATA)
+        self.canvas = canvas.Canvas(target, pagesize=self.template.pagesize)
+        self.template.install(self.canvas)
+
+    def add_invoice(self, client_data, invoice_data, products, totals):
+        draw_invoice(self.canvas, self.template, client_data, invoice_data, products, totals)
+
+    def close(self):
+        self.canvas.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _render_batch_invoice(invoice, business_data, in_memory=False):
+    """Genera una factura dentro de un proceso del pool.
+
+    Devuelve la ruta del archivo creado, o los bytes del PDF si in_memory.
+    """
+    check_invoice(invoice)
+    render = render_invoice_pdf if in_memory else generate_invoice_pdf
+    return render(
+        client_data=invoice['client_data'],
+        invoice_data=invoice['invoice_data'],
+        products=invoice['products'],
+        totals=_batch_totals(invoice),
+        business_data=business_data
+    )
+
+def _batch_totals(invoice):
+    """Totales de una factura del lote; se calculan si el archivo no los trae"""
+    if invoice.get('totals'):
+        return invoice['totals']
+    return product_totals(invoice['products'], invoice.get('descuento', "0"))
+
+def generate_invoices_batch(invoices, workers=None, on_result=None, sink=None):
+    """Genera muchas facturas en paralelo usando un pool de procesos.
+
+    Cada factura es un diccionario con las claves client_data, invoice_data,
+    products y totals (los mismos argumentos de generate_invoice_pdf).
+    invoices puede ser cualquier iterable: solo se envían al pool
+    IN_FLIGHT_PER_WORKER facturas por proceso a la vez, y las siguientes se
+    leen a medida que terminan, así la memoria no crece con el tamaño del lote.
+    Con sink (por ejemplo un ZipSink) los PDF se generan en memoria y
+    se entregan al destino en lugar de escribirse uno por uno en disco.
+    on_result se llama con cada resultado apenas termina su factura; un error
+    en una factura se reporta en su resultado y no detiene el lote.
+    Devuelve un resumen con los conteos y el rendimiento en facturas/segundo.
+    """
+    # Los datos del negocio se consultan una sola vez para todo el lote
+    business_data = get_business_data() or DEFAULT_BUSINESS_DATA
+
+    summary = new_summary()
+    start = time.perf_counter()
+
+    window = IN_FLIGHT_PER_WORKER * (workers or os.cpu_count() or 1)
+    # Las claves de acceso que faltan se calculan aquí por bloques, no una por proceso
+    pending = with_access_keys(invoices, business_data['ruc'])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        while True:
+            for invoice in itertools.islice(pending, window - len(futures)):
+                future = executor.submit(_render_batch_invoice, invoice, business_data, sink is not None)
+                futures[future] = invoice
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                invoice = futures.pop(future)
+                result = new_result(invoice)
+                try:
+                    if sink is None:
+                        result["archivo"] = future.result()
+                    else:
+                        pdf_data = future.result()
+                        name = invoice_filename(invoice['client_data'], invoice['invoice_data'])
+                        result["archivo"] = sink.add(name, pdf_data)
+                except Exception as e:
+                    result["error"] = str(e)
+                record_result(summary, result)
+
+                if on_result:
+                    on_result(result)
+
+    return finish_summary(summary, start)
+
+def generate_invoices_document(invoices, output, on_result=None, business_data=None):
+    """Dibuja un lote de facturas en un único PDF (ruta o flujo binario).
+
+    Se ejecuta en el proceso actual porque todas las facturas comparten el
+    mismo documento. Devuelve el mismo resumen que generate_invoices_batch.
+    """
+    summary = new_summary()
+    start = time.perf_counter()
+
+    with ConcatenatedPdfSink(output, business_data) as sink:
+        for invoice in with_access_keys(invoices, sink.template.ruc):
+            result = new_result(invoice)
+            try:
+                check_invoice(invoice)
+                sink.add_invoice(
+                    invoice['client_data'],
+                    invoice['invoice_data'],
+                    invoice['products'],
+                    _batch_totals(invoice)
+                )
+                result["archivo"] = output if isinstance(output, str) else None
+            except Exception as e:
+                result["error"] = str(e)
+            record_result(summary, result)
+
+            if on_result:
+                on_result(result)
+
+    return finish_summary(summary, start)
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos para la generación por lotes"""
+    parser = argparse.ArgumentParser(
+        description="Genera facturas PDF por lotes a partir de un archivo JSON"
+    )
+    parser.add_argument(
+        "archivo",
+        help="Archivo JSON con una lista de facturas (client_data, invoice_data, products y, opcionalmente, totals)"
+    )
+    parser.add_argument(
+        "-w", "--workers",
+        type=int,
+        default=None,
+        help="Número de procesos a usar (por defecto, uno por CPU)"
+    )
+    destination = parser.add_mutually_exclusive_group()
+    destination.add_argument(
+        "--zip",
+        help="Guardar todos los PDF dentro de este archivo ZIP"
+    )
+    destination.add_argument(
+        "--pdf",
+        help="Dibujar todas las facturas en este único archivo PDF"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.archivo, encoding="utf-8") as f:
+        invoices = json.load(f)
+
+    def print_result(result):
+        if result["error"]:
+            print(f"[ERROR] Factura {result['numero']}: {result['error']}", file=sys.stderr)
+        else:
+            print(f"[OK] Factura {result['numero']}: {result['archivo']}")
+
+    if args.pdf:
+        summary = generate_invoices_document(invoices, args.pdf, on_result=print_result)
+    elif args.zip:
+        with ZipSink(args.zip) as sink:
+            summary = generate_invoices_batch(
+                invoices, workers=args.workers, on_result=print_result, sink=sink
+            )
+    else:
+        summary = generate_invoices_batch(invoices, workers=args.workers, on_result=print_result)
+
+    print(
+        f"{summary['generadas']} de {summary['total']} facturas generadas "
+        f"en {summary['segundos']:.2f} s ({summary['facturas_por_segundo']:.1f} facturas/s)"
+    )
+    return 1 if summary["fallidas"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,489 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from database import get_connection
+
+# Columnas de los resúmenes de ventas por día. Los montos se guardan en centavos
+# enteros para que las sumas sean exactas también en SQLite
+ROLLUP_METRICS = ("facturas", "subtotal", "base_iva", "base_cero", "iva", "total")
+ROLLUP_METRICS_SQL = ",\n        ".join(f"{metric} BIGINT NOT NULL" for metric in ROLLUP_METRICS)
+
+# Tablas de clientes, facturas, líneas, productos, pedidos pendientes y resúmenes de ventas. MySQL declara
+# los índices dentro de CREATE TABLE; SQLite (usado como base local de pruebas) los crea aparte.
+MYSQL_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS clientes (
+        identificacion VARCHAR(13) NOT NULL PRIMARY KEY,
+        nombre VARCHAR(255) NOT NULL,
+        direccion VARCHAR(255),
+        provincia VARCHAR(64),
+        ciudad VARCHAR(64)
+    )""",
+    """CREATE TABLE IF NOT EXISTS facturas (
+        id INTEGER NOT NULL PRIMARY KEY AUTO_INCREMENT,
+        numero VARCHAR(20) NOT NULL,
+        fecha DATE NOT NULL,
+        cliente_identificacion VARCHAR(13) NOT NULL,
+        vendedor VARCHAR(100),
+        subtotal DECIMAL(14, 2) NOT NULL,
+        iva DECIMAL(14, 2) NOT NULL,
+        descuento DECIMAL(5, 2) NOT NULL,
+        total DECIMAL(14, 2) NOT NULL,
+        UNIQUE KEY idx_facturas_numero (numero),
+        KEY idx_facturas_cliente_fecha (cliente_identificacion, fecha),
+        KEY idx_facturas_fecha (fecha)
+    )""",
+    """CREATE TABLE IF NOT EXISTS factura_lineas (
+        id INTEGER NOT NULL PRIMARY KEY AUTO_INCREMENT,
+        factura_id INTEGER NOT NULL,
+        linea INTEGER NOT NULL,
+        cantidad DECIMAL(14, 2) NOT NULL,
+        descripcion VARCHAR(255),
+        precio DECIMAL(14, 2) NOT NULL,
+        incluye_iva BOOLEAN NOT NULL,
+        total DECIMAL(14, 2) NOT NULL,
+        KEY idx_lineas_factura (factura_id, linea)
+    )""",
+    """CREATE TABLE IF NOT EXISTS productos (
+        codigo VARCHAR(32) NOT NULL PRIMARY KEY,
+        descripcion VARCHAR(255) NOT NULL,
+        precio DECIMAL(14, 2) NOT NULL,
+        incluye_iva BOOLEAN NOT NULL,
+        actualizado_en TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        KEY idx_productos_actualizado (actualizado_en)
+    )""",
+    """CREATE TABLE IF NOT EXISTS pedidos_pendientes (
+        id INTEGER NOT NULL PRIMARY KEY AUTO_INCREMENT,
+        pedido VARCHAR(20) NOT NULL,
+        cliente_identificacion VARCHAR(13) NOT NULL,
+        producto_codigo VARCHAR(32) NOT NULL,
+        cantidad DECIMAL(14, 2) NOT NULL,
+        UNIQUE KEY uq_pedidos_linea (pedido, producto_codigo),
+        KEY idx_pedidos_cliente (cliente_identificacion)
+    )""",
+    """CREATE TABLE IF NOT EXISTS ventas_dia (
+        fecha DATE NOT NULL PRIMARY KEY,
+        """ + ROLLUP_METRICS_SQL + """
+    )""",
+    """CREATE TABLE IF NOT EXISTS ventas_cliente_dia (
+        fecha DATE NOT NULL,
+        cliente_identificacion VARCHAR(13) NOT NULL,
+        """ + ROLLUP_METRICS_SQL + """,
+        PRIMARY KEY (fecha, cliente_identificacion),
+        KEY idx_ventas_cliente (cliente_identificacion, fecha)
+    )""",
+    """CREATE TABLE IF NOT EXISTS ventas_vendedor_dia (
+        fecha DATE NOT NULL,
+        vendedor VARCHAR(100) NOT NULL,
+        """ + ROLLUP_METRICS_SQL + """,
+        PRIMARY KEY (fecha, vendedor),
+        KEY idx_ventas_vendedor (vendedor, fecha)
+    )""",
+]
+
+SQLITE_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS clientes (
+        identificacion TEXT NOT NULL PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        direccion TEXT,
+        provincia TEXT,
+        ciudad TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS facturas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        numero TEXT NOT NULL,
+        fecha TEXT NOT NULL,
+        cliente_identificacion TEXT NOT NULL,
+        vendedor TEXT,
+        subtotal TEXT NOT NULL,
+        iva TEXT NOT NULL,
+        descuento TEXT NOT NULL,
+        total TEXT NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_facturas_numero ON facturas (numero)",
+    "CREATE INDEX IF NOT EXISTS idx_facturas_cliente_fecha ON facturas (cliente_identificacion, fecha)",
+    "CREATE INDEX IF NOT EXISTS idx_facturas_fecha ON facturas (fecha)",
+    """CREATE TABLE IF NOT EXISTS factura_lineas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        factura_id INTEGER NOT NULL,
+        linea INTEGER NOT NULL,
+        cantidad TEXT NOT NULL,
+        descripcion TEXT,
+        precio TEXT NOT NULL,
+        incluye_iva INTEGER NOT NULL,
+        total TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_lineas_factura ON factura_lineas (factura_id, linea)",
+    """CREATE TABLE IF NOT EXISTS productos (
+        codigo TEXT NOT NULL PRIMARY KEY,
+        descripcion TEXT NOT NULL,
+        precio TEXT NOT NULL,
+        incluye_iva INTEGER NOT NULL,
+        actualizado_en TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_productos_actualizado ON productos (actualizado_en)",
+    """CREATE TABLE IF NOT EXISTS pedidos_pendientes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        pedido TEXT NOT NULL,
+        cliente_identificacion TEXT NOT NULL,
+        producto_codigo TEXT NOT NULL,
+        cantidad TEXT NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_pedidos_linea ON pedidos_pendientes (pedido, producto_codigo)",
+    "CREATE INDEX IF NOT EXISTS idx_pedidos_cliente ON pedidos_pendientes (cliente_identificacion)",
+    """CREATE TABLE IF NOT EXISTS ventas_dia (
+        fecha TEXT NOT NULL PRIMARY KEY,
+        """ + ROLLUP_METRICS_SQL + """
+    )""",
+    """CREATE TABLE IF NOT EXISTS ventas_cliente_dia (
+        fecha TEXT NOT NULL,
+        cliente_identificacion TEXT NOT NULL,
+        """ + ROLLUP_METRICS_SQL + """,
+        PRIMARY KEY (fecha, cliente_identificacion)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_ventas_cliente ON ventas_cliente_dia (cliente_identificacion, fecha)",
+    """CREATE TABLE IF NOT EXISTS ventas_vendedor_dia (
+        fecha TEXT NOT NULL,
+        vendedor TEXT NOT NULL,
+        """ + ROLLUP_METRICS_SQL + """,
+        PRIMARY KEY (fecha, vendedor)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_ventas_vendedor ON ventas_vendedor_dia (vendedor, fecha)",
+]
+
+# Inserción o actualización de un cliente según el motor
+UPSERT_CLIENT = {
+    "mysql": """INSERT INTO clientes (identificacion, nombre, direccion, provincia, ciudad)
+                VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE nombre = VALUES(nombre), direccion = VALUES(direccion),
+                    provincia = VALUES(provincia), ciudad = VALUES(ciudad)""",
+    "sqlite": """INSERT INTO clientes (identificacion, nombre, direccion, provincia, ciudad)
+                 VALUES (?, ?, ?, ?, ?)
+                 ON CONFLICT (identificacion) DO UPDATE SET nombre = excluded.nombre,
+                    direccion = excluded.direccion, provincia = excluded.provincia,
+                    ciudad = excluded.ciudad""",
+}
+
+INVOICE_COLUMNS = "id, numero, fecha, cliente_identificacion, vendedor, subtotal, iva, descuento, total"
+
+# Resúmenes de ventas y las columnas que forman su clave
+ROLLUP_TABLES = {
+    "ventas_dia": ("fecha",),
+    "ventas_cliente_dia": ("fecha", "cliente_identificacion"),
+    "ventas_vendedor_dia": ("fecha", "vendedor"),
+}
+
+def _rollup_upsert(dialect, table, keys):
+    """Sentencia que suma una fila a un resumen (o la crea si aún no existe)"""
+    columns = ", ".join(keys + ROLLUP_METRICS)
+    placeholders = ", ".join(["%s" if dialect == "mysql" else "?"] * (len(keys) + len(ROLLUP_METRICS)))
+    if dialect == "mysql":
+        updates = ", ".join(f"{metric} = {metric} + VALUES({metric})" for metric in ROLLUP_METRICS)
+        return f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+    updates = ", ".join(f"{metric} = {metric} + excluded.{metric}" for metric in ROLLUP_METRICS)
+    return (
+        f"INSERT INTO {table} ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+    )
+
+UPSERT_ROLLUP = {
+    dialect: {table: _rollup_upsert(dialect, table, keys) for table, keys in ROLLUP_TABLES.items()}
+    for dialect in ("mysql", "sqlite")
+}
+
+# Expresión de cada columna de clave al reconstruir los resúmenes desde las facturas
+ROLLUP_KEY_SOURCES = {
+    "fecha": "f.fecha",
+    "cliente_identificacion": "f.cliente_identificacion",
+    "vendedor": "COALESCE(f.vendedor, '')",
+}
+
+def _amount(value):
+    """Convierte un monto de la interfaz o de la base de datos a Decimal"""
+    if value is None or value == "":
+        return Decimal("0")
+    return Decimal(str(value).replace("$", "").strip())
+
+def _cents(value):
+    return int(_amount(value) * 100)
+
+def _rows_as_dicts(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+@contextmanager
+def _shared_connection(connection, lock):
+    """Entrega siempre la misma conexión (SQLite), a un hilo a la vez"""
+    with lock:
+        yield connection
+
+class InvoiceRepository:
+    """Guarda y consulta facturas, sus líneas y los clientes.
+
+    connect es una función que devuelve un context manager con una conexión
+    DB-API (por defecto, una conexión del pool de MySQL). dialect indica el
+    motor: "mysql" o "sqlite".
+    """
+
+    def __init__(self, connect=get_connection, dialect="mysql"):
+        self.connect = connect
+        self.dialect = dialect
+        self.placeholder = "?" if dialect == "sqlite" else "%s"
+
+    @classmethod
+    def sqlite(cls, path=":memory:"):
+        """Repositorio sobre una base SQLite local, con el esquema ya creado"""
+        connection = sqlite3.connect(path, check_same_thread=False)
+        lock = threading.RLock()
+        repository = cls(lambda: _shared_connection(connection, lock), dialect="sqlite")
+        repository.create_schema()
+        return repository
+
+    def sql(self, statement):
+        """Adapta los marcadores %s de una sentencia al motor en uso"""
+        return statement.replace("%s", self.placeholder)
+
+    def create_schema(self):
+        schema = SQLITE_SCHEMA if self.dialect == "sqlite" else MYSQL_SCHEMA
+        with self.connect() as connection:
+            cursor = connection.cursor()
+            try:
+                for statement in schema:
+                    cursor.execute(statement)
+                connection.commit()
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def transaction(self):
+        """Cursor dentro de una transacción: confirma al terminar o revierte si hay error"""
+        with self.connect() as connection:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def save_invoice(self, client_data, invoice_data, products, totals):
+        """Guarda (o reemplaza, si el número ya existe) una factura completa.
+
+        Recibe los mismos diccionarios que generate_invoice_pdf y devuelve el
+        id de la factura.
+        """
+        with self.transaction() as cursor:
+            cursor.execute(UPSERT_CLIENT[self.dialect], (
+                client_data["identificacion"],
+                client_data["cliente"],
+                client_data.get("direccion"),
+                client_data.get("provincia"),
+                client_data.get("ciudad"),
+            ))
+
+            header = (
+                invoice_data["fecha"],
+                client_data["identificacion"],
+                invoice_data.get("vendedor"),
+                str(_amount(totals["subtotal"])),
+                str(_amount(totals["iva"])),
+                str(_amount(totals["descuento"])),
+                str(_amount(totals["total"])),
+            )
+            cursor.execute(self.sql(
+                """SELECT id, fecha, cliente_identificacion, vendedor, subtotal, iva, total
+                   FROM facturas WHERE numero = %s"""
+            ), (invoice_data["numero"],))
+            existing = cursor.fetchone()
+            if existing:
+                invoice_id = existing[0]
+                # Al reemplazar una factura se descuenta primero lo que sumó a los resúmenes
+                cursor.execute(self.sql(
+                    "SELECT total FROM factura_lineas WHERE factura_id = %s AND incluye_iva = 1"
+                ), (invoice_id,))
+                old_taxable = sum(_amount(row[0]) for row in cursor.fetchall())
+                self._update_rollups(cursor, *existing[1:], old_taxable, sign=-1)
+                cursor.execute(self.sql(
+                    """UPDATE facturas SET fecha = %s, cliente_identificacion = %s, vendedor = %s,
+                           subtotal = %s, iva = %s, descuento = %s, total = %s
+                       WHERE id = %s"""
+                ), header + (invoice_id,))
+                cursor.execute(self.sql("DELETE FROM factura_lineas WHERE factura_id = %s"), (invoice_id,))
+            else:
+                cursor.execute(self.sql(
+                    """INSERT INTO facturas
+                           (numero, fecha, cliente_identificacion, vendedor, subtotal, iva, descuento, total)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+                ), (invoice_data["numero"],) + header)
+                invoice_id = cursor.lastrowid
+
+            lines = [
+                (
+                    invoice_id,
+                    position,
+                    str(_amount(product["cantidad"])),
+                    product["descripcion"],
+                    str(_amount(product["precio"])),
+                    1 if product["incluye_iva"] else 0,
+                    str(_amount(product["total"])),
+                )
+                for position, product in enumerate(products, 1)
+            ]
+            if lines:
+                cursor.executemany(self.sql(
+                    """INSERT INTO factura_lineas
+                           (factura_id, linea, cantidad, descripcion, precio, incluye_iva, total)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)"""
+                ), lines)
+
+            taxable = sum(_amount(product["total"]) for product in products if product["incluye_iva"])
+            self._update_rollups(cursor, *header[:3], totals["subtotal"], totals["iva"], totals["total"], taxable)
+        return invoice_id
+
+    def _update_rollups(self, cursor, fecha, cliente, vendedor, subtotal, iva, total, taxable, sign=1):
+        """Suma (sign=1) o resta (sign=-1) una factura en los resúmenes de ventas,
+        dentro de la misma transacción que la guarda"""
+        subtotal = _cents(subtotal)
+        taxable = _cents(taxable)
+        metrics = tuple(sign * value for value in (
+            1, subtotal, taxable, subtotal - taxable, _cents(iva), _cents(total)
+        ))
+        keys = {"fecha": str(fecha), "cliente_identificacion": cliente, "vendedor": vendedor or ""}
+        statements = UPSERT_ROLLUP[self.dialect]
+        for table, columns in ROLLUP_TABLES.items():
+            key = tuple(keys[column] for column in columns)
+            cursor.execute(statements[table], key + metrics)
+            if sign < 0:
+                # Un grupo que se queda sin facturas no debe aparecer en los reportes
+                conditions = " AND ".join(f"{column} = %s" for column in columns)
+                cursor.execute(self.sql(f"DELETE FROM {table} WHERE {conditions} AND facturas = 0"), key)
+
+    def rebuild_rollups(self):
+        """Vuelve a calcular todos los resúmenes de ventas desde las facturas guardadas.
+
+        Solo hace falta una vez para el historial anterior a los resúmenes o
+        después de corregir facturas directamente en la base de datos.
+        """
+        with self.transaction() as cursor:
+            for table, keys in ROLLUP_TABLES.items():
+                sources = [ROLLUP_KEY_SOURCES[key] for key in keys]
+                cursor.execute(f"DELETE FROM {table}")
+                cursor.execute(
+                    f"""INSERT INTO {table} ({', '.join(keys + ROLLUP_METRICS)})
+                        SELECT {', '.join(sources)}, COUNT(*),
+                               SUM(ROUND(f.subtotal * 100)),
+                               SUM(COALESCE(l.base_iva, 0)),
+                               SUM(ROUND(f.subtotal * 100)) - SUM(COALESCE(l.base_iva, 0)),
+                               SUM(ROUND(f.iva * 100)),
+                               SUM(ROUND(f.total * 100))
+                        FROM facturas f
+                        LEFT JOIN (
+                            SELECT factura_id, SUM(ROUND(total * 100)) AS base_iva
+                            FROM factura_lineas WHERE incluye_iva = 1 GROUP BY factura_id
+                        ) l ON l.factura_id = f.id
+                        GROUP BY {', '.join(sources)}"""
+                )
+
+    def find_client(self, identificacion):
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(
+                "SELECT identificacion, nombre, direccion, provincia, ciudad FROM clientes WHERE identificacion = %s"
+            ), (identificacion,))
+            rows = _rows_as_dicts(cursor)
+        return rows[0] if rows else None
+
+    def find_invoice(self, numero):
+        """Devuelve la factura con ese número en el formato de generate_invoice_pdf, o None"""
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(
+                f"SELECT {INVOICE_COLUMNS} FROM facturas WHERE numero = %s"
+            ), (numero,))
+            headers = _rows_as_dicts(cursor)
+            if not headers:
+                return None
+            header = headers[0]
+
+            cursor.execute(self.sql(
+                "SELECT nombre, direccion, provincia, ciudad FROM clientes WHERE identificacion = %s"
+            ), (header["cliente_identificacion"],))
+            clients = _rows_as_dicts(cursor)
+            client = clients[0] if clients else {}
+
+            cursor.execute(self.sql(
+                """SELECT cantidad, descripcion, precio, incluye_iva, total
+                   FROM factura_lineas WHERE factura_id = %s ORDER BY linea"""
+            ), (header["id"],))
+            lines = _rows_as_dicts(cursor)
+
+        return {
+            "client_data": {
+                "cliente": client.get("nombre"),
+                "identificacion": header["cliente_identificacion"],
+                "direccion": client.get("direccion"),
+                "provincia": client.get("provincia"),
+                "ciudad": client.get("ciudad"),
+            },
+            "invoice_data": {
+                "numero": header["numero"],
+                "fecha": str(header["fecha"]),
+                "vendedor": header["vendedor"],
+            },
+            "products": [
+                {
+                    "cantidad": _amount(line["cantidad"]),
+                    "descripcion": line["descripcion"],
+                    "precio": _amount(line["precio"]),
+                    "incluye_iva": bool(line["incluye_iva"]),
+                    "total": _amount(line["total"]),
+                }
+                for line in lines
+            ],
+            "totals": {
+                "subtotal": _amount(header["subtotal"]),
+                "iva": _amount(header["iva"]),
+                "descuento": _amount(header["descuento"]),
+                "total": _amount(header["total"]),
+            },
+        }
+
+    def find_invoices_by_client(self, identificacion, desde=None, hasta=None):
+        """Facturas de un cliente, opcionalmente entre dos fechas (YYYY-MM-DD, inclusive).
+
+        Usa el índice (cliente_identificacion, fecha).
+        """
+        conditions = ["cliente_identificacion = %s"]
+        params = [identificacion]
+        if desde:
+            conditions.append("fecha >= %s")
+            params.append(str(desde))
+        if hasta:
+            conditions.append("fecha <= %s")
+            params.append(str(hasta))
+        return self._find_invoices(conditions, params)
+
+    def find_invoices_by_date(self, desde, hasta):
+        """Facturas emitidas entre dos fechas (YYYY-MM-DD, inclusive), usando el índice por fecha"""
+        return self._find_invoices(["fecha >= %s", "fecha <= %s"], [str(desde), str(hasta)])
+
+    def _find_invoices(self, conditions, params):
+        with self.transaction() as cursor:
+            cursor.execute(self.sql(
+                f"SELECT {INVOICE_COLUMNS} FROM facturas WHERE {' AND '.join(conditions)} ORDER BY fecha, numero"
+            ), params)
+            return _rows_as_dicts(cursor)
+
+_default_repository = None
+_default_lock = threading.Lock()
+
+def get_repository():
+    """Repositorio compartido sobre MySQL; crea las tablas la primera vez que se usa"""
+    global _default_repository
+    if _default_repository is None:
+        with _default_lock:
+            if _default_repository is None:
+                repository = InvoiceRepository()
+                repository.create_schema()
+                _default_repository = repository
+    return _default_repository
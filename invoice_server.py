@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+from invoice_service import Invoice, InvoiceService, InvoiceValidationError, get_service
+from invoice_repository import InvoiceRepository
+from invoice_numbers import InvoiceNumberAllocator
+from metrics import start_from_environment, timer
+
+DEFAULT_HOST = "127.0.0.1"  # Solo conexiones locales
+DEFAULT_PORT = 8765
+WORKERS = 8  # Hilos para el trabajo bloqueante (base de datos y PDF)
+MAX_BODY = 1024 * 1024
+
+STATUS_TEXT = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+def route_name(target):
+    """Ruta sin el número de factura, para agrupar las métricas"""
+    parts = [part for part in urlsplit(target).path.split("/") if part]
+    if len(parts) > 1 and parts[0] == "facturas" and parts[1] != "totales":
+        parts[1] = "<numero>"
+    return "/" + "/".join(parts)
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class InvoiceServer:
+    """Servicio HTTP/JSON local sobre InvoiceService.
+
+    Cada conexión se atiende en el bucle de asyncio (con keep-alive) y el
+    trabajo bloqueante se envía a un pool de hilos, así muchas facturas se
+    crean a la vez sin que una espere a la otra. Rutas:
+
+        GET  /salud                   estado del servicio
+        POST /facturas[?pdf=0]        crea una factura (formato de los lotes JSON)
+        POST /facturas/totales        calcula los totales sin guardar
+        GET  /facturas/<numero>       factura guardada
+        GET  /facturas/<numero>/pdf   PDF de una factura guardada
+    """
+
+    def __init__(self, service=None, workers=WORKERS):
+        self.service = service or get_service()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="manzafac-http")
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self.respond(writer, 400, {"error": "Solicitud no válida"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (
+                    version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                )
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, {"error": "Content-Length no válido"}, keep_alive=False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "Solicitud demasiado grande"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                try:
+                    with timer(f"http {method} {route_name(target)}"):
+                        status, payload = await self.dispatch(method, target, body)
+                except HttpError as error:
+                    status, payload = error.status, {"error": str(error)}
+                except InvoiceValidationError as error:
+                    status, payload = 400, {"errores": error.errors}
+                except Exception as error:
+                    print(f"Error al atender {method} {target}: {error}", file=sys.stderr)
+                    status, payload = 500, {"error": str(error)}
+
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        if isinstance(payload, bytes):
+            content_type, body = "application/pdf", payload
+        else:
+            content_type = "application/json; charset=utf-8"
+            body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def run(self, work, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, work, *args)
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["salud"]:
+            return 200, {"estado": "ok"}
+
+        if not parts or parts[0] != "facturas":
+            raise HttpError(404, "Ruta no encontrada")
+
+        if len(parts) == 1 or parts[1:] == ["totales"]:
+            if method != "POST":
+                raise HttpError(405, "Use POST")
+            invoice = self.parse_invoice(body)
+            if len(parts) == 2:
+                return 200, {"totals": self.service.totals(invoice)}
+            pdf = parse_qs(url.query).get("pdf", ["1"])[0] != "0"
+            return 201, await self.run(lambda: self.service.create(invoice, pdf=pdf))
+
+        if method != "GET" or len(parts) > 3 or (len(parts) == 3 and parts[2] != "pdf"):
+            raise HttpError(404, "Ruta no encontrada")
+        numero = parts[1]
+        if len(parts) == 3:
+            result = await self.run(self.service.render, numero)
+        else:
+            result = await self.run(self.service.get_repository().find_invoice, numero)
+        if result is None:
+            raise HttpError(404, f"No existe la factura {numero}")
+        return 200, result
+
+    def parse_invoice(self, body):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HttpError(400, "El cuerpo debe ser JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Se esperaba un objeto JSON con client_data, invoice_data y products")
+        return Invoice.from_dict(data)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.service.close()
+
+async def serve(server, host, port):
+    listener = await server.start(host, port)
+    print(f"Servicio de facturas en http://{host}:{port}")
+    async with listener:
+        await listener.serve_forever()
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos del servicio de facturas"""
+    parser = argparse.ArgumentParser(description="Servicio HTTP/JSON local de facturación")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Dirección (por defecto, {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Puerto (por defecto, {DEFAULT_PORT})")
+    parser.add_argument("--hilos", type=int, default=WORKERS, help=f"Hilos de trabajo (por defecto, {WORKERS})")
+    parser.add_argument("--sqlite", help="Usar esta base SQLite local en lugar de MySQL")
+    args = parser.parse_args(argv)
+
+    service = None
+    if args.sqlite:
+        repository = InvoiceRepository.sqlite(args.sqlite)
+        service = InvoiceService(repository, InvoiceNumberAllocator(repository))
+
+    start_from_environment()
+    server = InvoiceServer(service, workers=args.hilos)
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import date
+from invoice_repository import get_repository
+from invoice_numbers import get_allocator
+from identification import validate_buyer
+from invoice_totals import HUNDRED, parse_amount, product_totals
+
+def _object(data, key, errors, path=""):
+    """data[key] como diccionario (vacío si falta); anota en errors si no es un objeto"""
+    value = data.get(key)
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        errors.append(f"{path}{key} debe ser un objeto")
+        return {}
+    return value
+
+def _text(data, key, errors, path="", amount=False):
+    """data[key] como texto (vacío si falta); los montos también pueden ser números"""
+    value = data.get(key)
+    if value is None:
+        return ""
+    if amount and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if not isinstance(value, str):
+        errors.append(f"{path}{key} debe ser {'un número o texto' if amount else 'texto'}")
+        return ""
+    return value
+
+@dataclass
+class Client:
+    nombre: str
+    identificacion: str
+    direccion: str = ""
+    provincia: str = ""
+    ciudad: str = ""
+
+@dataclass
+class InvoiceLine:
+    cantidad: str
+    descripcion: str
+    precio: str
+    incluye_iva: bool = False
+
+    def is_empty(self):
+        return not (self.cantidad or self.descripcion or self.precio)
+
+@dataclass
+class Invoice:
+    """Factura independiente de la interfaz.
+
+    Los montos se guardan como los escribió el usuario (texto o Decimal) y
+    se convierten al calcular los totales.
+    """
+    client: Client
+    lines: list = field(default_factory=list)
+    fecha: str = ""
+    vendedor: str = ""
+    descuento: str = "0"
+    numero: str = ""
+
+    @classmethod
+    def from_dict(cls, data):
+        """Crea la factura desde el formato de los lotes JSON
+        (client_data, invoice_data, products y, opcionalmente, descuento).
+
+        Lanza InvoiceValidationError, con el nombre de cada campo, si los
+        datos no tienen esa forma (por ejemplo, products no es una lista).
+        """
+        if not isinstance(data, dict):
+            raise InvoiceValidationError(["La factura debe ser un objeto con client_data, invoice_data y products"])
+        errors = []
+        client = _object(data, "client_data", errors)
+        invoice = _object(data, "invoice_data", errors)
+        totals = _object(data, "totals", errors)
+
+        products = data.get("products")
+        if products is None:
+            products = []
+        elif not isinstance(products, list):
+            errors.append("products debe ser una lista")
+            products = []
+        lines = []
+        for position, product in enumerate(products):
+            path = f"products[{position}]."
+            if not isinstance(product, dict):
+                errors.append(f"products[{position}] debe ser un objeto")
+                continue
+            incluye_iva = product.get("incluye_iva")
+            if not isinstance(incluye_iva, (bool, int, type(None))):
+                errors.append(f"{path}incluye_iva debe ser verdadero o falso")
+            lines.append(InvoiceLine(
+                cantidad=_text(product, "cantidad", errors, path, amount=True),
+                descripcion=_text(product, "descripcion", errors, path),
+                precio=_text(product, "precio", errors, path, amount=True),
+                incluye_iva=bool(incluye_iva),
+            ))
+
+        client_fields = {
+            key: _text(client, key, errors, "client_data.")
+            for key in ("cliente", "identificacion", "direccion", "provincia", "ciudad")
+        }
+        invoice_fields = {
+            key: _text(invoice, key, errors, "invoice_data.")
+            for key in ("fecha", "vendedor", "numero")
+        }
+        descuento = (
+            _text(data, "descuento", errors, amount=True)
+            or _text(totals, "descuento", errors, "totals.", amount=True)
+        )
+        if errors:
+            raise InvoiceValidationError(errors)
+
+        return cls(
+            client=Client(
+                nombre=client_fields["cliente"],
+                identificacion=client_fields["identificacion"],
+                direccion=client_fields["direccion"],
+                provincia=client_fields["provincia"],
+                ciudad=client_fields["ciudad"],
+            ),
+            lines=lines,
+            fecha=invoice_fields["fecha"],
+            vendedor=invoice_fields["vendedor"],
+            descuento=descuento or "0",
+            numero=invoice_fields["numero"],
+        )
+
+    def filled_lines(self):
+        """Líneas con algún dato; las filas vacías de la interfaz se ignoran"""
+        return [line for line in self.lines if not line.is_empty()]
+
+    def to_pdf_inputs(self):
+        """Devuelve (client_data, invoice_data, products, totals) para el PDF y el repositorio"""
+        client_data = {
+            "cliente": self.client.nombre,
+            "identificacion": self.client.identificacion,
+            "direccion": self.client.direccion,
+            "provincia": self.client.provincia,
+            "ciudad": self.client.ciudad,
+        }
+        invoice_data = {
+            "numero": self.numero,
+            "fecha": self.fecha,
+            "vendedor": self.vendedor,
+        }
+        products = [
+            {
+                "cantidad": line.cantidad,
+                "descripcion": line.descripcion,
+                "precio": line.precio,
+                "incluye_iva": line.incluye_iva,
+            }
+            for line in self.filled_lines()
+        ]
+        totals = product_totals(products, self.descuento)
+        return client_data, invoice_data, products, totals
+
+class InvoiceValidationError(ValueError):
+    """La factura tiene datos incompletos o no válidos; errors lista cada problema"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+class InvoiceService:
+    """Operaciones de facturación sin interfaz: validar, numerar, guardar y generar el PDF.
+
+    La usan InvoicePage dentro del mismo proceso y el servidor HTTP
+    (invoice_server.py); el repositorio y el asignador de números se pueden
+    cambiar, por ejemplo, por los de una base SQLite local.
+    """
+
+    def __init__(self, repository=None, allocator=None):
+        # El repositorio y el asignador se obtienen al usarlos por primera vez,
+        # fuera del hilo de la interfaz
+        self.repository = repository
+        self.allocator = allocator
+        self.lock = threading.Lock()
+
+    def get_repository(self):
+        if self.repository is None:
+            with self.lock:
+                if self.repository is None:
+                    self.repository = get_repository()
+        return self.repository
+
+    def get_allocator(self):
+        if self.allocator is None:
+            with self.lock:
+                if self.allocator is None:
+                    self.allocator = get_allocator()
+        return self.allocator
+
+    def validate(self, invoice):
+        """Devuelve la lista de problemas de la factura (vacía si es válida)"""
+        errors = []
+        if not invoice.client.nombre.strip():
+            errors.append("El nombre del cliente es obligatorio")
+        is_valid, message = validate_buyer(invoice.client.identificacion)
+        if not is_valid:
+            errors.append(message)
+        try:
+            date.fromisoformat(invoice.fecha)
+        except (TypeError, ValueError):
+            errors.append("La fecha debe tener el formato AAAA-MM-DD")
+        discount = parse_amount(invoice.descuento or "0")
+        if discount is None or discount > HUNDRED:
+            errors.append("El descuento debe ser un número entre 0 y 100")
+
+        lines = invoice.filled_lines()
+        if not lines:
+            errors.append("La factura debe tener al menos un producto")
+        for number, line in enumerate(lines, start=1):
+            if parse_amount(line.cantidad) is None or parse_amount(line.precio) is None:
+                errors.append(f"Producto {number}: la cantidad y el precio deben ser números positivos")
+        return errors
+
+    def next_number(self):
+        return self.get_allocator().next_number()
+
+    def close(self):
+        """Devuelve a la secuencia los números reservados que no se usaron"""
+        if self.allocator is not None:
+            self.allocator.close()
+
+    def totals(self, invoice):
+        """Totales de la factura con el formato de generate_invoice_pdf"""
+        return invoice.to_pdf_inputs()[3]
+
+    def create(self, invoice, pdf=True, output=None):
+        """Valida, numera, guarda y (si pdf) genera el PDF de una factura.
+
+        El PDF se genera en memoria antes de guardar, así una factura cuyo PDF
+        falla no queda registrada. Si no se guardó, el número asignado vuelve
+        a la secuencia cuando es posible; si no, queda en invoice.numero para
+        reintentar con el mismo número en lugar de consumir otro.
+
+        Lanza InvoiceValidationError si la factura no es válida. Devuelve un
+        diccionario con el número asignado, los totales y la ruta del PDF
+        (o el valor de output, si se indicó uno).
+        """
+        errors = self.validate(invoice)
+        if errors:
+            raise InvoiceValidationError(errors)
+        assigned = not invoice.numero
+        if assigned:
+            invoice.numero = self.next_number()
+
+        client_data, invoice_data, products, totals = invoice.to_pdf_inputs()
+        try:
+            pdf_data = None
+            if pdf:
+                from invoice_pdf_generator import render_invoice_pdf
+                pdf_data = render_invoice_pdf(client_data, invoice_data, products, totals)
+            self.get_repository().save_invoice(client_data, invoice_data, products, totals)
+        except Exception:
+            if assigned and self.get_allocator().give_back(invoice.numero):
+                invoice.numero = ""
+            raise
+
+        filename = None
+        if pdf:
+            from invoice_pdf_generator import write_invoice_pdf
+            filename = write_invoice_pdf(pdf_data, client_data, invoice_data, output)
+        return {"numero": invoice.numero, "totals": totals, "archivo": filename}
+
+    def render(self, numero):
+        """PDF (bytes) de una factura ya guardada, o None si no existe"""
+        stored = self.get_repository().find_invoice(numero)
+        if stored is None:
+            return None
+        from invoice_pdf_generator import render_invoice_pdf
+        return render_invoice_pdf(
+            stored["client_data"], stored["invoice_data"], stored["products"], stored["totals"]
+        )
+
+_default_service = None
+_default_lock = threading.Lock()
+
+def get_service():
+    """Servicio compartido por las páginas y el servidor de este proceso"""
+    global _default_service
+    if _default_service is None:
+        with _default_lock:
+            if _default_service is None:
+                _default_service = InvoiceService()
+    return _default_service
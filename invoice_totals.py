@@ -0,0 +1,193 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Tarifa de IVA vigente y precisión (centavos) a la que se redondean los montos
+IVA_RATE = Decimal("0.15")
+CENT = Decimal("0.01")
+ZERO = Decimal("0")
+HUNDRED = Decimal("100")
+
+def parse_amount(value):
+    """Convierte el texto de un campo a Decimal.
+
+    Devuelve None si el campo está vacío, no es un número o es negativo,
+    igual que las filas que se omitían al calcular los totales.
+    """
+    if not value:
+        return None
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None
+    if not amount.is_finite() or amount < 0:
+        return None
+    return amount
+
+def round_money(amount):
+    """Redondea un monto a centavos con la regla del SRI (mitad hacia arriba)"""
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def format_amount(amount):
+    """Formatea un monto con dos decimales"""
+    return f"{round_money(amount)}"
+
+def line_amounts(quantity, price, discount_percent=ZERO):
+    """Valores de una línea ya convertidos a Decimal, como los pide el SRI.
+
+    Devuelve (valor bruto, descuento, valor neto), cada uno redondeado a
+    centavos: el descuento se calcula sobre el bruto redondeado y el neto
+    es la resta de ambos, así la suma de las líneas impresas siempre
+    coincide con el subtotal.
+    """
+    gross = round_money(quantity * price)
+    if not discount_percent:
+        return gross, ZERO, gross
+    discount = round_money(gross * discount_percent / HUNDRED)
+    return gross, discount, gross - discount
+
+def clamp_discount(value):
+    """Porcentaje de descuento como Decimal, limitado entre 0 y 100"""
+    discount = value if isinstance(value, Decimal) else parse_amount(value)
+    return max(ZERO, min(HUNDRED, discount or ZERO))
+
+def compute_invoice(lines, discount_percent=ZERO):
+    """Calcula de una vez las líneas y los totales de una factura.
+
+    lines es un iterable de (cantidad, precio, incluye_iva) con textos o
+    Decimal. Devuelve un diccionario con el valor neto de cada línea en
+    "lineas" (None si la cantidad o el precio no son válidos) y los totales
+    "subtotal", "descuento", "base_iva", "base_cero", "iva" y "total". Lo
+    usan la interfaz, los reportes y la generación por lotes para obtener
+    exactamente los mismos valores.
+    """
+    discount_percent = clamp_discount(discount_percent)
+    nets = []
+    subtotal = discount = taxable = ZERO
+    for quantity, price, includes_iva in lines:
+        quantity = parse_amount(quantity)
+        price = parse_amount(price)
+        if quantity is None or price is None:
+            nets.append(None)
+            continue
+        _, line_discount, net = line_amounts(quantity, price, discount_percent)
+        nets.append(net)
+        subtotal += net
+        discount += line_discount
+        if includes_iva:
+            taxable += net
+    iva = round_money(taxable * IVA_RATE)
+    return {
+        "lineas": nets,
+        "subtotal": subtotal,
+        "descuento": discount,
+        "base_iva": taxable,
+        "base_cero": subtotal - taxable,
+        "iva": iva,
+        "total": subtotal + iva,
+    }
+
+def product_totals(products, discount_percent=ZERO):
+    """Totales de una lista de productos con el formato de generate_invoice_pdf.
+
+    Cada producto es un diccionario con "cantidad", "precio" e
+    "incluye_iva"; se completa su "total" y se devuelve el diccionario de
+    totales ("subtotal", "iva", "descuento", "total") como textos.
+    """
+    result = compute_invoice(
+        ((p["cantidad"], p["precio"], p.get("incluye_iva")) for p in products),
+        discount_percent
+    )
+    for product, net in zip(products, result["lineas"]):
+        product["total"] = format_amount(net or ZERO)
+    return {
+        "subtotal": format_amount(result["subtotal"]),
+        "iva": format_amount(result["iva"]),
+        "descuento": str(clamp_discount(discount_percent)),
+        "total": format_amount(result["total"]),
+    }
+
+class InvoiceTotals:
+    """Totales de una factura que se actualizan línea por línea.
+
+    Cada línea guarda sus montos ya convertidos y redondeados con
+    line_amounts, y las sumas acumuladas se corrigen solo con la diferencia
+    de la línea editada, sin recorrer ni volver a convertir el resto de la
+    factura. Cambiar el descuento sí recalcula todas las líneas, porque el
+    redondeo se hace línea por línea.
+    """
+
+    def __init__(self):
+        self.lines = {}  # line_id -> (cantidad, precio, incluye IVA, descuento, neto)
+        self.net_subtotal = ZERO
+        self.net_taxable = ZERO
+        self.discount_amount = ZERO
+        self.discount_percent = ZERO
+
+    def clear(self):
+        self.lines.clear()
+        self.net_subtotal = ZERO
+        self.net_taxable = ZERO
+        self.discount_amount = ZERO
+
+    def set_line(self, line_id, quantity, price, includes_iva):
+        """Registra los valores de una línea y devuelve su total con descuento.
+
+        Si la cantidad o el precio no son válidos la línea no suma a los
+        totales y se devuelve None.
+        """
+        self.remove_line(line_id)
+
+        quantity = parse_amount(quantity)
+        price = parse_amount(price)
+        if quantity is None or price is None:
+            return None
+        return self._add_line(line_id, quantity, price, bool(includes_iva))
+
+    def _add_line(self, line_id, quantity, price, includes_iva):
+        _, discount, net = line_amounts(quantity, price, self.discount_percent)
+        self.lines[line_id] = (quantity, price, includes_iva, discount, net)
+        self.net_subtotal += net
+        self.discount_amount += discount
+        if includes_iva:
+            self.net_taxable += net
+        return net
+
+    def remove_line(self, line_id):
+        old = self.lines.pop(line_id, None)
+        if old is None:
+            return
+        _, _, includes_iva, discount, net = old
+        self.net_subtotal -= net
+        self.discount_amount -= discount
+        if includes_iva:
+            self.net_taxable -= net
+
+    def line_total(self, line_id):
+        """Total con descuento de una línea ya registrada (None si no es válida)"""
+        line = self.lines.get(line_id)
+        if line is None:
+            return None
+        return line[4]
+
+    def set_discount(self, value):
+        """Actualiza el porcentaje de descuento, limitado entre 0 y 100"""
+        discount = clamp_discount(value)
+        if discount == self.discount_percent:
+            return
+        self.discount_percent = discount
+        lines = list(self.lines.items())
+        self.clear()
+        for line_id, (quantity, price, includes_iva, _, _) in lines:
+            self._add_line(line_id, quantity, price, includes_iva)
+
+    @property
+    def subtotal(self):
+        return self.net_subtotal
+
+    @property
+    def iva(self):
+        # El IVA se calcula sobre los productos marcados, después del descuento
+        return round_money(self.net_taxable * IVA_RATE)
+
+    @property
+    def total(self):
+        return self.subtotal + self.iva
@@ -55,4 +55,9 @@ class LoginPage(ft.View):
                 padding=40,
                 alignment=ft.alignment.center
             )
-        ] 
\ No newline at end of file
+        ]
+
+    def reset(self):
+        """Limpiar las credenciales al volver a mostrar la vista"""
+        self.username_field.value = ""
+        self.password_field.value = ""
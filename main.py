@@ -1,7 +1,67 @@
 import flet as ft
+import importlib
+import threading
 from login_page import LoginPage
-from register_page import RegisterPage
-from invoice_page import InvoicePage
+from metrics import start_from_environment, timed
+
+# Solo la página de inicio de sesión se importa al arrancar; las demás (y con
+# ellas numpy, reportlab y el controlador de MySQL) se importan al visitarlas
+PAGES = {
+    "/register": ("register_page", "RegisterPage"),
+    "/invoice": ("invoice_page", "InvoicePage"),
+}
+
+# Módulos que se precargan en segundo plano mientras se muestra el inicio de sesión
+PREWARM = True
+PREWARM_MODULES = [
+    "invoice_page",
+    "register_page",
+    "invoice_pdf_generator",
+    "mysql.connector.pooling",
+]
+
+def page_class(route):
+    """Clase de la vista de una ruta, importando su módulo la primera vez"""
+    module_name, class_name = PAGES[route]
+    return getattr(importlib.import_module(module_name), class_name)
+
+class ViewRegistry:
+    """Vistas ya construidas, una por ruta.
+
+    Cada vista se construye la primera vez que se visita; en las siguientes
+    visitas se reutiliza y solo se llama a su reset(), así navegar no vuelve
+    a crear controles ni agrega elementos al overlay de la página.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.views = {}
+
+    def show(self, route):
+        """Vista de la ruta lista para mostrarse, o None si la ruta no existe"""
+        view = self.views.get(route)
+        if view is not None:
+            view.reset()
+            return view
+        if route == "/":
+            view = LoginPage(self.page)
+        elif route in PAGES:
+            view = page_class(route)(self.page)
+        else:
+            return None
+        self.views[route] = view
+        return view
+
+def prewarm():
+    """Importa en un hilo aparte los módulos pesados que se usarán después del login"""
+    def work():
+        for module_name in PREWARM_MODULES:
+            try:
+                importlib.import_module(module_name)
+            except Exception as e:
+                print(f"No se pudo precargar {module_name}: {e}")
+
+    threading.Thread(target=work, name="manzafac-prewarm", daemon=True).start()
 
 def main(page: ft.Page):
     page.title = "ManzaFAC"
@@ -18,19 +78,22 @@ def main(page: ft.Page):
         )
     )
     
+    views = ViewRegistry(page)
+
+    @timed("route_change")
     def route_change(route):
         page.views.clear()
         
-        if page.route == "/":
-            page.views.append(LoginPage(page))
-        elif page.route == "/register":
-            page.views.append(RegisterPage(page))
-        elif page.route == "/invoice":
-            page.views.append(InvoicePage(page))
+        view = views.show(page.route)
+        if view is not None:
+            page.views.append(view)
             
         page.update()
 
     page.on_route_change = route_change
+    start_from_environment()
     page.go('/')
+    if PREWARM:
+        prewarm()
 
 ft.app(target=main) 
\ No newline at end of file
@@ -0,0 +1,253 @@
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+from functools import wraps
+
+# La medición se activa con variables de entorno antes de iniciar el proceso:
+#   MANZAFAC_METRICS=1              medir y exportar solo a pedido
+#   MANZAFAC_METRICS_PORT=9464      servir /metrics (Prometheus) y /metrics.json
+#   MANZAFAC_METRICS_FILE=ruta      escribir el archivo cada MANZAFAC_METRICS_INTERVAL s
+# (.json para JSON, cualquier otra extensión para texto de Prometheus)
+PORT = os.environ.get("MANZAFAC_METRICS_PORT")
+FILE = os.environ.get("MANZAFAC_METRICS_FILE")
+HOST = os.environ.get("MANZAFAC_METRICS_HOST", "127.0.0.1")  # Solo conexiones locales
+INTERVAL = float(os.environ.get("MANZAFAC_METRICS_INTERVAL", "15"))
+ENABLED = os.environ.get("MANZAFAC_METRICS", "") not in ("", "0") or bool(PORT or FILE)
+
+# Límites superiores (en segundos) de los intervalos de los histogramas
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "manzafac_operation"
+EVENT_PREFIX = "manzafac_events"
+
+class Histogram:
+    """Duraciones de una operación agrupadas en BUCKETS, con conteo, suma y errores"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # El último es el de +Inf
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+
+    def observe(self, seconds, error=False):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if error:
+            self.errors += 1
+
+    def quantile(self, q):
+        """Estimación del cuantil q interpolando dentro de su intervalo"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+class Registry:
+    """Histogramas por nombre de operación y contadores de eventos"""
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds, error=False):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds, error)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        """Resumen por operación (conteo, errores, suma y cuantiles en
+        milisegundos) y el total de cada contador"""
+        with self.lock:
+            summary = {
+                name: {
+                    "conteo": h.count,
+                    "errores": h.errors,
+                    "suma_ms": round(h.total * 1000, 3),
+                    **{f"p{round(q * 100)}_ms": round(h.quantile(q) * 1000, 3) for q in QUANTILES},
+                }
+                for name, h in sorted(self.histograms.items())
+            }
+            summary.update({name: {"total": total} for name, total in sorted(self.counters.items())})
+            return summary
+
+    def prometheus_text(self):
+        """Histogramas en el formato de texto de Prometheus"""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_seconds Duración de las operaciones de ManzaFAC",
+            f"# TYPE {METRIC_PREFIX}_seconds histogram",
+        ]
+        errors = [
+            f"# HELP {METRIC_PREFIX}_errors_total Operaciones que terminaron con una excepción",
+            f"# TYPE {METRIC_PREFIX}_errors_total counter",
+        ]
+        events = [
+            f"# HELP {EVENT_PREFIX}_total Eventos contados con metrics.count",
+            f"# TYPE {EVENT_PREFIX}_total counter",
+        ]
+        with self.lock:
+            for name, h in sorted(self.histograms.items()):
+                label = f'operation="{name}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), h.counts):
+                    cumulative += count
+                    lines.append(f'{METRIC_PREFIX}_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f"{METRIC_PREFIX}_seconds_sum{{{label}}} {h.total:.6f}")
+                lines.append(f"{METRIC_PREFIX}_seconds_count{{{label}}} {h.count}")
+                errors.append(f"{METRIC_PREFIX}_errors_total{{{label}}} {h.errors}")
+            for name, total in sorted(self.counters.items()):
+                events.append(f'{EVENT_PREFIX}_total{{event="{name}"}} {total}')
+        return "\n".join(lines + errors + events) + "\n"
+
+registry = Registry()
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.observe(self.name, time.perf_counter() - self.start, exc_type is not None)
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return None
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name):
+    """Context manager que mide el bloque como la operación name.
+
+    Con la medición desactivada devuelve siempre el mismo objeto vacío.
+    """
+    return _Timer(name) if ENABLED else _NULL_TIMER
+
+def count(name, amount=1):
+    """Suma amount al contador name; no hace nada con la medición desactivada"""
+    if ENABLED:
+        registry.increment(name, amount)
+
+def timed(name=None):
+    """Decorador que mide cada llamada a la función.
+
+    Con la medición desactivada devuelve la función sin cambios, así que no
+    agrega ningún costo. El nombre por defecto es el de la función.
+    """
+    def decorate(function):
+        if not ENABLED:
+            return function
+        operation = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            error = True
+            try:
+                result = function(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                registry.observe(operation, time.perf_counter() - start, error)
+        return wrapper
+    return decorate
+
+def write(path):
+    """Escribe las métricas en path (JSON si termina en .json, si no, Prometheus)"""
+    if path.endswith(".json"):
+        data = json.dumps(registry.snapshot(), indent=2, ensure_ascii=False)
+    else:
+        data = registry.prometheus_text()
+    # Se reemplaza el archivo completo para que nunca se lea a medio escribir
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+def serve(port, host=HOST):
+    """Sirve /metrics (Prometheus) y /metrics.json en un hilo aparte"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+                body = registry.prometheus_text()
+            elif self.path == "/metrics.json":
+                content_type = "application/json; charset=utf-8"
+                body = json.dumps(registry.snapshot(), ensure_ascii=False)
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, int(port)), Handler)
+    threading.Thread(target=server.serve_forever, name="manzafac-metrics", daemon=True).start()
+    return server
+
+def _write_periodically(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write(path)
+        except OSError as e:
+            print(f"Error al escribir las métricas en {path}: {e}", file=sys.stderr)
+
+_started = False
+_start_lock = threading.Lock()
+
+def start_from_environment():
+    """Inicia la exportación configurada en las variables de entorno (una sola vez)"""
+    global _started
+    with _start_lock:
+        if _started or not ENABLED:
+            return
+        _started = True
+    if PORT:
+        try:
+            serve(PORT)
+        except OSError as e:
+            print(f"No se pudo servir las métricas en el puerto {PORT}: {e}", file=sys.stderr)
+    if FILE:
+        threading.Thread(
+            target=_write_periodically, args=(FILE, INTERVAL), name="manzafac-metrics-file", daemon=True
+        ).start()
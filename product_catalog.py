@@ -0,0 +1,224 @@
+import bisect
+import threading
+import unicodedata
+from decimal import Decimal
+from database import database_error
+from invoice_repository import get_repository
+
+SUGGESTION_LIMIT = 8
+FETCH_SIZE = 5000  # Filas leídas por viaje a la base de datos al cargar el catálogo
+TRIGRAM = 3
+
+PRODUCT_COLUMNS = "codigo, descripcion, precio, incluye_iva, actualizado_en"
+
+def normalize(text):
+    """Texto en minúsculas, sin tildes y con un solo espacio entre palabras"""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+def trigrams(key):
+    return {key[i:i + TRIGRAM] for i in range(len(key) - TRIGRAM + 1)}
+
+class ProductCatalog:
+    """Catálogo de productos en memoria con búsqueda por prefijo y por trigramas.
+
+    Cada producto recibe un número interno. prefix es una lista ordenada de
+    (descripción normalizada, número) donde los prefijos se buscan con
+    bisect, y postings guarda para cada trigrama los números de los
+    productos que lo contienen, para encontrar también palabras en medio de
+    la descripción. Un producto modificado recibe un número nuevo y el
+    anterior queda anulado en entries; sus trigramas viejos se ignoran hasta
+    que se reconstruye el índice.
+
+    El repositorio se obtiene en la primera carga, que se hace en segundo
+    plano; así crear el catálogo no se conecta a la base de datos.
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository
+        self.repository_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.entries = []  # número -> (codigo, descripcion, precio, incluye_iva, clave) o None
+        self.by_code = {}  # codigo -> número vigente
+        self.prefix = []
+        self.postings = {}
+        self.last_change = None  # Mayor actualizado_en ya cargado
+        self.loaded = False
+
+    def __len__(self):
+        return len(self.by_code)
+
+    def get_repository(self):
+        if self.repository is None:
+            with self.repository_lock:
+                if self.repository is None:
+                    self.repository = get_repository()
+        return self.repository
+
+    def load(self):
+        """Construye el índice completo desde la tabla productos"""
+        entries, by_code, prefix, postings = [], {}, [], {}
+        last_change = None
+        with self.get_repository().transaction() as cursor:
+            cursor.execute(f"SELECT {PRODUCT_COLUMNS} FROM productos")
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for codigo, descripcion, precio, incluye_iva, changed in rows:
+                    number = len(entries)
+                    key = normalize(descripcion)
+                    entries.append((codigo, descripcion, Decimal(str(precio)), bool(incluye_iva), key))
+                    by_code[codigo] = number
+                    prefix.append((key, number))
+                    for trigram in trigrams(key):
+                        postings.setdefault(trigram, []).append(number)
+                    if last_change is None or changed > last_change:
+                        last_change = changed
+        prefix.sort()
+
+        with self.lock:
+            self.entries, self.by_code = entries, by_code
+            self.prefix, self.postings = prefix, postings
+            self.last_change = last_change
+            self.loaded = True
+
+    def refresh(self):
+        """Aplica los productos creados o modificados desde la última carga.
+
+        La primera vez carga el catálogo completo. Devuelve el número de
+        productos actualizados; si la base de datos no está disponible el
+        catálogo queda como estaba y se devuelve 0.
+        """
+        try:
+            # Sin una fecha de referencia (por ejemplo, la tabla estaba vacía
+            # en la primera carga) se vuelve a cargar todo
+            if not self.loaded or self.last_change is None:
+                self.load()
+                return len(self)
+
+            repository = self.get_repository()
+            with repository.transaction() as cursor:
+                # Se usa >= para no perder cambios hechos en el mismo segundo;
+                # volver a aplicar un producto sin cambios no altera el índice
+                cursor.execute(repository.sql(
+                    f"SELECT {PRODUCT_COLUMNS} FROM productos WHERE actualizado_en >= %s"
+                ), (self.last_change,))
+                rows = cursor.fetchall()
+        except database_error() as e:
+            print(f"Error al cargar el catálogo de productos: {e}")
+            return 0
+
+        with self.lock:
+            for codigo, descripcion, precio, incluye_iva, changed in rows:
+                self._put(codigo, descripcion, Decimal(str(precio)), bool(incluye_iva))
+                if self.last_change is None or changed > self.last_change:
+                    self.last_change = changed
+            # Reconstruir cuando los números anulados superan a los vigentes
+            if len(self.entries) > 2 * len(self.by_code) + FETCH_SIZE:
+                self._rebuild()
+        return len(rows)
+
+    def _put(self, codigo, descripcion, precio, incluye_iva):
+        key = normalize(descripcion)
+        old = self.by_code.get(codigo)
+        if old is not None:
+            entry = self.entries[old]
+            if entry == (codigo, descripcion, precio, incluye_iva, key):
+                return
+            self.entries[old] = None
+            position = bisect.bisect_left(self.prefix, (entry[4], old))
+            if position < len(self.prefix) and self.prefix[position][1] == old:
+                del self.prefix[position]
+
+        number = len(self.entries)
+        self.entries.append((codigo, descripcion, precio, incluye_iva, key))
+        self.by_code[codigo] = number
+        bisect.insort(self.prefix, (key, number))
+        for trigram in trigrams(key):
+            self.postings.setdefault(trigram, []).append(number)
+
+    def _rebuild(self):
+        live = [entry for entry in self.entries if entry is not None]
+        self.entries, self.by_code, self.prefix, self.postings = [], {}, [], {}
+        for entry in live:
+            number = len(self.entries)
+            self.entries.append(entry)
+            self.by_code[entry[0]] = number
+            self.prefix.append((entry[4], number))
+            for trigram in trigrams(entry[4]):
+                self.postings.setdefault(trigram, []).append(number)
+        self.prefix.sort()
+
+    def get(self, codigo):
+        with self.lock:
+            number = self.by_code.get(codigo)
+            return None if number is None else self._as_dict(self.entries[number])
+
+    def search(self, text, limit=SUGGESTION_LIMIT):
+        """Productos cuyo código coincide o cuya descripción contiene el texto.
+
+        Primero van el código exacto y las descripciones que empiezan con el
+        texto (en orden alfabético) y luego las que lo contienen en medio.
+        """
+        query = normalize(text)
+        if not query:
+            return []
+
+        with self.lock:
+            found = []
+            seen = set()
+
+            def add(number):
+                if number not in seen and self.entries[number] is not None:
+                    seen.add(number)
+                    found.append(self.entries[number])
+
+            number = self.by_code.get(text.strip())
+            if number is not None:
+                add(number)
+
+            position = bisect.bisect_left(self.prefix, (query,))
+            while len(found) < limit and position < len(self.prefix):
+                key, number = self.prefix[position]
+                if not key.startswith(query):
+                    break
+                add(number)
+                position += 1
+
+            if len(found) < limit and len(query) >= TRIGRAM:
+                # Recorrer la lista del trigrama menos frecuente y comprobar el texto completo
+                candidates = min(
+                    (self.postings.get(trigram, []) for trigram in trigrams(query)), key=len
+                )
+                for number in candidates:
+                    entry = self.entries[number]
+                    if entry is not None and query in entry[4]:
+                        add(number)
+                        if len(found) >= limit:
+                            break
+
+            return [self._as_dict(entry) for entry in found]
+
+    @staticmethod
+    def _as_dict(entry):
+        codigo, descripcion, precio, incluye_iva, _ = entry
+        return {
+            "codigo": codigo,
+            "descripcion": descripcion,
+            "precio": precio,
+            "incluye_iva": incluye_iva,
+        }
+
+_default_catalog = None
+_default_lock = threading.Lock()
+
+def get_catalog():
+    """Catálogo compartido por todas las páginas de este proceso"""
+    global _default_catalog
+    if _default_catalog is None:
+        with _default_lock:
+            if _default_catalog is None:
+                _default_catalog = ProductCatalog()
+    return _default_catalog
@@ -1,6 +1,9 @@
 import flet as ft
-import mysql.connector
-from mysql.connector import Error
+from database import get_connection, invalidate_business_cache, database_error
+from background import run_in_background
+from identification import validate_ruc
+from geography import PROVINCE_NAMES, province_for_identification
+from metrics import timed
 
 class RegisterPage(ft.View):
     def __init__(self, page: ft.Page):
@@ -19,65 +22,53 @@ class RegisterPage(ft.View):
         self.page.window_height = 700  # Alto inicial
         self.page.window_resizable = True  # Permitir redimensionar
 
+        @timed("RegisterPage.save_to_database")
         def save_to_database(data):
             try:
-                connection = mysql.connector.connect(
-                    host='localhost',
-                    database='manzafac',
-                    user='root',
-                    password='root'
-                )
-
-                if connection.is_connected():
+                with get_connection() as connection:
                     cursor = connection.cursor()
-                    
-                    # Primero verificar si ya existe algún registro
-                    cursor.execute("SELECT COUNT(*) FROM negocios")
-                    count = cursor.fetchone()[0]
-                    
-                    if count > 0:
-                        self.page.show_snack_bar(
-                            ft.SnackBar(content=ft.Text("Ya existe un negocio registrado"))
+                    try:
+                        # Primero verificar si ya existe algún registro
+                        cursor.execute("SELECT COUNT(*) FROM negocios")
+                        count = cursor.fetchone()[0]
+                        
+                        if count > 0:
+                            self.page.show_snack_bar(
+                                ft.SnackBar(content=ft.Text("Ya existe un negocio registrado"))
+                            )
+                            return "EXISTS"
+                        
+                        # Si no existe ningún registro, procedemos con la inserción
+                        sql = """INSERT INTO negocios 
+                                (business_name, ruc, address, province) 
+                                VALUES (%s, %s, %s, %s)"""
+                        values = (
+                            data["business_name"],
+                            data["ruc"],
+                            data["address"],
+                            data["province"]
                         )
-                        return "EXISTS"
-                    
-                    # Si no existe ningún registro, procedemos con la inserción
-                    sql = """INSERT INTO negocios 
-                            (business_name, ruc, address, province) 
-                            VALUES (%s, %s, %s, %s)"""
-                    values = (
-                        data["business_name"],
-                        data["ruc"],
-                        data["address"],
-                        data["province"]
-                    )
-                    
-                    cursor.execute(sql, values)
-                    connection.commit()
-                    
-                    self.page.show_snack_bar(
-                        ft.SnackBar(content=ft.Text("Registro guardado exitosamente"))
-                    )
-                    return True
+                        
+                        cursor.execute(sql, values)
+                        connection.commit()
+                    finally:
+                        cursor.close()
 
-            except Error as e:
+                # Los datos del negocio cambiaron: descartar la copia en caché
+                invalidate_business_cache()
+                
                 self.page.show_snack_bar(
-                    ft.SnackBar(content=ft.Text(f"Error de conexión a MySQL: {str(e)}"))
+                    ft.SnackBar(content=ft.Text("Registro guardado exitosamente"))
                 )
-                return False
-                
-            finally:
-                if connection.is_connected():
-                    cursor.close()
-                    connection.close()
+                return True
 
-        def register_clicked(e):
-            if not self.test_connection():
+            except database_error() as e:
                 self.page.show_snack_bar(
-                    ft.SnackBar(content=ft.Text("Error de conexión a la base de datos"))
+                    ft.SnackBar(content=ft.Text(f"Error de conexión a MySQL: {str(e)}"))
                 )
-                return
+                return False
 
+        def register_clicked(e):
             # Validar campos vacíos
             empty_fields = []
             if not self.business_name_field.value:
@@ -112,10 +103,42 @@ class RegisterPage(ft.View):
                 "address": self.address_field.value,
                 "province": self.province_dropdown.value
             }
-            
-            result = save_to_database(data)
-            
-            if result == "EXISTS":
+
+            # Las consultas a MySQL se ejecutan en segundo plano para no congelar la ventana
+            set_busy(True)
+
+            def work():
+                if not self.test_connection():
+                    return "NO_CONNECTION"
+                result = save_to_database(data)
+                if result is True and not self.verify_saved_data(data["ruc"]):
+                    return "NOT_VERIFIED"
+                return result
+
+            def on_done(result):
+                set_busy(False)
+                show_result(result)
+
+            def on_error(error):
+                set_busy(False)
+                self.page.show_snack_bar(
+                    ft.SnackBar(content=ft.Text(f"Error al guardar los datos: {str(error)}"))
+                )
+
+            run_in_background(work, on_done=on_done, on_error=on_error)
+
+        def set_busy(busy):
+            """Mostrar el progreso y bloquear el botón mientras se guarda"""
+            self.save_button.disabled = busy
+            self.progress_ring.visible = busy
+            self.update()
+
+        def show_result(result):
+            if result == "NO_CONNECTION":
+                self.page.show_snack_bar(
+                    ft.SnackBar(content=ft.Text("Error de conexión a la base de datos"))
+                )
+            elif result == "EXISTS":
                 # Mostrar diálogo de error
                 self.page.dialog = ft.AlertDialog(
                     title=ft.Text("Registro no permitido"),
@@ -129,31 +152,21 @@ class RegisterPage(ft.View):
                 )
                 self.page.dialog.open = True
                 self.page.update()
+            elif result == "NOT_VERIFIED":
+                self.page.show_snack_bar(
+                    ft.SnackBar(content=ft.Text("Error al verificar los datos guardados"))
+                )
             elif result:
-                # Verificar que los datos se guardaron correctamente
-                if self.verify_saved_data(data["ruc"]):
-                    self.page.show_snack_bar(
-                        ft.SnackBar(content=ft.Text("Registro guardado y verificado"))
-                    )
-                    self.page.go("/")
-                else:
-                    self.page.show_snack_bar(
-                        ft.SnackBar(content=ft.Text("Error al verificar los datos guardados"))
-                    )
+                # Los datos se guardaron y verificaron correctamente
+                self.page.show_snack_bar(
+                    ft.SnackBar(content=ft.Text("Registro guardado y verificado"))
+                )
+                self.page.go("/")
             else:
                 self.page.show_snack_bar(
                     ft.SnackBar(content=ft.Text("Error al guardar los datos"))
                 )
 
-        # Lista de provincias de Ecuador
-        PROVINCIAS_ECUADOR = [
-            "Azuay", "Bolívar", "Cañar", "Carchi", "Chimborazo", "Cotopaxi",
-            "El Oro", "Esmeraldas", "Galápagos", "Guayas", "Imbabura", "Loja",
-            "Los Ríos", "Manabí", "Morona Santiago", "Napo", "Orellana", "Pastaza",
-            "Pichincha", "Santa Elena", "Santo Domingo de los Tsáchilas", 
-            "Sucumbíos", "Tungurahua", "Zamora Chinchipe"
-        ]
-
         self.business_name_field = ft.TextField(
             label="Nombre del Local/Empresa",
             border_color=ft.colors.RED_400,
@@ -163,7 +176,8 @@ class RegisterPage(ft.View):
         self.ruc_field = ft.TextField(
             label="RUC",
             border_color=ft.colors.RED_400,
-            width=400  # Aumentado de 300 a 400
+            width=400,  # Aumentado de 300 a 400
+            on_blur=self.ruc_entered
         )
 
         self.address_field = ft.TextField(
@@ -175,10 +189,21 @@ class RegisterPage(ft.View):
         self.province_dropdown = ft.Dropdown(
             label="Provincia",
             width=400,  # Aumentado de 300 a 400
-            options=[ft.dropdown.Option(provincia) for provincia in PROVINCIAS_ECUADOR],
+            options=[ft.dropdown.Option(provincia) for provincia in PROVINCE_NAMES],
             border_color=ft.colors.RED_400,
         )
 
+        self.save_button = ft.ElevatedButton(
+            "Guardar",
+            on_click=register_clicked,
+            bgcolor=ft.colors.RED_700,
+            color=ft.colors.WHITE,
+            width=150  # Añadido ancho al botón
+        )
+
+        # Indicador de progreso mientras se guarda en la base de datos
+        self.progress_ring = ft.ProgressRing(width=24, height=24, visible=False)
+
         self.controls = [
             ft.Container(
                 content=ft.Column(
@@ -192,18 +217,13 @@ class RegisterPage(ft.View):
                         self.province_dropdown,
                         ft.Row(
                             controls=[
-                                ft.ElevatedButton(
-                                    "Guardar",
-                                    on_click=register_clicked,
-                                    bgcolor=ft.colors.RED_700,
-                                    color=ft.colors.WHITE,
-                                    width=150  # Añadido ancho al botón
-                                ),
+                                self.save_button,
                                 ft.TextButton(
                                     "Volver",
                                     on_click=lambda _: self.page.go("/"),
                                     width=150  # Añadido ancho al botón
-                                )
+                                ),
+                                self.progress_ring
                             ],
                             alignment=ft.MainAxisAlignment.CENTER,
                             spacing=30  # Aumentado el espacio entre botones
@@ -217,102 +237,75 @@ class RegisterPage(ft.View):
             )
         ] 
 
+    def ruc_entered(self, e):
+        """Proponer la provincia que indican los dos primeros dígitos del RUC"""
+        if not self.province_dropdown.value:
+            province = province_for_identification(self.ruc_field.value)
+            if province:
+                self.province_dropdown.value = province
+                self.province_dropdown.update()
+
+    def reset(self):
+        """Limpiar el formulario al volver a mostrar la vista"""
+        for field in (self.business_name_field, self.ruc_field, self.address_field):
+            field.value = ""
+        self.province_dropdown.value = None
+
+    @timed()
     def test_connection(self):
         try:
-            connection = mysql.connector.connect(
-                host='localhost',
-                database='manzafac',
-                user='root',
-                password='root'
-            )
-            
-            if connection.is_connected():
+            with get_connection() as connection:
                 db_info = connection.get_server_info()
                 print(f"Conectado a MySQL Server versión {db_info}")
                 
                 cursor = connection.cursor()
-                cursor.execute("select database();")
-                db_name = cursor.fetchone()[0]
-                print(f"Conectado a la base de datos: {db_name}")
+                try:
+                    cursor.execute("select database();")
+                    db_name = cursor.fetchone()[0]
+                    print(f"Conectado a la base de datos: {db_name}")
+                finally:
+                    cursor.close()
                 
                 return True
                 
-        except Error as e:
+        except database_error() as e:
             self.page.show_snack_bar(
                 ft.SnackBar(content=ft.Text(f"Error de conexión a MySQL: {str(e)}"))
             )
             return False
-            
-        finally:
-            if 'connection' in locals() and connection.is_connected():
-                cursor.close()
-                connection.close()
 
+    @timed()
     def verify_saved_data(self, ruc):
         try:
-            connection = mysql.connector.connect(
-                host='localhost',
-                database='manzafac',
-                user='root',
-                password='root'
-            )
-            
-            if connection.is_connected():
+            with get_connection() as connection:
                 cursor = connection.cursor(dictionary=True)
-                
-                sql = "SELECT * FROM negocios WHERE ruc = %s"
-                cursor.execute(sql, (ruc,))
-                
-                result = cursor.fetchone()
-                if result:
-                    print("Datos encontrados:")
-                    print(f"Nombre: {result['business_name']}")
-                    print(f"RUC: {result['ruc']}")
-                    print(f"Dirección: {result['address']}")
-                    print(f"Provincia: {result['province']}")
-                    return True
-                else:
-                    self.page.show_snack_bar(
-                        ft.SnackBar(content=ft.Text("No se encontraron datos para ese RUC"))
-                    )
-                    return False
+                try:
+                    sql = "SELECT * FROM negocios WHERE ruc = %s"
+                    cursor.execute(sql, (ruc,))
                     
-        except Error as e:
+                    result = cursor.fetchone()
+                finally:
+                    cursor.close()
+
+            if result:
+                print("Datos encontrados:")
+                print(f"Nombre: {result['business_name']}")
+                print(f"RUC: {result['ruc']}")
+                print(f"Dirección: {result['address']}")
+                print(f"Provincia: {result['province']}")
+                return True
+            else:
+                self.page.show_snack_bar(
+                    ft.SnackBar(content=ft.Text("No se encontraron datos para ese RUC"))
+                )
+                return False
+                    
+        except database_error() as e:
             self.page.show_snack_bar(
                 ft.SnackBar(content=ft.Text(f"Error al verificar datos: {str(e)}"))
             )
             return False
-            
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
 
     def validate_ruc(self, ruc):
-        """Valida que el RUC cumpla con las reglas básicas de Ecuador"""
-        # Verificar que tenga 13 dígitos y sean solo números
-        if not ruc.isdigit() or len(ruc) != 13:
-            return False, "El RUC debe tener 13 dígitos numéricos"
-
-        # Verificar que los dos primeros dígitos correspondan a una provincia válida (01-24)
-        provincia = int(ruc[:2])
-        if provincia < 1 or provincia > 24:
-            return False, "Los dos primeros dígitos deben corresponder a una provincia válida (01-24)"
-
-        # Verificar el tercer dígito (tipo de contribuyente)
-        tercer_digito = int(ruc[2])
-        if tercer_digito not in [6, 9] and tercer_digito < 0 or tercer_digito > 5:
-            return False, "El tercer dígito no es válido para un RUC"
-
-        # Validación del dígito verificador para RUC de sociedades (tercer dígito = 9)
-        if tercer_digito == 9:
-            coeficientes = [4, 3, 2, 7, 6, 5, 4, 3, 2]
-            suma = 0
-            for i in range(len(coeficientes)):
-                suma += int(ruc[i]) * coeficientes[i]
-            residuo = suma % 11
-            digito_verificador = 11 - residuo if residuo != 0 else 0
-            if digito_verificador != int(ruc[9]):
-                return False, "El RUC no es válido (dígito verificador incorrecto)"
-
-        return True, "RUC válido"
\ No newline at end of file
+        """Valida que el RUC cumpla con las reglas de Ecuador"""
+        return validate_ruc(ruc)
@@ -0,0 +1,131 @@
+import argparse
+import sys
+import threading
+from decimal import Decimal
+from invoice_repository import InvoiceRepository, ROLLUP_METRICS, get_repository
+
+# Agrupación por mes de la columna fecha en cada motor. En MySQL el % va
+# doble porque la sentencia se ejecuta con parámetros.
+MONTH_SQL = {
+    "mysql": "DATE_FORMAT(fecha, '%%Y-%%m')",
+    "sqlite": "substr(fecha, 1, 7)",
+}
+
+SUMS_SQL = ", ".join(f"SUM({metric})" for metric in ROLLUP_METRICS)
+
+def _row(keys, values):
+    """Convierte una fila de sumas en centavos a un diccionario con montos en Decimal"""
+    row = {key: str(value) for key, value in keys.items()}
+    counts, *amounts = values
+    row["facturas"] = int(counts or 0)
+    for metric, cents in zip(ROLLUP_METRICS[1:], amounts):
+        row[metric] = Decimal(int(cents or 0)).scaleb(-2)
+    return row
+
+class SalesReports:
+    """Reportes de ventas por período sobre los resúmenes que mantiene
+    InvoiceRepository.save_invoice (ventas_dia, ventas_cliente_dia y
+    ventas_vendedor_dia).
+
+    Cada consulta suma como mucho una fila por día del período, así que un
+    reporte de varios años no recorre las facturas ni sus líneas. Las fechas
+    desde y hasta son YYYY-MM-DD e inclusivas; los montos se devuelven como
+    Decimal con dos decimales.
+    """
+
+    def __init__(self, repository=None):
+        self.repository = repository or get_repository()
+
+    def _query(self, table, groups, desde, hasta, conditions=(), params=(), order=None):
+        select = [expression for _, expression in groups]
+        statement = (
+            f"SELECT {', '.join(select + [SUMS_SQL])} FROM {table} "
+            f"WHERE {' AND '.join(['fecha >= %s', 'fecha <= %s'] + list(conditions))}"
+        )
+        if groups:
+            statement += f" GROUP BY {', '.join(select)} ORDER BY {order or ', '.join(select)}"
+        with self.repository.transaction() as cursor:
+            cursor.execute(self.repository.sql(statement), (str(desde), str(hasta)) + tuple(params))
+            rows = cursor.fetchall()
+        names = [name for name, _ in groups]
+        return [_row(dict(zip(names, row)), row[len(names):]) for row in rows]
+
+    def summary(self, desde, hasta):
+        """Totales del período: facturas, subtotal, base con IVA, base 0%, IVA y total"""
+        return self._query("ventas_dia", [], desde, hasta)[0]
+
+    def by_day(self, desde, hasta):
+        return self._query("ventas_dia", [("fecha", "fecha")], desde, hasta)
+
+    def by_month(self, desde, hasta):
+        month = MONTH_SQL[self.repository.dialect]
+        return self._query("ventas_dia", [("mes", month)], desde, hasta)
+
+    def by_client(self, desde, hasta, identificacion=None):
+        """Ventas por cliente, de mayor a menor total, o solo las de un cliente"""
+        conditions, params = [], []
+        if identificacion:
+            conditions, params = ["cliente_identificacion = %s"], [identificacion]
+        return self._query(
+            "ventas_cliente_dia", [("identificacion", "cliente_identificacion")],
+            desde, hasta, conditions, params, order="SUM(total) DESC"
+        )
+
+    def by_vendor(self, desde, hasta):
+        """Ventas por vendedor, de mayor a menor total ("" agrupa las facturas sin vendedor)"""
+        return self._query(
+            "ventas_vendedor_dia", [("vendedor", "vendedor")], desde, hasta, order="SUM(total) DESC"
+        )
+
+_default_reports = None
+_default_lock = threading.Lock()
+
+def get_reports():
+    """Reportes sobre el repositorio compartido de este proceso"""
+    global _default_reports
+    if _default_reports is None:
+        with _default_lock:
+            if _default_reports is None:
+                _default_reports = SalesReports()
+    return _default_reports
+
+REPORTS = {
+    "resumen": lambda reports, desde, hasta: [reports.summary(desde, hasta)],
+    "dia": SalesReports.by_day,
+    "mes": SalesReports.by_month,
+    "cliente": SalesReports.by_client,
+    "vendedor": SalesReports.by_vendor,
+}
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos de los reportes de ventas"""
+    parser = argparse.ArgumentParser(description="Ventas e IVA facturados en un período")
+    parser.add_argument("desde", help="Primera fecha del período (AAAA-MM-DD)")
+    parser.add_argument("hasta", help="Última fecha del período (AAAA-MM-DD)")
+    parser.add_argument(
+        "-p", "--por",
+        choices=sorted(REPORTS),
+        default="resumen",
+        help="Agrupación del reporte (por defecto, resumen)"
+    )
+    parser.add_argument("--sqlite", help="Usar esta base SQLite local en lugar de MySQL")
+    parser.add_argument(
+        "--reconstruir",
+        action="store_true",
+        help="Recalcular antes los resúmenes desde todas las facturas guardadas"
+    )
+    args = parser.parse_args(argv)
+
+    repository = InvoiceRepository.sqlite(args.sqlite) if args.sqlite else get_repository()
+    if args.reconstruir:
+        repository.rebuild_rollups()
+
+    rows = REPORTS[args.por](SalesReports(repository), args.desde, args.hasta)
+    columns = [column for column in rows[0] if column not in ROLLUP_METRICS] if rows else []
+    print("\t".join(columns + list(ROLLUP_METRICS)))
+    for row in rows:
+        print("\t".join(str(row[column]) for column in columns + list(ROLLUP_METRICS)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,337 @@
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from xml.sax.saxutils import XMLGenerator
+from access_key import (
+    AMBIENTE_PRODUCCION, AMBIENTE_PRUEBAS, COD_DOC_FACTURA, ESTABLECIMIENTO, KEY_CHUNK, PUNTO_EMISION,
+    TIPO_EMISION_NORMAL, invoice_access_key, sequential, with_access_keys
+)
+from batch_sinks import (
+    DEFAULT_BUSINESS_DATA, ZipSink, check_invoice, finish_summary, new_result, new_summary, record_result
+)
+from database import get_business_data
+from identification import CONSUMIDOR_FINAL
+from invoice_totals import IVA_RATE, ZERO, clamp_discount, compute_invoice, line_amounts, parse_amount, round_money
+
+# Comprobante "factura" del esquema de facturación electrónica del SRI
+FACTURA_VERSION = "1.1.0"
+MONEDA = "DOLAR"
+FORMA_PAGO = "01"  # Sin utilización del sistema financiero
+IVA_CODE = "2"
+LOTE_VERSION = "1.0.0"
+UNIT_PRECISION = Decimal("0.000001")  # El esquema admite hasta 6 decimales en cantidad y precio
+
+# Código de porcentaje del SRI para cada tarifa de IVA
+IVA_PERCENTAGE_CODES = {
+    Decimal("0"): "0",
+    Decimal("0.12"): "2",
+    Decimal("0.14"): "3",
+    Decimal("0.15"): "4",
+    Decimal("0.05"): "5",
+}
+
+# Tipo de identificación del comprador
+BUYER_RUC = "04"
+BUYER_CEDULA = "05"
+BUYER_PASAPORTE = "06"
+BUYER_CONSUMIDOR_FINAL = "07"
+
+# Ruta del XSD de factura (si no se indica otra) para validar cada comprobante
+SCHEMA_ENV = "MANZAFAC_SRI_XSD"
+
+def buyer_type(identificacion):
+    if identificacion == CONSUMIDOR_FINAL:
+        return BUYER_CONSUMIDOR_FINAL
+    if len(identificacion) == 13 and identificacion.isdigit():
+        return BUYER_RUC
+    if len(identificacion) == 10 and identificacion.isdigit():
+        return BUYER_CEDULA
+    return BUYER_PASAPORTE
+
+def sri_date(fecha):
+    """Fecha YYYY-MM-DD (o date) con el formato dd/mm/aaaa del SRI"""
+    if not isinstance(fecha, date):
+        fecha = date.fromisoformat(str(fecha))
+    return fecha.strftime("%d/%m/%Y")
+
+def _money(amount):
+    return f"{amount:.2f}"
+
+def _unit(amount):
+    """Cantidad o precio unitario en notación decimal (nunca 1E+2), con 6 decimales como máximo"""
+    if amount.as_tuple().exponent < UNIT_PRECISION.as_tuple().exponent:
+        amount = amount.quantize(UNIT_PRECISION, rounding=ROUND_HALF_UP)
+    return format(amount, "f")
+
+def _element(xml, name, text):
+    xml.startElement(name, {})
+    xml.characters(text)
+    xml.endElement(name)
+
+def _tax(xml, name, percentage_code, base, value, rate=None):
+    xml.startElement(name, {})
+    _element(xml, "codigo", IVA_CODE)
+    _element(xml, "codigoPorcentaje", percentage_code)
+    if rate is not None:
+        _element(xml, "tarifa", f"{(rate * 100).normalize():f}")
+    _element(xml, "baseImponible", _money(base))
+    _element(xml, "valor", _money(value))
+    xml.endElement(name)
+
+def write_factura(xml, client_data, invoice_data, products, totals, business_data, ambiente=AMBIENTE_PRUEBAS):
+    """Escribe un comprobante de factura en un XMLGenerator, elemento por
+    elemento y sin construir el árbol del documento.
+
+    Recibe los mismos diccionarios que generate_invoice_pdf; los montos se
+    recalculan con compute_invoice para que cada línea lleve su descuento y
+    su impuesto con el mismo redondeo que los totales. Lanza ValueError si
+    no se puede formar la clave de acceso (por ejemplo, el negocio no tiene
+    un RUC de 13 dígitos), porque el SRI no admite comprobantes sin ella.
+    """
+    discount_percent = clamp_discount(totals.get("descuento") or "0")
+    result = compute_invoice(
+        ((p["cantidad"], p["precio"], p.get("incluye_iva")) for p in products), discount_percent
+    )
+    iva_code = IVA_PERCENTAGE_CODES[IVA_RATE]
+    clave_acceso = invoice_data.get("clave_acceso") or invoice_access_key(
+        invoice_data, business_data["ruc"], ambiente
+    )
+    identificacion = client_data["identificacion"].strip()
+
+    xml.startElement("factura", {"id": "comprobante", "version": FACTURA_VERSION})
+
+    xml.startElement("infoTributaria", {})
+    _element(xml, "ambiente", ambiente)
+    _element(xml, "tipoEmision", TIPO_EMISION_NORMAL)
+    _element(xml, "razonSocial", business_data["business_name"])
+    _element(xml, "ruc", business_data["ruc"])
+    _element(xml, "claveAcceso", clave_acceso)
+    _element(xml, "codDoc", COD_DOC_FACTURA)
+    _element(xml, "estab", invoice_data.get("establecimiento") or ESTABLECIMIENTO)
+    _element(xml, "ptoEmi", invoice_data.get("punto_emision") or PUNTO_EMISION)
+    _element(xml, "secuencial", sequential(invoice_data["numero"]))
+    _element(xml, "dirMatriz", business_data["address"])
+    xml.endElement("infoTributaria")
+
+    xml.startElement("infoFactura", {})
+    _element(xml, "fechaEmision", sri_date(invoice_data["fecha"]))
+    _element(xml, "dirEstablecimiento", business_data["address"])
+    _element(xml, "tipoIdentificacionComprador", buyer_type(identificacion))
+    _element(xml, "razonSocialComprador", client_data["cliente"])
+    _element(xml, "identificacionComprador", identificacion)
+    if client_data.get("direccion"):
+        _element(xml, "direccionComprador", client_data["direccion"])
+    _element(xml, "totalSinImpuestos", _money(result["subtotal"]))
+    _element(xml, "totalDescuento", _money(result["descuento"]))
+    xml.startElement("totalConImpuestos", {})
+    if result["base_iva"]:
+        _tax(xml, "totalImpuesto", iva_code, result["base_iva"], result["iva"])
+    if result["base_cero"] or not result["base_iva"]:
+        _tax(xml, "totalImpuesto", IVA_PERCENTAGE_CODES[ZERO], result["base_cero"], ZERO)
+    xml.endElement("totalConImpuestos")
+    _element(xml, "propina", _money(ZERO))
+    _element(xml, "importeTotal", _money(result["total"]))
+    _element(xml, "moneda", MONEDA)
+    xml.startElement("pagos", {})
+    xml.startElement("pago", {})
+    _element(xml, "formaPago", FORMA_PAGO)
+    _element(xml, "total", _money(result["total"]))
+    xml.endElement("pago")
+    xml.endElement("pagos")
+    xml.endElement("infoFactura")
+
+    xml.startElement("detalles", {})
+    for position, product in enumerate(products, start=1):
+        quantity = parse_amount(product["cantidad"])
+        price = parse_amount(product["precio"])
+        if quantity is None or price is None:
+            raise ValueError(f"Producto {position}: la cantidad y el precio deben ser números positivos")
+        _, discount, net = line_amounts(quantity, price, discount_percent)
+        xml.startElement("detalle", {})
+        _element(xml, "codigoPrincipal", str(product.get("codigo") or position))
+        _element(xml, "descripcion", product["descripcion"])
+        _element(xml, "cantidad", _unit(quantity))
+        _element(xml, "precioUnitario", _unit(price))
+        _element(xml, "descuento", _money(discount))
+        _element(xml, "precioTotalSinImpuesto", _money(net))
+        xml.startElement("impuestos", {})
+        if product.get("incluye_iva"):
+            _tax(xml, "impuesto", iva_code, net, round_money(net * IVA_RATE), IVA_RATE)
+        else:
+            _tax(xml, "impuesto", IVA_PERCENTAGE_CODES[ZERO], net, ZERO, ZERO)
+        xml.endElement("impuestos")
+        xml.endElement("detalle")
+    xml.endElement("detalles")
+
+    if invoice_data.get("vendedor"):
+        xml.startElement("infoAdicional", {})
+        xml.startElement("campoAdicional", {"nombre": "Vendedor"})
+        xml.characters(invoice_data["vendedor"])
+        xml.endElement("campoAdicional")
+        xml.endElement("infoAdicional")
+
+    xml.endElement("factura")
+
+def render_factura_xml(client_data, invoice_data, products, totals, business_data=None, ambiente=AMBIENTE_PRUEBAS):
+    """Genera el XML de una factura en memoria y devuelve sus bytes (UTF-8)"""
+    if business_data is None:
+        business_data = get_business_data()
+    buffer = io.BytesIO()
+    xml = XMLGenerator(buffer, encoding="UTF-8", short_empty_elements=True)
+    xml.startDocument()
+    write_factura(xml, client_data, invoice_data, products, totals, business_data or DEFAULT_BUSINESS_DATA, ambiente)
+    xml.endDocument()
+    return buffer.getvalue()
+
+def xml_filename(client_data, invoice_data):
+    return f"Factura_{client_data['identificacion']}_{invoice_data['numero']}.xml"
+
+@lru_cache(maxsize=4)
+def load_schema(path):
+    """XSD compilado una sola vez por proceso (requiere lxml)"""
+    try:
+        from lxml import etree
+    except ImportError:
+        raise RuntimeError("Instale lxml para validar los comprobantes con el XSD del SRI")
+    return etree.XMLSchema(etree.parse(path))
+
+def validate_xml(data, schema_path):
+    """Lista de errores del comprobante frente al XSD (vacía si es válido)"""
+    from lxml import etree
+    schema = load_schema(os.path.abspath(schema_path))
+    if schema.validate(etree.fromstring(data)):
+        return []
+    return [f"Línea {error.line}: {error.message}" for error in schema.error_log]
+
+class LoteXmlSink:
+    """Destino que escribe un único XML de lote (formato de envío masivo del
+    SRI) con cada comprobante en un CDATA.
+
+    Cada comprobante se escribe en cuanto llega, así que el lote no se
+    guarda completo en memoria.
+    """
+
+    def __init__(self, target, ruc):
+        self.owns_file = isinstance(target, str)
+        self.file = open(target, "wb") if self.owns_file else target
+        self.xml = XMLGenerator(self.file, encoding="UTF-8", short_empty_elements=True)
+        self.xml.startDocument()
+        self.xml.startElement("lote", {"version": LOTE_VERSION})
+        _element(self.xml, "ruc", ruc)
+        self.xml.startElement("comprobantes", {})
+
+    def add(self, name, xml_data):
+        # El CDATA no puede contener "]]>"; se parte en dos secciones si aparece.
+        # ignorableWhitespace escribe el texto tal cual, sin escaparlo.
+        text = xml_data.decode("utf-8").replace("]]>", "]]]]><![CDATA[>")
+        self.xml.startElement("comprobante", {})
+        self.xml.ignorableWhitespace(f"<![CDATA[{text}]]>")
+        self.xml.endElement("comprobante")
+        return name
+
+    def close(self):
+        self.xml.endElement("comprobantes")
+        self.xml.endElement("lote")
+        self.xml.endDocument()
+        self.file.flush()
+        if self.owns_file:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def generate_xml_batch(invoices, sink, schema_path=None, on_result=None, business_data=None, ambiente=AMBIENTE_PRUEBAS):
+    """Genera el XML de cada factura de un iterable y lo entrega a sink.
+
+    Las facturas tienen el formato de los lotes JSON de PDF (totals es
+    opcional). Con schema_path cada comprobante se valida con el XSD
+    compilado una sola vez; uno inválido se reporta como error y no se
+    agrega al destino. Las claves de acceso que faltan se calculan por
+    bloques de KEY_CHUNK facturas. Devuelve el mismo resumen que generate_invoices_batch.
+    """
+    if business_data is None:
+        business_data = get_business_data() or DEFAULT_BUSINESS_DATA
+
+    summary = new_summary()
+    start = time.perf_counter()
+    for invoice in with_access_keys(invoices, business_data["ruc"], ambiente):
+        result = new_result(invoice)
+        try:
+            check_invoice(invoice)
+            client_data, invoice_data = invoice['client_data'], invoice['invoice_data']
+            totals = invoice.get('totals') or {"descuento": invoice.get('descuento', "0")}
+            data = render_factura_xml(
+                client_data, invoice_data, invoice['products'], totals, business_data, ambiente
+            )
+            errors = validate_xml(data, schema_path) if schema_path else []
+            if errors:
+                raise ValueError("; ".join(errors))
+            result["archivo"] = sink.add(xml_filename(client_data, invoice_data), data)
+        except Exception as e:
+            result["error"] = str(e)
+        record_result(summary, result)
+
+        if on_result:
+            on_result(result)
+
+    return finish_summary(summary, start)
+
+def main(argv=None):
+    """Punto de entrada de línea de comandos para generar comprobantes XML"""
+    parser = argparse.ArgumentParser(
+        description="Genera los comprobantes XML del SRI a partir de un archivo JSON de facturas"
+    )
+    parser.add_argument(
+        "archivo",
+        help="Archivo JSON con una lista de facturas (client_data, invoice_data, products y, opcionalmente, totals)"
+    )
+    destination = parser.add_mutually_exclusive_group(required=True)
+    destination.add_argument("--zip", help="Guardar cada comprobante como un XML dentro de este ZIP")
+    destination.add_argument("--lote", help="Escribir todos los comprobantes en este XML de lote")
+    parser.add_argument(
+        "--xsd",
+        default=os.environ.get(SCHEMA_ENV),
+        help=f"XSD de factura para validar cada comprobante (por defecto, la variable {SCHEMA_ENV})"
+    )
+    parser.add_argument(
+        "--produccion",
+        action="store_true",
+        help="Marcar los comprobantes para el ambiente de producción en lugar del de pruebas"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.archivo, encoding="utf-8") as f:
+        invoices = json.load(f)
+
+    def print_result(result):
+        if result["error"]:
+            print(f"[ERROR] Factura {result['numero']}: {result['error']}", file=sys.stderr)
+
+    business_data = get_business_data() or DEFAULT_BUSINESS_DATA
+    ambiente = AMBIENTE_PRODUCCION if args.produccion else AMBIENTE_PRUEBAS
+    if args.zip:
+        sink = ZipSink(args.zip)
+    else:
+        sink = LoteXmlSink(args.lote, business_data["ruc"])
+    with sink:
+        summary = generate_xml_batch(
+            invoices, sink, args.xsd, print_result, business_data, ambiente
+        )
+
+    print(
+        f"{summary['generadas']} de {summary['total']} comprobantes generados "
+        f"en {summary['segundos']:.2f} s ({summary['facturas_por_segundo']:.1f} comprobantes/s)"
+    )
+    return 1 if summary["fallidas"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import threading
+from metrics import count
+
+FRAME_INTERVAL = 1 / 30  # Segundos entre dos envíos de controles al cliente
+DEBOUNCE_DELAY = 0.25  # Segundos sin escribir antes de ejecutar una tarea demorada
+
+class UpdateScheduler:
+    """Agrupa las actualizaciones de controles de una página de Flet.
+
+    mark() no envía nada: anota los controles modificados y, como mucho una
+    vez por cuadro, flush() los manda todos en un solo page.update(*controls).
+    Un control marcado varias veces dentro del mismo cuadro se envía una vez.
+    debounce() deja para cuando el usuario deja de escribir el trabajo que
+    no hace falta repetir en cada tecla (avisos, recálculos completos): cada
+    nueva llamada con la misma clave reemplaza a la anterior.
+
+    stats() resume lo ahorrado en esta página; los mismos conteos se
+    publican en metrics como ui_marcas, ui_envios, ui_tareas_pedidas y
+    ui_tareas_ejecutadas.
+    """
+
+    def __init__(self, page, interval=FRAME_INTERVAL):
+        self.page = page
+        self.interval = interval
+        self.dirty = {}  # id(control) -> control, en el orden en que se marcaron
+        self.timer = None
+        self.pending = {}  # clave -> Timer de la tarea demorada
+        self.lock = threading.Lock()
+        self.marks = 0
+        self.updates = 0
+        self.debounced = 0
+        self.ran = 0
+
+    def mark(self, *controls):
+        """Anotar controles para el próximo envío"""
+        if not controls:
+            return
+        count("ui_marcas")
+        with self.lock:
+            self.marks += 1
+            for control in controls:
+                self.dirty[id(control)] = control
+            if self.timer is None:
+                self.timer = threading.Timer(self.interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Enviar ya los controles pendientes"""
+        with self.lock:
+            controls = list(self.dirty.values())
+            self.dirty.clear()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if controls:
+                self.updates += 1
+        if controls:
+            count("ui_envios")
+            self.page.update(*controls)
+
+    def debounce(self, key, work, delay=DEBOUNCE_DELAY):
+        """Ejecutar work cuando pasen delay segundos sin otra llamada con la misma clave"""
+        def run():
+            with self.lock:
+                if self.pending.get(key) is not timer:
+                    return
+                del self.pending[key]
+                self.ran += 1
+            count("ui_tareas_ejecutadas")
+            work()
+
+        timer = threading.Timer(delay, run)
+        timer.daemon = True
+        count("ui_tareas_pedidas")
+        with self.lock:
+            self.debounced += 1
+            previous = self.pending.get(key)
+            if previous is not None:
+                previous.cancel()
+            self.pending[key] = timer
+        timer.start()
+
+    def cancel(self):
+        """Descartar las tareas demoradas y los controles pendientes (al limpiar la página)"""
+        with self.lock:
+            for timer in self.pending.values():
+                timer.cancel()
+            self.pending.clear()
+            self.dirty.clear()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+    def stats(self):
+        """Envíos y tareas ejecutados frente a los pedidos, y cuántos se ahorraron"""
+        with self.lock:
+            return {
+                "marcas": self.marks,
+                "envios": self.updates,
+                "envios_ahorrados": self.marks - self.updates,
+                "tareas_pedidas": self.debounced,
+                "tareas_ejecutadas": self.ran,
+                "tareas_ahorradas": self.debounced - self.ran - len(self.pending),
+            }